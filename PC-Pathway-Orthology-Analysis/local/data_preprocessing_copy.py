@@ -1,7 +1,293 @@
 import pandas as pd
+import numpy as np
 import os
 import pickle
 import json
+import re
+import resource
+import time
+
+# Key under which the analysis metadata is stored in the Parquet/Feather schema
+INTERMEDIATE_METADATA_KEY = b'pc_analysis'
+INTERMEDIATE_EXTENSIONS = {'parquet': 'parquet', 'feather': 'feather', 'pickle': 'pkl'}
+
+
+def save_intermediate(data, path, output_format='parquet', missing_columns=(), target_column='group_2'):
+    """
+    Write the preprocessed DataFrame as a columnar intermediate the analysis stage can open column by column.
+
+    Duplicate feature names are dropped (first occurrence kept) before writing, and both the dropped
+    names and the missing-value columns are stored in the file metadata so the analysis stage does not
+    need to copy the frame or fetch the JSON sidecar. The fraction of nonzero feature values is stored
+    as 'density' so readers can choose between the dense and the sparse backend.
+
+    Parameters:
+    - data (pd.DataFrame): Target column followed by the numeric feature columns.
+    - path (str): Output file path.
+    - output_format (str): 'parquet' (zstd), 'feather' (uncompressed, memory-mappable) or legacy 'pickle'.
+    - missing_columns (Iterable): Feature columns removed because they contained NaN values.
+    - target_column (str): Name of the target column stored first in the file.
+
+    Returns:
+    - str: The path that was written.
+    """
+    if output_format == 'pickle':
+        data.to_pickle(path)
+        return path
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    duplicated = data.columns.duplicated()
+    duplicate_columns = data.columns[duplicated].tolist()
+    if duplicated.any():
+        data = data.loc[:, ~duplicated]
+
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    # Counted per column on the Arrow table, without another dense copy of the feature matrix
+    n_values = table.num_rows * (table.num_columns - 1)
+    nonzero = sum(pc.sum(pc.not_equal(table.column(i), 0)).as_py() or 0 for i in range(1, table.num_columns))
+    density = float(nonzero / n_values) if n_values else 0.0
+    metadata = dict(table.schema.metadata or {})
+    metadata[INTERMEDIATE_METADATA_KEY] = json.dumps({
+        'target_column': target_column,
+        'n_samples': int(data.shape[0]),
+        'n_features': int(data.shape[1] - 1),
+        'missing_columns': list(missing_columns),
+        'duplicate_columns': duplicate_columns,
+        'density': density,
+    }).encode('utf-8')
+    table = table.replace_schema_metadata(metadata)
+
+    if output_format == 'parquet':
+        pq.write_table(table, path, compression='zstd')
+    elif output_format == 'feather':
+        # Uncompressed Arrow IPC so readers can memory-map the columns without decoding
+        feather.write_feather(table, path, compression='uncompressed')
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}. Please specify 'parquet', 'feather' or 'pickle'.")
+    return path
+
+
+def _peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _open_csv_stream(csv_path, column_names, feature_columns, chunk_bytes, text_columns=()):
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    # Explicit float64 types let the parser skip type inference; text columns are coerced per batch.
+    # The header row is replaced by the pandas-deduplicated names (K1, K1.1, ...) like pd.read_csv.
+    text_columns = set(text_columns)
+    column_types = {column: (pa.string() if column in text_columns else pa.float64()) for column in feature_columns}
+    return pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=chunk_bytes, column_names=column_names, skip_rows=1),
+        convert_options=pa_csv.ConvertOptions(column_types=column_types),
+    )
+
+
+def _infer_text_columns(csv_path, column_names, feature_columns, chunk_bytes):
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    # Types inferred from the first block; all-empty columns infer as null and parse as float64
+    reader = pa_csv.open_csv(
+        csv_path, read_options=pa_csv.ReadOptions(block_size=chunk_bytes, column_names=column_names, skip_rows=1))
+    schema = reader.schema
+    reader.close()
+    numeric = (pa.types.is_integer, pa.types.is_floating, pa.types.is_null)
+    return {column for column in feature_columns
+            if not any(is_type(schema.field(column).type) for is_type in numeric)}
+
+
+def _numeric_column(batch, column, text_columns):
+    import pyarrow as pa
+
+    values = batch.column(column)
+    if column in text_columns:
+        # Same semantics as pd.to_numeric(errors='coerce'): unparsable cells become NaN
+        values = pa.array(pd.to_numeric(values.to_pandas(), errors='coerce').astype('float64'))
+    return values
+
+
+def _scan_missing_columns(csv_path, column_names, feature_columns, chunk_bytes, text_columns, target_column):
+    import pyarrow.compute as pc
+
+    has_nan = np.zeros(len(feature_columns), dtype=bool)
+    nonzero = np.zeros(len(feature_columns), dtype=np.int64)
+    target_has_nan = False
+    n_rows = 0
+    for batch in _open_csv_stream(csv_path, column_names, feature_columns, chunk_bytes, text_columns):
+        # Empty cells and NaN spellings are parsed as nulls, and null counts are precomputed per block
+        columns = [_numeric_column(batch, column, text_columns) for column in feature_columns]
+        has_nan |= np.array([values.null_count > 0 for values in columns])
+        nonzero += np.array([pc.sum(pc.not_equal(values, 0)).as_py() or 0 for values in columns])
+        target_has_nan = target_has_nan or batch.column(target_column).null_count > 0
+        n_rows += batch.num_rows
+    return has_nan, nonzero, target_has_nan, n_rows
+
+
+def preprocess_csv_streaming(csv_path, output_path, output_format='parquet', chunk_mb=16,
+                             feature_dtype='float64', target_column='group_2', feature_start=3):
+    """
+    Preprocess the abundance CSV in row blocks so peak memory is bounded by the block size, not the file size.
+
+    The first pass parses every block with explicit float types and records which feature columns
+    contain NaN values. The second pass re-reads the blocks and appends the clean columns to the
+    output file one row group (Parquet) or record batch (Feather) at a time.
+
+    Parameters:
+    - csv_path (str): Path of the raw 'PC Pathway.csv' / 'PC Orthology.csv' export.
+    - output_path (str): Path of the intermediate to write.
+    - output_format (str): 'parquet' or 'feather'.
+    - chunk_mb (float): Size of the CSV blocks parsed at once, in megabytes.
+    - feature_dtype (str): 'float64' or 'float32' (half the memory). Values are correctly rounded, i.e. equal to
+      pd.read_csv(float_precision='round_trip'); the default pandas parser can differ in the last bit.
+    - target_column (str): Name of the target column written first.
+    - feature_start (int): Index of the first feature column in the CSV.
+
+    Returns:
+    - dict: 'missing_columns', 'initial_shape', 'cleaned_shape', 'seconds', 'rows_per_second',
+      'mb_per_second' and 'peak_rss_mb'.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if output_format not in ('parquet', 'feather'):
+        raise ValueError(f"Streaming supports 'parquet' or 'feather' output, not {output_format}.")
+
+    started = time.perf_counter()
+    with open(csv_path) as f:
+        header_line = f.readline()
+    # Duplicate names are renamed like pd.read_csv does (K1, K1.1), so both paths keep the same columns
+    header = pd.read_csv(csv_path, nrows=0).columns
+    column_names = list(header)
+    feature_columns = column_names[feature_start:]
+    # A block must hold at least one full row; rows are roughly as wide as the header
+    chunk_bytes = max(int(chunk_mb * 1024 ** 2), 4 * len(header_line))
+
+    # Text columns are found once from the first block; one that only holds text further down the file
+    # fails that block's float parse and triggers a rescan with it added
+    text_columns = _infer_text_columns(csv_path, column_names, feature_columns, chunk_bytes)
+    while True:
+        try:
+            has_nan, nonzero, target_has_nan, n_rows = _scan_missing_columns(
+                csv_path, column_names, feature_columns, chunk_bytes, text_columns, target_column)
+            break
+        except pa.ArrowInvalid as e:
+            # A feature column holds text: parse it as strings and coerce it per block, then rescan
+            match = re.search(r"column #(\d+)", str(e))
+            column = header[int(match.group(1))] if match else None
+            if column is None or column not in feature_columns or column in text_columns:
+                raise
+            text_columns.add(column)
+
+    missing_columns = [column for column, missing in zip(feature_columns, has_nan) if missing]
+    clean_columns = [column for column, missing in zip(feature_columns, has_nan) if not missing]
+    print(f"Initial data shape: {(n_rows, len(feature_columns))}")
+    n_values = n_rows * len(clean_columns)
+    density = float(nonzero[~has_nan].sum() / n_values) if n_values else 0.0
+
+    target_type = pa.float64() if target_has_nan else pa.int64()
+    value_type = pa.float32() if np.dtype(feature_dtype) == np.float32 else pa.float64()
+    schema = pa.schema([pa.field(target_column, target_type)] +
+                       [pa.field(column, value_type) for column in clean_columns])
+    schema = schema.with_metadata({INTERMEDIATE_METADATA_KEY: json.dumps({
+        'target_column': target_column,
+        'n_samples': int(n_rows),
+        'n_features': len(clean_columns),
+        'missing_columns': missing_columns,
+        'duplicate_columns': [],
+        'density': density,
+    }).encode('utf-8')})
+
+    if output_format == 'parquet':
+        writer = pq.ParquetWriter(output_path, schema, compression='zstd')
+    else:
+        # Uncompressed Arrow IPC so readers can memory-map the columns without decoding
+        writer = pa.ipc.new_file(output_path, schema)
+    try:
+        for batch in _open_csv_stream(csv_path, column_names, feature_columns, chunk_bytes, text_columns):
+            arrays = [batch.column(target_column).cast(target_type)]
+            arrays += [_numeric_column(batch, column, text_columns).cast(value_type) for column in clean_columns]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+    finally:
+        writer.close()
+
+    seconds = time.perf_counter() - started
+    file_mb = os.path.getsize(csv_path) / 1024 ** 2
+    stats = {
+        'missing_columns': missing_columns,
+        'initial_shape': (n_rows, len(feature_columns)),
+        'cleaned_shape': (n_rows, len(clean_columns)),
+        'seconds': seconds,
+        'rows_per_second': n_rows / seconds if seconds else float('inf'),
+        'mb_per_second': file_mb / seconds if seconds else float('inf'),
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+    print(f"Data shape after cleaning: {stats['cleaned_shape']}")
+    print(f"Streaming preprocessing: {seconds:.2f}s, {stats['rows_per_second']:.1f} rows/s, "
+          f"{stats['mb_per_second']:.2f} MB/s, peak RSS {stats['peak_rss_mb']:.1f} MB")
+    return stats
+
+
+def preprocess_csv_in_memory(csv_path, output_path, output_format='parquet', feature_dtype='float64',
+                             target_column='group_2', feature_start=3):
+    """
+    Preprocess the abundance CSV with one pd.read_csv of the whole file (the default, non-streaming mode).
+
+    Parameters:
+    - csv_path (str): Path of the raw 'PC Pathway.csv' / 'PC Orthology.csv' export.
+    - output_path (str): Path of the intermediate to write.
+    - output_format (str): 'parquet', 'feather' or legacy 'pickle'.
+    - feature_dtype (str): 'float64' or 'float32' (half the memory).
+    - target_column (str): Name of the target column written first.
+    - feature_start (int): Index of the first feature column in the CSV.
+
+    Returns:
+    - dict: 'missing_columns', 'initial_shape' and 'cleaned_shape', as returned by preprocess_csv_streaming.
+    """
+    # Read the CSV files using pandas
+    function_data = pd.read_csv(csv_path)
+
+    # Preprocess the data
+    X_dat = function_data.iloc[:, feature_start:]
+
+    # Log the initial shape of the data
+    print(f"Initial data shape: {X_dat.shape}")
+
+    # Ensure data is numeric; only text columns need coercion, numeric ones are not copied
+    text_columns = [column for column, dtype in X_dat.dtypes.items()
+                    if not pd.api.types.is_numeric_dtype(dtype)]
+    X = X_dat.assign(**{column: pd.to_numeric(X_dat[column], errors='coerce') for column in text_columns}) \
+        if len(text_columns) else X_dat
+    y = function_data[target_column]  # Ensure 'group_2' exists in your CSV file
+
+    # Identify columns with missing values
+    has_nan = X.isna().any().to_numpy()
+    missing_columns = X.columns[has_nan]
+
+    # Keep the columns without NaN values and build the output frame in one step
+    clean_columns = X.columns[~has_nan]
+    print(f"Data shape after cleaning: {(X.shape[0], len(clean_columns))}")
+    data = X.loc[:, clean_columns]
+    if np.dtype(feature_dtype) == np.float32:
+        data = data.astype(np.float32)
+    data.insert(0, target_column, y)
+
+    # Save preprocessed data (missing/duplicate columns go into the file metadata)
+    save_intermediate(data, output_path, output_format, missing_columns.tolist(), target_column=target_column)
+    return {
+        'missing_columns': missing_columns.tolist(),
+        'initial_shape': X_dat.shape,
+        'cleaned_shape': (X.shape[0], len(clean_columns)),
+    }
+
 
 def lambda_handler(event, context=None):
     # 로컬 테스트를 위한 임의 버킷 이름
@@ -9,49 +295,38 @@ def lambda_handler(event, context=None):
 
     # Define the dataset type (Pathway or Orthology) from the event
     dataset_type = event.get('dataset_type', 'Pathway')  # Default to Pathway if not provided
+    output_format = event.get('output_format', 'parquet')  # 'parquet', 'feather' or legacy 'pickle'
+    extension = INTERMEDIATE_EXTENSIONS.get(output_format, output_format)
+    # Streaming mode reads the CSV in row chunks so wide exports fit in the Lambda memory limit
+    streaming = event.get('streaming', False) and output_format != 'pickle'
+    chunk_mb = event.get('chunk_mb', 16)  # Size of the CSV blocks parsed at once in streaming mode
+    feature_dtype = event.get('feature_dtype', 'float64')  # 'float32' halves the intermediate size
 
     # Determine the file paths based on dataset type
     if dataset_type == 'Pathway':
         function_file_path = 'PC-Pathway/PC Pathway.csv'
         intermediate_folder = 'PC-Pathway/intermediate/'
-        preprocessed_data_path = f"{intermediate_folder}preprocessed_data_pathway.pkl"
+        preprocessed_data_path = f"{intermediate_folder}preprocessed_data_pathway.{extension}"
         missing_columns_path = f"{intermediate_folder}missing_columns_pathway.json"
     else:  # For Orthology
         function_file_path = 'PC-Orthology/PC Orthology.csv'
         intermediate_folder = 'PC-Orthology/intermediate/'
-        preprocessed_data_path = f"{intermediate_folder}preprocessed_data_orthology.pkl"
+        preprocessed_data_path = f"{intermediate_folder}preprocessed_data_orthology.{extension}"
         missing_columns_path = f"{intermediate_folder}missing_columns_orthology.json"
     
     try:
         # 로컬 경로로 파일 읽기 (S3 다운로드 부분 대체)
         print(f"Loading local file from: {function_file_path}")
-        function_data = pd.read_csv(function_file_path)
-        
-        # Preprocess the data
-        X_dat = function_data.iloc[:, 3:]
-
-        # Log the initial shape of the data
-        print(f"Initial data shape: {X_dat.shape}")
-
-        X = X_dat.apply(pd.to_numeric, errors='coerce')  # Ensure data is numeric
-        y = function_data['group_2']  # Ensure 'group_2' exists in your CSV file
-
-        # Identify columns with missing values
-        missing_columns = X.columns[X.isna().any()]
-        
-        # Remove columns that contain NaN values
-        X_cleaned = X.dropna(axis=1)
-        
-        # Log the shape after cleaning
-        print(f"Data shape after cleaning: {X_cleaned.shape}")
-        
-        # Concatenate target variable and cleaned features
-        data = pd.concat([y, X_cleaned], axis=1)
-
-        # Save preprocessed data locally
-        data.to_pickle(preprocessed_data_path)
+        if streaming:
+            # Two chunked passes over the CSV: find NaN columns, then write the clean columns progressively
+            stats = preprocess_csv_streaming(function_file_path, preprocessed_data_path, output_format,
+                                             chunk_mb=chunk_mb, feature_dtype=feature_dtype)
+        else:
+            # Whole CSV read at once
+            stats = preprocess_csv_in_memory(function_file_path, preprocessed_data_path, output_format,
+                                             feature_dtype=feature_dtype)
+        missing_columns = pd.Index(stats['missing_columns'])
         print(f"Preprocessed data saved at: {preprocessed_data_path}")
-
         # Save missing columns information to a JSON file
         with open(missing_columns_path, 'w') as f:
             json.dump(missing_columns.tolist(), f)
@@ -1,17 +1,100 @@
+import argparse
+import importlib
 import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def load_handler(handler, handler_dir=None):
+    # 'module.function' as in the Dockerfile CMD, imported from handler_dir like the Lambda task root
+    if handler_dir:
+        sys.path.insert(0, os.path.abspath(handler_dir))
+    module_name, function_name = handler.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def summarize(seconds):
+    return {
+        'runs': len(seconds),
+        'min_seconds': round(min(seconds), 4),
+        'median_seconds': round(statistics.median(seconds), 4),
+        'max_seconds': round(max(seconds), 4),
+    }
+
+
+def cold_run(args):
+    """
+    One cold start: a fresh interpreter imports the handler and invokes it once.
+
+    Returns the import (init) time and the first-invocation time, measured inside the child process.
+    """
+    command = [sys.executable, os.path.abspath(__file__), '--handler', args.handler, '--event', args.event,
+               '--single']
+    if args.handler_dir:
+        command += ['--handler-dir', args.handler_dir]
+    completed = subprocess.run(command, capture_output=True, text=True, check=True)
+    # The child prints its timings as the last line, after the handler's own logs
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def single_run(args, event):
+    start = time.perf_counter()
+    lambda_handler = load_handler(args.handler, args.handler_dir)
+    imported = time.perf_counter()
+    lambda_handler(event, None)
+    print(json.dumps({'import_seconds': imported - start, 'invoke_seconds': time.perf_counter() - imported}))
 
-# Import your Lambda handler function
-from data_preprocessing_copy import lambda_handler  # Replace with actual file name
 
 # Load event.json and invoke lambda_handler
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Invoke a Lambda handler locally and measure cold/warm latency.")
+    parser.add_argument('--handler', default='data_preprocessing_copy.lambda_handler',
+                        help="module.function of the handler, as in the Dockerfile CMD.")
+    parser.add_argument('--handler-dir', help="Directory the handler module is imported from (the task root).")
+    parser.add_argument('--event', default='event.json')
+    parser.add_argument('--warm', type=int, default=0, help="Repeated invocations in this process after the first.")
+    parser.add_argument('--cold', type=int, default=0, help="Invocations, each in a fresh interpreter.")
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'],
+                        help="Set the event's 'profile' key (handlers using utils.instrumentation).")
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
     # Load event data from event.json
-    with open("event.json") as f:
+    with open(args.event) as f:
         event = json.load(f)
-    
+    if args.profile:
+        event['profile'] = args.profile
+
+    if args.single:
+        single_run(args, event)
+        sys.exit(0)
+
+    timings = {}
+    if args.cold:
+        runs = [cold_run(args) for _ in range(args.cold)]
+        timings['cold_import'] = summarize([run['import_seconds'] for run in runs])
+        timings['cold_invoke'] = summarize([run['invoke_seconds'] for run in runs])
+        timings['cold_total'] = summarize([run['import_seconds'] + run['invoke_seconds'] for run in runs])
+
     # Invoke the Lambda handler function with the event data
+    lambda_handler = load_handler(args.handler, args.handler_dir)
+    start = time.perf_counter()
     result = lambda_handler(event, None)  # Passing None as context, which is optional for local testing
-    
-    # Print the output to the console
-    print(json.dumps(result, indent=2))
+    first = time.perf_counter() - start
 
+    warm = []
+    for _ in range(args.warm):
+        start = time.perf_counter()
+        result = lambda_handler(event, None)
+        warm.append(time.perf_counter() - start)
+
+    # Print the output to the console
+    print(json.dumps(result, indent=2, default=str))
+    if args.cold or args.warm:
+        timings['first_invoke_seconds'] = round(first, 4)
+        if warm:
+            timings['warm_invoke'] = summarize(warm)
+        print(json.dumps({'timings': timings}, indent=2))
@@ -0,0 +1,50 @@
+import time
+
+# Lambda entry point (see the Dockerfile CMD). Module load only uses the standard library, so the
+# init phase stays short; pandas, scipy and statsmodels are imported by the first invocation and
+# stay loaded for the warm ones.
+_LOADED_AT = time.perf_counter()
+_INVOCATIONS = 0
+
+
+def lambda_handler(event, context):
+    """
+    Run one univariate analysis (main.main) or the multi-dataset pipeline (pipeline.run_pipeline).
+
+    Event keys, in addition to those of main.main / pipeline.run_pipeline:
+    - dataset_types (list): When present, the event is passed to run_pipeline.
+    - profile (str): 'cprofile' or 'pyinstrument' to profile the invocation (default: off).
+    - profile_dir (str): Directory of the profile output (default: /tmp).
+    - output_dir (str): Directory main.main writes the result files to (default: /tmp, the task root is read-only).
+
+    Returns:
+    - dict: The result of the analysis with a 'metrics' entry (stage timings, peak memory, feature
+      counts, cold start), which is also logged as one JSON line.
+    """
+    global _INVOCATIONS
+    _INVOCATIONS += 1
+    from utils.instrumentation import Instrumentation, profiled
+
+    instrumentation = Instrumentation('univariate_analysis', cold_start=_INVOCATIONS == 1,
+                                      invocation=_INVOCATIONS,
+                                      seconds_since_load=round(time.perf_counter() - _LOADED_AT, 4),
+                                      request_id=getattr(context, 'aws_request_id', None))
+    try:
+        with profiled(event.get('profile'), event.get('profile_dir', '/tmp'),
+                      name=f"univariate_analysis_{_INVOCATIONS}") as profile:
+            if 'dataset_types' in event:
+                with instrumentation.stage('import'):
+                    from pipeline import run_pipeline
+                # In-process statistics unless the event sets n_jobs (no /dev/shm for a process pool in Lambda)
+                result = run_pipeline(event, instrumentation)
+            else:
+                # main imports the analysis modules inside its own 'import' stage
+                from main import main
+                result = main({'output_dir': '/tmp', **event}, instrumentation)
+        if profile['profile_path']:
+            instrumentation.record(profile_path=profile['profile_path'])
+    finally:
+        # Also logged when the analysis raised, so failed invocations keep their metrics line
+        metrics = instrumentation.emit()
+    result['metrics'] = metrics
+    return result
@@ -0,0 +1,45 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Make the statistical-analysis package importable when run as a script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic_data import make_synthetic_dataset
+from utils.compute_statistics import compute_statistics
+
+
+def time_method(data, method):
+    features = data.columns[1:]
+    data_control = data[data['group_2'] == 0]
+    data_cancer = data[data['group_2'] == 1]
+    start = time.perf_counter()
+    results = compute_statistics(data_control, data_cancer, features, method=method)
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-feature and vectorized compute_statistics.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 200000])
+    parser.add_argument('--loop-max-features', type=int, default=200000,
+                        help="Skip the per-feature loop above this many features.")
+    args = parser.parse_args()
+
+    print(f"{'features':>10} {'loop [s]':>10} {'vectorized [s]':>15} {'speedup':>8} {'max |diff|':>11}")
+    for n_features in args.sizes:
+        data = make_synthetic_dataset(n_features)
+        vec_time, vec_results = time_method(data, 'vectorized')
+        if n_features <= args.loop_max_features:
+            loop_time, loop_results = time_method(data, 'loop')
+            diff = np.nanmax(np.abs(loop_results[vec_results.columns].astype(float).values - vec_results.values))
+            print(f"{n_features:>10} {loop_time:>10.2f} {vec_time:>15.2f} {loop_time / vec_time:>7.1f}x {diff:>11.2e}")
+        else:
+            print(f"{n_features:>10} {'skipped':>10} {vec_time:>15.2f} {'-':>8} {'-':>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Make the statistical-analysis package importable when run as a script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic_data import make_synthetic_dataset
+from utils.correlation import pairwise_correlation
+
+
+def calculate_pairwise_spearman(df1, df2):
+    # Reference: the nested loop used in the correlation notebooks
+    correlation_matrix = pd.DataFrame(index=df1.columns, columns=df2.columns)
+    for col1 in df1.columns:
+        for col2 in df2.columns:
+            correlation_matrix.loc[col1, col2] = df1[col1].corr(df2[col2], method='spearman')
+    return correlation_matrix.astype(float)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the notebook pairwise Spearman loop with the matrix engine.")
+    parser.add_argument('--genera', type=int, default=130)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--loop-max-pairs', type=int, default=20000,
+                        help="Skip the nested loop above this many pairs.")
+    args = parser.parse_args()
+
+    genus = make_synthetic_dataset(args.genera, prefix='G', seed=1).drop(columns='group_2')
+    print(f"{'pairs':>10} {'loop [s]':>10} {'matrix [s]':>11} {'speedup':>8} {'max |dr|':>10}")
+    for n_features in args.sizes:
+        features = make_synthetic_dataset(n_features, constant_fraction=0.0, seed=2).drop(columns='group_2')
+        n_pairs = args.genera * n_features
+        start = time.perf_counter()
+        result = pairwise_correlation(genus, features)
+        matrix_time = time.perf_counter() - start
+        if n_pairs <= args.loop_max_pairs:
+            start = time.perf_counter()
+            reference = calculate_pairwise_spearman(genus, features)
+            loop_time = time.perf_counter() - start
+            diff = np.nanmax(np.abs(reference.to_numpy() - result['correlation'].to_numpy()))
+            print(f"{n_pairs:>10} {loop_time:>10.2f} {matrix_time:>11.3f} {loop_time / matrix_time:>7.1f}x {diff:>10.2e}")
+        else:
+            print(f"{n_pairs:>10} {'skipped':>10} {matrix_time:>11.3f} {'-':>8} {'-':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Make the statistical-analysis package importable when run as a script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic_data import make_synthetic_dataset
+from utils.diversity import alpha_diversity, beta_diversity
+
+# skbio metric names of the alpha-diversity notebook
+SKBIO_ALPHA = {'shannon': 'shannon', 'simpson': 'simpson', 'chao1': 'chao1', 'observed': 'observed_features'}
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare skbio alpha/beta diversity with the vectorized module.")
+    parser.add_argument('--taxa', type=int, default=130)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[476, 2000],
+                        help="Cohort sizes (samples); the PC cohort has 476.")
+    parser.add_argument('--block-size', type=int, default=256)
+    args = parser.parse_args()
+
+    try:
+        from skbio.diversity import alpha_diversity as skbio_alpha, beta_diversity as skbio_beta
+    except ImportError:
+        skbio_alpha = skbio_beta = None
+        print("scikit-bio is not installed; timing the vectorized module only.")
+
+    print(f"{'samples':>8} {'metric':>10} {'skbio [s]':>10} {'numpy [s]':>10} {'speedup':>8} {'max |d|':>10}")
+    for n_samples in args.sizes:
+        n_cancer = n_samples * 92 // 476
+        data = make_synthetic_dataset(args.taxa, n_cancer=n_cancer, n_control=n_samples - n_cancer,
+                                      constant_fraction=0.0, prefix='G', seed=4)
+        # Integer counts so chao1 (singletons/doubletons) is defined
+        counts = np.rint(data.iloc[:, 1:] * 10).astype(np.int64)
+        counts = counts[counts.sum(axis=1) > 0]
+
+        alpha, numpy_time = timed(lambda: alpha_diversity(counts))
+        rows = [('alpha (4)', numpy_time, None, None)]
+        if skbio_alpha is not None:
+            values = counts.to_numpy()
+            reference, skbio_time = timed(lambda: {metric: skbio_alpha(name, values)
+                                                   for metric, name in SKBIO_ALPHA.items()})
+            diff = max(np.nanmax(np.abs(reference[metric].to_numpy() - alpha[metric].to_numpy()))
+                       for metric in SKBIO_ALPHA)
+            rows = [('alpha (4)', numpy_time, skbio_time, diff)]
+
+        for metric in ('braycurtis', 'jaccard'):
+            distances, numpy_time = timed(lambda: beta_diversity(counts, metric, block_size=args.block_size))
+            if skbio_beta is not None:
+                reference, skbio_time = timed(lambda: skbio_beta(metric, counts.to_numpy()).data)
+                rows.append((metric, numpy_time, skbio_time, np.abs(reference - distances.to_numpy()).max()))
+            else:
+                rows.append((metric, numpy_time, None, None))
+
+        for metric, numpy_time, skbio_time, diff in rows:
+            if skbio_time is None:
+                print(f"{len(counts):>8} {metric:>10} {'-':>10} {numpy_time:>10.3f} {'-':>8} {'-':>10}")
+            else:
+                print(f"{len(counts):>8} {metric:>10} {skbio_time:>10.3f} {numpy_time:>10.3f} "
+                      f"{skbio_time / numpy_time:>7.1f}x {diff:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+# Make the statistical-analysis package importable when run as a script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from utils.kegg_index import load_kegg_index
+
+
+def make_mapping(n_pathways, n_orthologies, n_edges, seed=0):
+    # pathway_Orthology_map layout, with the trailing whitespace the Excel export carries
+    rng = np.random.default_rng(seed)
+    pathways = [f'ko{i:05d}' for i in rng.choice(100000, n_pathways, replace=False)]
+    orthologies = [f'K{i:05d}' for i in range(n_orthologies)]
+    mapping_df = pd.DataFrame({'Pathway_ID': rng.choice(pathways, n_edges),
+                               'Orthology_kegg_no': [f'{o}\xa0' for o in rng.choice(orthologies, n_edges)]})
+    return mapping_df.drop_duplicates(), orthologies
+
+
+def notebook_merge(results, mapping_df):
+    # orthology_merge.ipynb: strip, left merge on the mapping, drop rows without a pathway
+    mapping_df = mapping_df.assign(
+        Orthology_kegg_no=mapping_df['Orthology_kegg_no'].str.replace(r'[\s\xa0]+', '', regex=True))
+    data = pd.merge(results.reset_index(), mapping_df, how='left', right_on='Orthology_kegg_no',
+                    left_on='KEGG_no').dropna(subset='Pathway_ID')
+    return data.drop(columns=['KEGG_no'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notebook merge/groupby vs the prebuilt KEGG mapping index.")
+    parser.add_argument('--pathways', type=int, default=400)
+    parser.add_argument('--orthologies', type=int, default=15000)
+    parser.add_argument('--edges', type=int, default=60000)
+    parser.add_argument('--samples', type=int, default=476)
+    args = parser.parse_args()
+
+    mapping_df, orthologies = make_mapping(args.pathways, args.orthologies, args.edges)
+    rng = np.random.default_rng(1)
+    results = pd.DataFrame({'FC_value': rng.lognormal(size=len(orthologies)),
+                            'Wilcoxon_p': rng.random(len(orthologies))}, index=pd.Index(orthologies, name='KEGG_no'))
+    abundances = pd.DataFrame(rng.random((args.samples, len(orthologies))), columns=orthologies)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mapping_file = os.path.join(tmp, 'pathway_Orthology_map.csv')
+        mapping_df.to_csv(mapping_file, index=False)
+        timings = {}
+        start = time.perf_counter()
+        index = load_kegg_index(mapping_file)
+        timings['build index'] = time.perf_counter() - start
+        start = time.perf_counter()
+        index = load_kegg_index(mapping_file)
+        timings['open index'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    merged = notebook_merge(results, mapping_df)
+    timings['notebook merge'] = time.perf_counter() - start
+    start = time.perf_counter()
+    expanded = index.expand(results)
+    timings['index expand'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    grouped = merged.groupby('Pathway_ID')['Wilcoxon_p'].min()
+    timings['groupby min p'] = time.perf_counter() - start
+    start = time.perf_counter()
+    rolled = index.rollup(results['Wilcoxon_p'], how='min')
+    timings['rollup min p'] = time.perf_counter() - start
+
+    # Subset of the orthologies (the strongest ones only): most pathways are empty, which the min/max
+    # segment reduction must skip without shortening the segments around them
+    significant = results.index[results['Wilcoxon_p'] < 0.001]
+    subset = merged[merged['Orthology_kegg_no'].isin(significant)].groupby('Pathway_ID')['Wilcoxon_p']
+    subset_diffs = []
+    for how in ('min', 'max'):
+        expected = subset.agg(how)
+        subset_rolled = index.rollup(results.loc[significant, 'Wilcoxon_p'], how=how)
+        subset_diffs.append(np.nanmax(np.abs(subset_rolled.reindex(expected.index) - expected)))
+        subset_diffs.append(float(subset_rolled.drop(expected.index).notna().sum()))  # Empty pathways stay NaN
+
+    # Notebook route: long format joined to the mapping, then a groupby per pathway
+    start = time.perf_counter()
+    long = abundances.T.rename_axis('KEGG_no').reset_index().merge(
+        notebook_merge(pd.DataFrame(index=results.index), mapping_df), left_on='KEGG_no', right_on='Orthology_kegg_no')
+    grouped_abundance = long.drop(columns=['KEGG_no', 'Orthology_kegg_no']).groupby('Pathway_ID').sum().T
+    timings['merge+groupby abundance'] = time.perf_counter() - start
+    start = time.perf_counter()
+    rolled_abundance = index.rollup(abundances, how='sum')
+    timings['rollup abundance sum'] = time.perf_counter() - start
+
+    for name, seconds in timings.items():
+        print(f"{name:>22}: {seconds:.4f}s")
+    key = ['Pathway_ID', 'Orthology_kegg_no']
+    same_rows = len(merged) == len(expanded) and merged.sort_values(key)[key].to_numpy().tolist() == \
+        expanded.sort_values(key)[key].to_numpy().tolist()
+    print(f"expand rows match merge: {same_rows}")
+    print(f"max |d min p|: {np.nanmax(np.abs(rolled.reindex(grouped.index) - grouped)):.2e}")
+    print(f"subset min/max p: max |d| {max(subset_diffs[0], subset_diffs[2]):.2e}, "
+          f"{int(subset_diffs[1] + subset_diffs[3])} values on empty pathways")
+    diff = np.abs(rolled_abundance[grouped_abundance.columns].to_numpy() - grouped_abundance.to_numpy()).max()
+    print(f"max |d abundance sum|: {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
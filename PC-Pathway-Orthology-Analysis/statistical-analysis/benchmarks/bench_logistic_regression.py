@@ -0,0 +1,77 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+# Make the statistical-analysis package importable when run as a script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic_data import make_synthetic_dataset
+from utils.compute_statistics import compute_statistics
+from utils.logistic_regression_univariate_w_BH import logistic_regression_univariate_w_BH
+
+
+def time_method(data, method):
+    features = data.columns[1:]
+    results = compute_statistics(data[data['group_2'] == 0], data[data['group_2'] == 1], features)
+    start = time.perf_counter()
+    # Silence the per-run debug prints so they do not dominate the timing
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        results, problematic = logistic_regression_univariate_w_BH(data, features, results, method=method)
+    return time.perf_counter() - start, results, problematic
+
+
+def agreement(ref_results, ref_problematic, batched_results, batched_problematic, tolerance):
+    # Same problematic features, same NaN pattern, and p-values (raw and FDR) within tolerance
+    problems = []
+    if set(ref_problematic) != set(batched_problematic):
+        problems.append(f"problematic features differ: {sorted(set(ref_problematic) ^ set(batched_problematic))}")
+    for column in ('LogReg_p_univ', 'LogReg_p_fdr'):
+        ref = ref_results[column].astype(float).to_numpy()
+        batched = batched_results[column].astype(float).to_numpy()
+        if not np.array_equal(np.isnan(ref), np.isnan(batched)):
+            problems.append(f"{column}: NaN pattern differs")
+        elif np.nanmax(np.abs(ref - batched), initial=0.0) > tolerance:
+            problems.append(f"{column}: max |dp| {np.nanmax(np.abs(ref - batched)):.2e} > {tolerance:.0e}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare batched and statsmodels univariate logistic regression.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--reference-max-features', type=int, default=10000,
+                        help="Skip the statsmodels reference path above this many features.")
+    parser.add_argument('--tolerance', type=float, default=1e-8,
+                        help="Maximum |dp| between the two paths; the script exits with 1 above it.")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'features':>10} {'statsmodels [s]':>16} {'batched [s]':>12} {'speedup':>8} {'max |dp|':>10} {'agree':>6}")
+    for n_features in args.sizes:
+        data = make_synthetic_dataset(n_features)
+        batched_time, batched_results, batched_problematic = time_method(data, 'batched')
+        if n_features <= args.reference_max_features:
+            ref_time, ref_results, ref_problematic = time_method(data, 'statsmodels')
+            diff = np.nanmax(np.abs(ref_results['LogReg_p_univ'].astype(float) - batched_results['LogReg_p_univ']))
+            problems = agreement(ref_results, ref_problematic, batched_results, batched_problematic, args.tolerance)
+            failures += [f"{n_features} features: {problem}" for problem in problems]
+            print(f"{n_features:>10} {ref_time:>16.2f} {batched_time:>12.2f} {ref_time / batched_time:>7.1f}x "
+                  f"{diff:>10.2e} {'no' if problems else 'yes':>6}")
+        else:
+            print(f"{n_features:>10} {'skipped':>16} {batched_time:>12.2f} {'-':>8} {'-':>10} {'-':>6}")
+
+    for failure in failures:
+        print(f"Disagreement: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
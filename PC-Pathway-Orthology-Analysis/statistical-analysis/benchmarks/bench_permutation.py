@@ -0,0 +1,37 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+# Make the statistical-analysis package importable when run as a script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic_data import make_synthetic_dataset
+from utils.permutation import permutation_p_values
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Permutation throughput of the batched permutation engine.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--permutations', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--n-jobs', type=int, nargs='+', default=[1, -1])
+    parser.add_argument('--early-stop-hits', type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{'features':>10} {'n_jobs':>7} {'seconds':>9} {'perm/s':>10} {'feature-perm/s':>15}")
+    for n_features in args.sizes:
+        data = make_synthetic_dataset(n_features)
+        for n_jobs in args.n_jobs:
+            with contextlib.redirect_stdout(io.StringIO()):
+                _, report = permutation_p_values(data, data.columns[1:], n_permutations=args.permutations,
+                                                 batch_size=args.batch_size, n_jobs=n_jobs,
+                                                 early_stop_hits=args.early_stop_hits)
+            print(f"{n_features:>10} {n_jobs:>7} {report['seconds']:>9.2f} {report['permutations_per_second']:>10.0f} "
+                  f"{report['feature_permutations_per_second']:>15.3g}")
+
+
+if __name__ == "__main__":
+    main()
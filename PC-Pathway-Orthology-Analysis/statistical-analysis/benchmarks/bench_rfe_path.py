@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Make the statistical-analysis package importable when run as a script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from sklearn.feature_selection import RFE
+from sklearn.linear_model import LogisticRegression
+
+from synthetic_data import make_synthetic_dataset
+from utils.cv_rfe import (load_rfe_rounds, parse_step_schedule, rfe_elimination_path, select_from_path,
+                          store_rfe_rounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check path-based RFE selection against sklearn's RFE, fresh and extended from a cached path.")
+    parser.add_argument('--features', type=int, default=26)
+    parser.add_argument('--step', type=int, default=3)
+    parser.add_argument('--cached-min', type=int, default=25, help="min_features of the first (cached) run.")
+    parser.add_argument('--min', type=int, default=10, help="min_features of the extended run.")
+    args = parser.parse_args()
+
+    data = make_synthetic_dataset(args.features, constant_fraction=0.0, seed=5)
+    X, y = data.iloc[:, 1:], data.iloc[:, 0].to_numpy()
+    estimator = LogisticRegression(max_iter=2000)
+    schedule = parse_step_schedule(str(args.step))
+
+    started = time.perf_counter()
+    fresh = rfe_elimination_path(estimator, X, y, schedule, args.min)
+    fresh_seconds = time.perf_counter() - started
+
+    # First run stops at cached_min and is stored; the second run extends the cached path down to min
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store_rfe_rounds(cache_dir, 'path', rfe_elimination_path(estimator, X, y, schedule, args.cached_min))
+        cached = load_rfe_rounds(cache_dir, 'path')
+    extended = rfe_elimination_path(estimator, X, y, schedule, args.min, rounds=cached)
+
+    started = time.perf_counter()
+    mismatches = {'fresh': [], 'extended': []}
+    for n_features in range(args.min, args.features + 1):
+        reference = set(X.columns[RFE(estimator, n_features_to_select=n_features, step=args.step)
+                                  .fit(X, y).support_])
+        for name, rounds in (('fresh', fresh), ('extended', extended)):
+            if set(select_from_path(rounds, n_features)) != reference:
+                mismatches[name].append(n_features)
+    sklearn_seconds = time.perf_counter() - started
+
+    print(f"Path rounds: fresh {[len(r['features']) for r in fresh]}, "
+          f"extended {[len(r['features']) for r in extended]}")
+    print(f"One path: {fresh_seconds:.2f}s, sklearn RFE for {args.features - args.min + 1} targets: "
+          f"{sklearn_seconds:.2f}s")
+    for name, values in mismatches.items():
+        print(f"{name:>9}: {'matches sklearn for every n' if not values else f'differs for n = {values}'}")
+
+
+if __name__ == "__main__":
+    main()
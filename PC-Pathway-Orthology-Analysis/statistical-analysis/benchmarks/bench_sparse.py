@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Make the statistical-analysis package importable when run as a script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from run_benchmarks import load_preprocessing, time_call
+from synthetic_data import make_synthetic_dataset
+from utils.compute_statistics import compute_statistics
+from utils.correlation import pairwise_correlation
+from utils.intermediate import load_preprocessed_data
+from utils.logistic_regression_univariate_w_BH import logistic_regression_univariate_w_BH
+from utils.sparse_features import FEATURE_BACKENDS, frame_memory_mb, split_groups
+
+
+def run_backend(path, backend, n_jobs, n_correlated, repeat):
+    # Memory of the loaded frame and best-of-repeat time of every stage, plus the results for comparison
+    outputs = {}
+
+    def load():
+        outputs['data'], _ = load_preprocessed_data(path, backend=backend)
+
+    def statistics():
+        control, cancer = split_groups(outputs['data'])
+        outputs['statistics'] = compute_statistics(control, cancer, outputs['data'].columns[1:], n_jobs=n_jobs)
+
+    def logistic():
+        outputs['logistic'], _ = logistic_regression_univariate_w_BH(
+            outputs['data'], outputs['data'].columns[1:], outputs['statistics'].copy(), n_jobs=n_jobs)
+
+    def correlation():
+        features = outputs['data'].iloc[:, 1:]
+        outputs['correlation'] = pairwise_correlation(features.iloc[:, :n_correlated], features)
+
+    timings = {stage: time_call(func, repeat) for stage, func in
+               [('load', load), ('statistics', statistics), ('logistic', logistic), ('correlation', correlation)]}
+    return frame_memory_mb(outputs['data']), timings, outputs
+
+
+def max_difference(result, reference, columns):
+    return float(np.nanmax(np.abs(result[columns].to_numpy(dtype=np.float64) -
+                                  reference[columns].to_numpy(dtype=np.float64))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and runtime of the dense, float32 and sparse backends.")
+    parser.add_argument('--features', type=int, default=10000)
+    parser.add_argument('--zero-fraction', type=float, default=0.8)
+    parser.add_argument('--correlated', type=int, default=130, help="Left-hand features of the correlation stage.")
+    parser.add_argument('--n-jobs', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    data = make_synthetic_dataset(args.features, zero_fraction=args.zero_fraction, seed=3)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'preprocessed_data.parquet')
+        load_preprocessing().save_intermediate(data, path)
+        runs = {backend: run_backend(path, backend, args.n_jobs, args.correlated, args.repeat)
+                for backend in FEATURE_BACKENDS}
+
+    density = np.count_nonzero(data.iloc[:, 1:].to_numpy()) / data.iloc[:, 1:].size
+    print(f"{data.shape[0]} samples x {args.features} features, density {density:.3f}")
+    # Wilcoxon p and r must agree; quasi-separated features that do not converge can end at very different
+    # logistic p-values after float32 rounding, so those are counted instead (> 1e-6 apart)
+    print(f"{'backend':>8} {'memory [MB]':>12} {'load [s]':>9} {'stats [s]':>10} {'logit [s]':>10} {'corr [s]':>9} "
+          f"{'max |dp|':>10} {'logit diff':>11} {'max |dr|':>10}")
+    _, _, reference = runs['dense']
+    for backend, (memory, timings, outputs) in runs.items():
+        dp = max_difference(outputs['statistics'], reference['statistics'], ['Wilcoxon_p'])
+        logistic_diff = int((outputs['logistic']['LogReg_p_univ'] - reference['logistic']['LogReg_p_univ']).abs()
+                            .gt(1e-6).sum())
+        dr = float(np.nanmax(np.abs(outputs['correlation']['correlation'].to_numpy() -
+                                    reference['correlation']['correlation'].to_numpy())))
+        print(f"{backend:>8} {memory:>12.1f} {timings['load']:>9.3f} {timings['statistics']:>10.3f} "
+              f"{timings['logistic']:>10.3f} {timings['correlation']:>9.3f} {dp:>10.2e} {logistic_diff:>11} "
+              f"{dr:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Make the statistical-analysis package importable when run as a script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic_data import make_synthetic_dataset, write_synthetic_csv
+from utils.compute_statistics import compute_statistics
+from utils.logistic_regression_univariate_w_BH import logistic_regression_univariate_w_BH
+from utils.save_and_upload_results import save_and_upload_results
+
+DEFAULT_BASELINE = os.path.join(current_dir, 'baseline.json')
+PREPROCESSING_MODULE = os.path.join(os.path.dirname(os.path.dirname(current_dir)), 'data-preprocessing',
+                                    'data_preprocessing.py')
+
+
+def load_preprocessing():
+    # data-preprocessing is a Lambda source folder, not a package: load the module from its file
+    spec = importlib.util.spec_from_file_location('data_preprocessing', PREPROCESSING_MODULE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def time_call(func, repeat):
+    # Best of `repeat` runs with the stage's prints silenced, so they do not dominate the timing
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_suite(n_features, repeat, work_dir):
+    """
+    Time every pipeline stage separately on one synthetic dataset.
+
+    Returns:
+    - dict: Case name -> best wall time in seconds.
+    """
+    preprocessing = load_preprocessing()
+    data = make_synthetic_dataset(n_features)
+    features = data.columns[1:]
+    data_control = data[data['group_2'] == 0]
+    data_cancer = data[data['group_2'] == 1]
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = compute_statistics(data_control, data_cancer, features)
+        fitted, _ = logistic_regression_univariate_w_BH(data, features, results.copy())
+
+    csv_path = os.path.join(work_dir, 'synthetic.csv')
+    write_synthetic_csv(csv_path, n_features)
+    label_path = os.path.join(work_dir, 'labels.csv')
+    pd.DataFrame({'KEGG_no': features, 'orthology_names': [f"name {f}" for f in features]}).to_csv(
+        label_path, index=False)
+
+    def preprocess_in_memory():
+        preprocessing.preprocess_csv_in_memory(csv_path, os.path.join(work_dir, 'in_memory.parquet'))
+
+    def preprocess_streaming():
+        preprocessing.preprocess_csv_streaming(csv_path, os.path.join(work_dir, 'streaming.parquet'))
+
+    def export(output_format):
+        save_and_upload_results('Orthology', fitted, label_path, output_format=output_format, output_dir=work_dir)
+
+    cases = {
+        'compute_statistics': lambda: compute_statistics(data_control, data_cancer, features),
+        'logistic_regression_univariate_w_BH': lambda: logistic_regression_univariate_w_BH(
+            data, features, results.copy()),
+        'preprocessing_in_memory': preprocess_in_memory,
+        'preprocessing_streaming': preprocess_streaming,
+        'save_and_upload_results_parquet': lambda: export('parquet'),
+        'save_and_upload_results_xlsx': lambda: export('xlsx'),
+    }
+    timings = {}
+    for name, func in cases.items():
+        timings[name] = time_call(func, repeat)
+        print(f"{name:<40} {timings[name]:>10.4f}s")
+    return timings
+
+
+def compare(timings, baseline, max_regression, min_seconds):
+    # A case regresses when it is slower than baseline * (1 + max_regression%) by more than min_seconds
+    failures = []
+    print(f"\n{'case':<40} {'baseline [s]':>13} {'current [s]':>12} {'change':>8}")
+    for name, current in timings.items():
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"{name:<40} {'-':>13} {current:>12.4f} {'new':>8}")
+            continue
+        change = (current - reference) / reference * 100
+        regressed = current > reference * (1 + max_regression / 100) and current - reference > min_seconds
+        print(f"{name:<40} {reference:>13.4f} {current:>12.4f} {change:>+7.1f}%{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            failures.append(name)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the statistical-analysis stages on synthetic data and "
+                                                 "fail on regressions against a stored baseline.")
+    parser.add_argument('--features', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case; the best one is kept.")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--max-regression', type=float, default=25.0,
+                        help="Allowed slowdown against the baseline, in percent.")
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help="Ignore slowdowns smaller than this many seconds (timer noise).")
+    parser.add_argument('--update-baseline', action='store_true', help="Store this run as the new baseline.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        timings = run_suite(args.features, args.repeat, work_dir)
+
+    key = f"features={args.features}"
+    stored = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+
+    if args.update_baseline:
+        stored[key] = {
+            'machine': f"{platform.machine()} {platform.python_version()} numpy {np.__version__}",
+            'timings': {name: round(seconds, 4) for name, seconds in timings.items()},
+        }
+        with open(args.baseline, 'w') as f:
+            json.dump(stored, f, indent=2)
+        print(f"Baseline for {key} written to {args.baseline}")
+        return 0
+
+    if key not in stored:
+        print(f"No baseline for {key} in {args.baseline}; run with --update-baseline first.")
+        return 0
+    failures = compare(timings, stored[key]['timings'], args.max_regression, args.min_seconds)
+    if failures:
+        print(f"\n{len(failures)} case(s) regressed more than {args.max_regression}%: {', '.join(failures)}")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
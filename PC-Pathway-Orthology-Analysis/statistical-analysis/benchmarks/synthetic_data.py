@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+# Cohort layout of the PC data: 92 pancreatic cancer (group_2 == 1) and 384 healthy controls (group_2 == 0)
+N_CANCER = 92
+N_CONTROL = 384
+# Leading metadata columns of 'PC Pathway.csv' / 'PC Orthology.csv'; features start at column 3
+CSV_ID_COLUMNS = ['sample_id', 'group']
+
+
+def make_synthetic_dataset(n_features, n_cancer=N_CANCER, n_control=N_CONTROL, zero_fraction=0.6,
+                           constant_fraction=0.01, separating_fraction=0.005, effect_fraction=0.05,
+                           prefix='K', seed=0):
+    """
+    Microbiome-like abundance matrix in the preprocessed layout ('group_2' followed by the features).
+
+    Values are zero-inflated lognormal abundances with per-feature scale and sparsity. A fraction of
+    the features is shifted in the cancer group, some are constant (all zero) and some separate the
+    groups perfectly, so the constant/separation branches of the logistic regression are exercised.
+
+    Parameters:
+    - n_features (int): Number of feature columns.
+    - n_cancer, n_control (int): Group sizes (default: the 92 PC vs 384 HC of the cohort).
+    - zero_fraction (float): Mean fraction of zero abundances per feature.
+    - constant_fraction (float): Fraction of constant (all-zero) features.
+    - separating_fraction (float): Fraction of features that separate the groups perfectly.
+    - effect_fraction (float): Fraction of features with a shifted cancer-group mean.
+    - prefix (str): Feature name prefix ('K' for orthologies, 'map' for pathways).
+    - seed (int): Random seed; the same arguments always give the same frame.
+
+    Returns:
+    - pd.DataFrame: 'group_2' (int) followed by float64 feature columns.
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = n_cancer + n_control
+    group_2 = np.r_[np.ones(n_cancer, dtype=int), np.zeros(n_control, dtype=int)]
+
+    # Per-feature log-scale and sparsity, so features differ like real taxa/orthologies do
+    log_scale = rng.normal(0.0, 2.0, size=n_features)
+    sparsity = np.clip(rng.beta(2.0, 2.0 * (1 - zero_fraction) / zero_fraction, size=n_features), 0.0, 0.99)
+    values = rng.lognormal(mean=log_scale, sigma=1.0, size=(n_samples, n_features))
+    values[rng.random((n_samples, n_features)) < sparsity] = 0.0
+
+    features = rng.permutation(n_features)
+    n_effect = int(round(effect_fraction * n_features))
+    n_constant = int(round(constant_fraction * n_features))
+    n_separating = int(round(separating_fraction * n_features))
+    effect = features[:n_effect]
+    constant = features[n_effect:n_effect + n_constant]
+    separating = features[n_effect + n_constant:n_effect + n_constant + n_separating]
+
+    values[:n_cancer, effect] *= rng.lognormal(1.0, 0.5, size=n_effect)
+    values[:, constant] = 0.0
+    # Cancer samples strictly above every control sample
+    values[:, separating] = np.where(group_2[:, None] == 1,
+                                     rng.uniform(2.0, 3.0, size=(n_samples, n_separating)),
+                                     rng.uniform(0.0, 1.0, size=(n_samples, n_separating)))
+
+    data = pd.DataFrame(values, columns=[f"{prefix}{i:05d}" for i in range(n_features)])
+    data.insert(0, 'group_2', group_2)
+    return data
+
+
+def write_synthetic_csv(path, n_features, missing_fraction=0.01, seed=0, **kwargs):
+    """
+    Write a synthetic dataset in the raw CSV layout read by data-preprocessing (3 leading columns).
+
+    Parameters:
+    - path (str): Output CSV path.
+    - n_features (int): Number of feature columns.
+    - missing_fraction (float): Fraction of feature columns with one blank cell, dropped by preprocessing.
+    - seed (int): Random seed.
+    - kwargs: Passed to make_synthetic_dataset.
+
+    Returns:
+    - pd.DataFrame: The frame that was written.
+    """
+    data = make_synthetic_dataset(n_features, seed=seed, **kwargs)
+    rng = np.random.default_rng(seed + 1)
+    n_missing = int(round(missing_fraction * n_features))
+    if n_missing:
+        columns = data.columns[1:][rng.choice(n_features, size=n_missing, replace=False)]
+        rows = rng.integers(0, len(data), size=n_missing)
+        for row, column in zip(rows, columns):
+            data.loc[row, column] = np.nan
+
+    data.insert(0, CSV_ID_COLUMNS[1], np.where(data['group_2'] == 1, 'PC', 'HC'))
+    data.insert(0, CSV_ID_COLUMNS[0], [f"S{i:04d}" for i in range(len(data))])
+    data.to_csv(path, index=False)
+    return data
@@ -0,0 +1,103 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.correlation import calculate_correlation
+
+# Sample groups of the cohort: (output name, value of the group column)
+GROUPS = [('PC', 1), ('Control', 0)]
+
+
+def select_regulated_features(results_file, fold_change_threshold=1.0, significance_threshold=1.3,
+                              logistic_threshold=0.05):
+    # Up/downregulated KEGG_no from a save_and_upload_results output, with the thresholds of the notebooks
+    results = pd.read_excel(results_file) if results_file.endswith('.xlsx') else pd.read_parquet(results_file)
+    significant = ((-np.log10(results['Wilcoxon_p']) > significance_threshold) &
+                   (results['LogReg_p_fdr'] < logistic_threshold))
+    up = results.loc[significant & (results['log2FC_value'] > fold_change_threshold), 'KEGG_no'].tolist()
+    down = results.loc[significant & (results['log2FC_value'] < -fold_change_threshold), 'KEGG_no'].tolist()
+    return up, down
+
+
+def run_correlation_analysis(event):
+    """
+    Genus x pathway/orthology correlation analysis of the correlation notebooks, as a script.
+
+    For each group (PC, Control) and genus set (UpGenus, DownGenus) the normality-gated correlations
+    with the up- and downregulated features are written to
+    {output_dir}/{label}_Correlation_{group}_{genus set}.xlsx.
+
+    Event keys:
+    - taxonomy_path (str): Genus abundance CSV with 'study_no' and 'group_1'.
+    - data_path (str): 'PC Pathway.csv' / 'PC Orthology.csv' with 'study_no' and 'group_2'.
+    - label (str): 'Pathway' or 'Orthology'.
+    - up_genus, down_genus (list): Genus columns.
+    - up, down (list): Regulated features; or results_file (str) to select them from the statistics output.
+    - alpha, min_abs_correlation (float): Significance and effect-size filters.
+    - output_dir (str): Folder for the Excel files (default: current directory).
+
+    Returns:
+    - dict: statusCode, output paths and the number of significant pairs per file.
+    """
+    label = event.get('label', 'Pathway')
+    alpha = event.get('alpha', 0.05)
+    min_abs_correlation = event.get('min_abs_correlation', 0.3)
+    output_dir = event.get('output_dir', '.')
+    up, down = event.get('up'), event.get('down')
+    genus_sets = {'UpGenus': event.get('up_genus', []), 'DownGenus': event.get('down_genus', [])}
+
+    try:
+        started = time.perf_counter()
+        tax_data = pd.read_csv(event['taxonomy_path']).set_index('study_no')
+        feature_data = pd.read_csv(event['data_path']).set_index('study_no')
+        if up is None or down is None:
+            up, down = select_regulated_features(event['results_file'])
+        print(f"{len(up)} upregulated and {len(down)} downregulated {label} features")
+
+        # Align both tables on study_no so every row pairs the same sample
+        samples = tax_data.index.intersection(feature_data.index)
+        tax_data, feature_data = tax_data.loc[samples], feature_data.loc[samples]
+
+        os.makedirs(output_dir, exist_ok=True)
+        outputs = {}
+        for group_name, group_value in GROUPS:
+            tax_group = tax_data[tax_data['group_1'] == group_value]
+            feature_group = feature_data.loc[tax_group.index]
+            for genus_set, genera in genus_sets.items():
+                if not genera:
+                    continue
+                corr_df = calculate_correlation(tax_group, feature_group, genera, up, down, label=label,
+                                                alpha=alpha, min_abs_correlation=min_abs_correlation,
+                                                group=group_name)
+                local_file_path = os.path.join(output_dir, f"{label}_Correlation_{group_name}_{genus_set}.xlsx")
+                corr_df.to_excel(local_file_path, index=False)
+                outputs[local_file_path] = len(corr_df)
+                print(f"{len(corr_df)} significant pairs written to {local_file_path}")
+        print(f"Correlation analysis finished in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'error': f"Error during correlation analysis: {e}"
+        }
+
+    return {
+        'statusCode': 200,
+        'outputs': outputs
+    }
+
+
+if __name__ == "__main__":
+    event = {
+        'taxonomy_path': './data/PC_normalized_PC92_HC384_130 genus_ML.csv',
+        'data_path': './data/PC Pathway.csv',
+        'label': 'Pathway',
+        'up_genus': ['Desulfovibrio', 'Fretibacterium', 'Lactobacillus', 'Leuconostoc',
+                     'Olsenella', 'Parvimonas', 'Ralstonia'],
+        'down_genus': ['Pseudomonas', 'Simonsiella'],
+        'results_file': './statistical_analysis_results_with_labels_Pathway.xlsx',
+        'output_dir': './correlation_outputs',
+    }
+    print(json.dumps(run_correlation_analysis(event), indent=2))
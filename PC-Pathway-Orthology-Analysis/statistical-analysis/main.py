@@ -1,23 +1,28 @@
-import boto3
-import pandas as pd
-import pickle
-import os
-import sys
-
-# 현재 파일의 디렉토리를 기준으로 utils 폴더를 Python 경로에 추가
-current_dir = os.path.dirname(os.path.abspath(__file__))
-utils_path = os.path.join(current_dir, "utils")
-sys.path.append(utils_path)
-print(utils_path)
-print(current_dir)
-# Import the helper functions
-from utils.compute_statistics import compute_statistics
-from utils.logistic_regression_univariate_w_BH import logistic_regression_univariate_w_BH
-from utils.lda_analysis import lda_analysis
-from utils.save_and_upload_results import save_and_upload_results
+from utils.instrumentation import Instrumentation
+
+# Only the standard library and utils.instrumentation are imported at module load; pandas, scipy and
+# boto3 come in with the analysis modules on the first call (see UnivariateAnalysisFunction.py)
 
 # def lambda_handler(event, context):
-def main(event):
+def main(event, instrumentation=None):
+    """
+    Univariate analysis of one dataset type; stage timings and counts go to `instrumentation`.
+
+    When no Instrumentation is passed, one is created and its JSON metrics line is emitted on every
+    return, including the 400/500 error responses.
+    """
+    owns_instrumentation = instrumentation is None
+    instrumentation = instrumentation or Instrumentation('main')
+    try:
+        result = _run_analysis(event, instrumentation)
+        instrumentation.record(statusCode=result['statusCode'])
+        return result
+    finally:
+        if owns_instrumentation:
+            instrumentation.emit()
+
+
+def _run_analysis(event, instrumentation):
     # Initialize boto3 S3 client
     # s3 = boto3.client('s3')
     
@@ -28,6 +33,20 @@ def main(event):
     # label_file_s3_key = event.get('label_file_s3_key')
     preprocessed_data_local_path = event.get("preprocessed_data_local_path")
     label_file_local_path = event.get('label_file_local_path')
+    n_jobs = event.get('n_jobs', 1)  # Worker processes for the per-feature statistics (-1 for all cores)
+    chunk_size = event.get('chunk_size')  # Features per worker task, None splits the features evenly
+    feature_columns = event.get('feature_columns')  # Optional subset of features to load and analyse
+    cache_dir = event.get('cache_dir')  # Reuse per-feature results of unchanged inputs when set
+    cache_max_mb = event.get('cache_max_mb', 1024)
+    fdr_method = event.get('fdr_method', 'fdr_bh')  # 'fdr_bh', 'fdr_by' or 'qvalue' (Storey)
+    # Quasi-separated features (e.g. nonzero in cancer samples only) out of the logistic regression and its FDR
+    exclude_quasi_separation = event.get('exclude_quasi_separation', False)
+    output_format = event.get('output_format', 'xlsx')  # 'xlsx', 'parquet', 'csv.gz', 'arrow' or a list of them
+    output_dir = event.get('output_dir', '.')  # Directory of the local result files (writable /tmp on Lambda)
+    permutations = event.get('permutations', 0)  # Label permutations for empirical p-values, 0 to skip
+    permutation_seed = event.get('permutation_seed', 0)
+    permutation_early_stop = event.get('permutation_early_stop')  # Stop a feature after this many exceedances
+    feature_backend = event.get('feature_backend', 'dense')  # 'dense', 'float32' or 'sparse' (mostly-zero data)
 
     
     # Handle missing event keys
@@ -68,40 +87,81 @@ def main(event):
         # s3.download_file(bucket, preprocessed_data_s3_key, preprocessed_data_local_path)
         # s3.download_file(bucket, label_file_s3_key, label_file_local_path)
 
+    with instrumentation.stage('import'):
+        from utils.compute_statistics import compute_statistics
+        from utils.logistic_regression_univariate_w_BH import logistic_regression_univariate_w_BH
+        from utils.save_and_upload_results import save_and_upload_results
+        from utils.intermediate import load_preprocessed_data
+        from utils.result_cache import ResultCache, cached_statistics
+        from utils.sparse_features import split_groups
+
     # Load preprocessed data
     try:
-        with open(preprocessed_data_local_path, 'rb') as f:
-            data = pickle.load(f)  # Load the preprocessed data (pandas DataFrame)
-            data = data.loc[:,~data.columns.duplicated()].copy()
+        # Parquet/Feather are read column-wise; legacy pickles are de-duplicated on load
+        with instrumentation.stage('load'):
+            data, metadata = load_preprocessed_data(preprocessed_data_local_path, features=feature_columns,
+                                                    backend=feature_backend)
+        if metadata.get('duplicate_columns'):
+            print(f"Duplicate columns dropped during preprocessing: {len(metadata['duplicate_columns'])}")
     except Exception as e:
         return {
             'statusCode': 500,
             'error': f"Error loading preprocessed data: {e}"
         }
     
-    # Split the data into features and target (assuming 'group_2' as target)
-    X_dat = data.iloc[:, 1:]  # Assuming first column is the target variable
-    y = data.iloc[:, 0]  # Assuming first column is 'group_2'
-    features = X_dat.columns
+    # Features follow the target column (assuming 'group_2' as target)
+    features = data.columns[1:]
 
   
     # Perform Statistical Analysis
     try:
-        # Log the control and cancer group data
-        data_control = data[data['group_2'] == 0]
-        data_cancer = data[data['group_2'] == 1]
-        print(f"Control group data: {data_control}")
-        print(f"Cancer group data: {data_cancer}")
-
-        # Perform basic statistics
-        results = compute_statistics(data_control, data_cancer, features)
-        print(f"Results from compute_statistics: {results}")  # Log the results from compute_statistics
-
-        # Perform univariate logistic regression
-        results, problematic_features = logistic_regression_univariate_w_BH(data, features, results, alpha=0.05)
+        # Log the group sizes only; printing the frames inflates the logs of wide datasets
+        data_control, data_cancer = split_groups(data)
+        print(f"Control group: {data_control.shape[0]} samples, cancer group: {data_cancer.shape[0]} samples, "
+              f"{len(features)} features")
+        instrumentation.record(dataset_type=dataset_type, n_features=len(features),
+                               n_control=int(data_control.shape[0]), n_cancer=int(data_cancer.shape[0]),
+                               feature_backend=feature_backend)
+
+        if cache_dir:
+            # Only features without a cached row are recomputed; FDR runs over all of them
+            with instrumentation.stage('statistics', cached=True):
+                s3 = None
+                if event.get('cache_s3'):
+                    import boto3
+                    s3 = boto3.client('s3')
+                cache = ResultCache(cache_dir, max_bytes=cache_max_mb * 1024 ** 2, s3=s3, s3_bucket=bucket,
+                                    output_folder=output_folder)
+                results, problematic_features = cached_statistics(data, features, cache, alpha=0.05,
+                                                                  fdr_method=fdr_method, n_jobs=n_jobs,
+                                                                  chunk_size=chunk_size,
+                                                                  exclude_quasi_separation=exclude_quasi_separation)
+        else:
+            # Perform basic statistics
+            with instrumentation.stage('statistics'):
+                results = compute_statistics(data_control, data_cancer, features, n_jobs=n_jobs,
+                                             chunk_size=chunk_size or 2048)
+
+            # Perform univariate logistic regression
+            with instrumentation.stage('logistic_regression'):
+                results, problematic_features = logistic_regression_univariate_w_BH(
+                    data, features, results, alpha=0.05, n_jobs=n_jobs, chunk_size=chunk_size, fdr_method=fdr_method,
+                    exclude_quasi_separation=exclude_quasi_separation)
+        instrumentation.record(n_problematic_features=len(problematic_features))
+
+        if permutations:
+            # Empirical p-values next to the asymptotic ones
+            from utils.permutation import PERMUTATION_COLUMNS, permutation_p_values
+            with instrumentation.stage('permutation', n_permutations=permutations):
+                permuted, _ = permutation_p_values(data, features, n_permutations=permutations,
+                                                   seed=permutation_seed, n_jobs=n_jobs,
+                                                   early_stop_hits=permutation_early_stop)
+            results = results.join(permuted[list(PERMUTATION_COLUMNS.values())])
         
         # Save and upload results to S3
-        results_path = save_and_upload_results(dataset_type,results, label_file_local_path, bucket, output_folder)
+        with instrumentation.stage('export'):
+            results_path = save_and_upload_results(dataset_type, results, label_file_local_path, bucket,
+                                                   output_folder, output_format=output_format, output_dir=output_dir)
     except Exception as e:
         return {
             'statusCode': 500,
@@ -114,13 +174,15 @@ def main(event):
         'results_path': results_path
     }
 
-event = {
-    's3_bucket' : 'local_path',
-    "dataset_type": "Orthology",
-    "preprocessed_data_local_path": "./PC_Orthology/intermediate/preprocessed_data_orthology.pkl",
-    "label_file_local_path": "./PC_Orthology/orthology_label_list.csv"
-}
+if __name__ == "__main__":
+    import json
 
-import json
-result = main(event)
-print(json.dumps(result, indent = 2))
+    event = {
+        's3_bucket' : 'local_path',
+        "dataset_type": "Orthology",
+        "preprocessed_data_local_path": "./PC_Orthology/intermediate/preprocessed_data_orthology.parquet",
+        "label_file_local_path": "./PC_Orthology/orthology_label_list.csv",
+        "n_jobs": -1
+    }
+    result = main(event)
+    print(json.dumps(result, indent = 2))
@@ -0,0 +1,288 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from utils.compute_statistics import compute_statistics
+from utils.instrumentation import Instrumentation
+from utils.intermediate import load_preprocessed_data
+from utils.logistic_regression_univariate_w_BH import logistic_regression_univariate_w_BH
+from utils.parallel import resolve_n_jobs
+from utils.result_cache import ResultCache, cached_statistics
+from utils.save_and_upload_results import load_label_index, save_and_upload_results
+from utils.sparse_features import split_groups
+
+# S3 layout written by data-preprocessing/data_preprocessing.lambda_handler
+DATASETS = {
+    'Pathway': {
+        'prefix': 'PC_Pathway',
+        'preprocessed_data_key': 'PC_Pathway/intermediate/preprocessed_data_pathway.parquet',
+        'label_file_key': 'PC_Pathway/pathway_label_list.csv',
+    },
+    'Orthology': {
+        'prefix': 'PC_Orthology',
+        'preprocessed_data_key': 'PC_Orthology/intermediate/preprocessed_data_orthology.parquet',
+        'label_file_key': 'PC_Orthology/orthology_label_list.csv',
+    },
+}
+STAGES = ['download', 'load', 'statistics', 'export']
+
+
+class StageTimer:
+    """Thread-safe record of (dataset, stage, start, end) intervals for the pipeline report."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.intervals = []
+        self._lock = threading.Lock()
+
+    def run(self, dataset_type, stage, func, *args, **kwargs):
+        start = time.perf_counter() - self.origin
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end = time.perf_counter() - self.origin
+            with self._lock:
+                self.intervals.append((dataset_type, stage, start, end))
+            print(f"[{dataset_type}] {stage} finished in {end - start:.3f}s")
+
+    def report(self):
+        # Wall-clock per stage is the union of its intervals across datasets; overlap is the
+        # busy time that ran concurrently with another stage or dataset
+        wall = time.perf_counter() - self.origin
+        stages = {}
+        for stage in STAGES:
+            spans = [(start, end) for _, name, start, end in self.intervals if name == stage]
+            stages[stage] = {
+                'busy_seconds': round(sum(end - start for start, end in spans), 3),
+                'wall_seconds': round(_union_length(spans), 3),
+            }
+        busy = sum(end - start for _, _, start, end in self.intervals)
+        covered = _union_length([(start, end) for _, _, start, end in self.intervals])
+        return {
+            'wall_seconds': round(wall, 3),
+            'busy_seconds': round(busy, 3),
+            'overlap_seconds': round(busy - covered, 3),
+            'overlap_ratio': round(busy / covered, 3) if covered else 0.0,
+            'stages': stages,
+            'intervals': [
+                {'dataset_type': d, 'stage': s, 'start': round(a, 3), 'end': round(b, 3)}
+                for d, s, a, b in sorted(self.intervals, key=lambda item: item[2])
+            ],
+        }
+
+
+def _union_length(spans):
+    total, current_start, current_end = 0.0, None, None
+    for start, end in sorted(spans):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def _download(s3, bucket, key, local_path):
+    # /tmp survives between invocations of a warm container, so a local copy is only reused while its
+    # size and ETag (kept in a sidecar file) still match the object in S3; without an S3 client or key
+    # the local file is used as it is
+    if s3 is None or not key:
+        return local_path
+    head = s3.head_object(Bucket=bucket, Key=key)
+    etag_path = f"{local_path}.etag"
+    if os.path.exists(local_path) and os.path.exists(etag_path) \
+            and os.path.getsize(local_path) == head['ContentLength']:
+        with open(etag_path) as f:
+            if f.read() == head['ETag']:
+                return local_path
+    s3.download_file(bucket, key, local_path)
+    with open(etag_path, 'w') as f:
+        f.write(head['ETag'])
+    return local_path
+
+
+def _analyse(data, alpha, n_jobs, chunk_size, executor, cache, fdr_method='fdr_bh', exclude_quasi_separation=False):
+    features = data.columns[1:]
+    if cache is not None:
+        return cached_statistics(data, features, cache, alpha=alpha, fdr_method=fdr_method,
+                                 exclude_quasi_separation=exclude_quasi_separation, n_jobs=n_jobs,
+                                 chunk_size=chunk_size, executor=executor)
+    data_control, data_cancer = split_groups(data)
+    results = compute_statistics(data_control, data_cancer, features, n_jobs=n_jobs, chunk_size=chunk_size or 2048,
+                                 executor=executor)
+    return logistic_regression_univariate_w_BH(data, features, results, alpha=alpha, n_jobs=n_jobs,
+                                               chunk_size=chunk_size, executor=executor, fdr_method=fdr_method,
+                                               exclude_quasi_separation=exclude_quasi_separation)
+
+
+def _run_dataset(dataset_type, spec, context):
+    timer, s3, bucket, io_pool = context['timer'], context['s3'], context['bucket'], context['io_pool']
+    work_dir = context['work_dir']
+    data_path = spec.get('preprocessed_data_local_path') or os.path.join(
+        work_dir, os.path.basename(spec['preprocessed_data_key']))
+    label_path = spec.get('label_file_local_path') or os.path.join(
+        work_dir, os.path.basename(spec['label_file_key']))
+
+    # Both downloads of a dataset run concurrently on the shared I/O pool
+    def download():
+        futures = [io_pool.submit(_download, s3, bucket, spec.get('preprocessed_data_key'), data_path),
+                   io_pool.submit(_download, s3, bucket, spec.get('label_file_key'), label_path)]
+        return [future.result() for future in futures]
+    timer.run(dataset_type, 'download', download)
+
+    def load():
+        data, _ = load_preprocessed_data(data_path, features=spec.get('feature_columns'),
+                                         backend=context['feature_backend'])
+        load_label_index(label_path, dataset_type)  # Parsed once, reused by the export stage
+        return data
+    data = timer.run(dataset_type, 'load', load)
+
+    results, problematic_features = timer.run(
+        dataset_type, 'statistics', _analyse, data, context['alpha'], context['n_jobs'], context['chunk_size'],
+        context['compute_pool'], context['caches'].get(dataset_type), context['fdr_method'],
+        context['exclude_quasi_separation'])
+
+    output_folder = f"{spec['prefix']}/analysis_outputs/"
+    results_path = timer.run(
+        dataset_type, 'export', save_and_upload_results, dataset_type, results, label_path,
+        bucket if s3 is not None else None, output_folder, s3, output_format=context['output_format'],
+        output_dir=context['work_dir'])
+    return {
+        'results_path': results_path,
+        'n_features': int(data.shape[1] - 1),
+        'n_problematic_features': len(problematic_features),
+    }
+
+
+def run_pipeline(event, instrumentation=None):
+    """
+    Analyse several dataset types (Pathway, Orthology) in one invocation.
+
+    Every dataset runs download -> load -> statistics -> export. Datasets run concurrently with each
+    other, I/O stages share one thread pool and, with n_jobs > 1, the statistics of all datasets share
+    one process pool, so the stages of different datasets overlap. The S3 client, the pools and the parsed label tables
+    are created once and reused across datasets.
+
+    Event keys:
+    - dataset_types (list): Dataset types to analyse (default: ['Pathway', 'Orthology']).
+    - datasets (dict): Optional per-dataset overrides of DATASETS (S3 keys, local paths, feature_columns).
+    - s3_bucket (str): Bucket to download inputs from and upload results to; omit to run on local files.
+    - n_jobs (int): Worker processes for the statistics (default 1, i.e. in-process; -1 for all cores). A
+      process pool needs /dev/shm, which AWS Lambda does not provide.
+    - chunk_size, io_workers, output_format, alpha, fdr_method, cache_dir, cache_max_mb: Stage options.
+    - exclude_quasi_separation (bool): Leave quasi-separated features out of the logistic regression
+      (see logistic_regression_univariate_w_BH); off by default.
+    - feature_backend (str): 'dense' (default), 'float32' or 'sparse'; see load_preprocessed_data.
+
+    The stage report, per-dataset feature counts and peak memory are added to `instrumentation`; when
+    none is passed, one is created and emitted as a JSON log line.
+
+    Returns:
+    - dict: statusCode, per-dataset results and the stage timing/overlap report.
+    """
+    dataset_types = event.get('dataset_types', list(DATASETS))
+    unknown = [dataset_type for dataset_type in dataset_types if dataset_type not in DATASETS]
+    if unknown:
+        return {
+            'statusCode': 400,
+            'error': f"Unsupported dataset type(s): {unknown}. Please specify 'Pathway' or 'Orthology'."
+        }
+
+    bucket = event.get('s3_bucket')
+    s3 = None
+    if bucket and event.get('use_s3', True):
+        import boto3
+        s3 = boto3.client('s3')  # One client, shared by every dataset and thread
+
+    # One job by default: AWS Lambda has no /dev/shm, so the semaphores of a process pool are unavailable there
+    n_jobs = resolve_n_jobs(event.get('n_jobs', 1))
+    work_dir = event.get('work_dir', '/tmp')
+    timer = StageTimer()
+    io_pool = ThreadPoolExecutor(max_workers=event.get('io_workers', 4))
+    compute_pool = None
+    if n_jobs > 1:
+        compute_pool = ProcessPoolExecutor(max_workers=n_jobs)
+        # Start the workers before any thread runs so the fork happens from a quiet process
+        compute_pool.submit(os.getpid).result()
+
+    caches = {}
+    if event.get('cache_dir'):
+        for dataset_type in dataset_types:
+            caches[dataset_type] = ResultCache(os.path.join(event['cache_dir'], dataset_type),
+                                               max_bytes=event.get('cache_max_mb', 1024) * 1024 ** 2)
+
+    context = {
+        'timer': timer, 's3': s3, 'bucket': bucket, 'io_pool': io_pool, 'compute_pool': compute_pool,
+        'work_dir': work_dir, 'alpha': event.get('alpha', 0.05), 'n_jobs': n_jobs,
+        'chunk_size': event.get('chunk_size'), 'output_format': event.get('output_format', 'xlsx'),
+        'caches': caches, 'fdr_method': event.get('fdr_method', 'fdr_bh'),
+        'exclude_quasi_separation': event.get('exclude_quasi_separation', False),
+        'feature_backend': event.get('feature_backend', 'dense'),
+    }
+
+    outputs = {}
+    status = 200
+    try:
+        with ThreadPoolExecutor(max_workers=len(dataset_types)) as dataset_pool:
+            futures = {
+                dataset_type: dataset_pool.submit(
+                    _run_dataset, dataset_type, {**DATASETS[dataset_type], **event.get('datasets', {}).get(dataset_type, {})},
+                    context)
+                for dataset_type in dataset_types
+            }
+            for dataset_type, future in futures.items():
+                try:
+                    outputs[dataset_type] = future.result()
+                except Exception as e:
+                    status = 500
+                    outputs[dataset_type] = {'error': f"Error during {dataset_type} pipeline: {e}"}
+    finally:
+        io_pool.shutdown()
+        if compute_pool is not None:
+            compute_pool.shutdown()
+
+    report = timer.report()
+    print(f"Pipeline finished in {report['wall_seconds']}s "
+          f"(busy {report['busy_seconds']}s, overlap {report['overlap_seconds']}s)")
+    owns_instrumentation = instrumentation is None
+    instrumentation = instrumentation or Instrumentation('pipeline')
+    instrumentation.record(
+        statusCode=status,
+        pipeline={key: report[key] for key in ('wall_seconds', 'busy_seconds', 'overlap_seconds', 'stages')},
+        datasets={dataset_type: {key: output[key] for key in ('n_features', 'n_problematic_features', 'error')
+                                 if key in output}
+                  for dataset_type, output in outputs.items()})
+    if owns_instrumentation:
+        instrumentation.emit()
+    return {
+        'statusCode': status,
+        'datasets': outputs,
+        'timing': report,
+    }
+
+
+def lambda_handler(event, context):
+    return run_pipeline(event)
+
+
+if __name__ == "__main__":
+    event = {
+        'dataset_types': ['Pathway', 'Orthology'],
+        'datasets': {
+            'Pathway': {
+                'preprocessed_data_local_path': './PC_Pathway/intermediate/preprocessed_data_pathway.parquet',
+                'label_file_local_path': './PC_Pathway/pathway_label_list.csv',
+            },
+            'Orthology': {
+                'preprocessed_data_local_path': './PC_Orthology/intermediate/preprocessed_data_orthology.parquet',
+                'label_file_local_path': './PC_Orthology/orthology_label_list.csv',
+            },
+        },
+        'n_jobs': -1,
+    }
+    print(json.dumps(run_pipeline(event), indent=2))
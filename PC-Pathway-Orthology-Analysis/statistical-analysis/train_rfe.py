@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+from utils.cv_rfe import MODEL_CHOICES, run_cv_rfe
+from utils.vif import drop_high_vif, vif_table
+
+
+def run_rfe_training(event):
+    """
+    Cross-validated RFE training of Genus_ML_analysis, as a script that runs on the CPU.
+
+    Folds and models train concurrently in a process pool; each fold's elimination path is cached
+    in cache_dir so reruns with other n_features values only refit and evaluate.
+
+    Event keys:
+    - data_path (str): Genus table (.xlsx or .csv) with 'study_no', 'group_1' and the features.
+    - label_column (str): Label column (default 'group_1').
+    - feature_start (int): Position of the first feature column after indexing on study_no (default 3).
+    - models (list): Any of MODEL_CHOICES (default ['xgb']).
+    - n_features (list): n_features_to_select values (default [20]).
+    - step_schedule (str): Elimination steps, e.g. '1' or '60:0.1,30:2,1' (default '1').
+    - n_splits, random_state, n_estimators, learning_rate, max_depth: As in the notebook.
+    - n_jobs (int): Worker processes (-1 for all cores); threads_per_model (int): threads inside a worker.
+    - cache_dir (str): Cache of elimination paths (default 'Train_Result_RFE/rfe_cache').
+    - output_dir (str): Root of the run folders (default 'Train_Result_RFE').
+    - vif_threshold (float): VIF above which features are written to possible_multicollinearity_features.xlsx
+      (default 10, None to skip).
+    - explain (bool): SHAP stage on the validation folds (default True).
+    - shap_background_size (int): Background rows of the SHAP explainer, 0 for tree-path-dependent (default 100).
+    - drop_high_vif (bool): Drop the highest-VIF feature until all are below vif_threshold before training.
+
+    Returns:
+    - dict: statusCode and, per model and n_features, the run folder and mean accuracy/FNR.
+    """
+    output_dir = event.get('output_dir', 'Train_Result_RFE')
+    try:
+        started = time.perf_counter()
+        data_path = event['data_path']
+        data = pd.read_excel(data_path) if data_path.endswith('.xlsx') else pd.read_csv(data_path)
+        data = data.set_index('study_no')
+        label = data[event.get('label_column', 'group_1')]
+        features = data[data.columns[event.get('feature_start', 3):]]
+        print(f"{features.shape[0]} samples, {features.shape[1]} features")
+
+        vif_threshold = event.get('vif_threshold', 10)
+        if vif_threshold is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            vif_data = vif_table(features)
+            vif_data_mul = vif_data[vif_data['VIF'] > vif_threshold]
+            output_file = os.path.join(output_dir, "possible_multicollinearity_features.xlsx")
+            vif_data_mul.to_excel(output_file, index=False)
+            print(f"VIF data saved to {output_file}")
+            if event.get('drop_high_vif', False):
+                kept, dropped = drop_high_vif(features, threshold=vif_threshold)
+                dropped.to_excel(os.path.join(output_dir, "dropped_high_vif_features.xlsx"), index=False)
+                features = features[kept['feature']]
+
+        summary = run_cv_rfe(
+            features, label,
+            model_choices=event.get('models', ['xgb']),
+            n_features=event.get('n_features', [20]),
+            n_splits=event.get('n_splits', 5),
+            step_schedule=event.get('step_schedule', '1'),
+            n_jobs=event.get('n_jobs', -1),
+            n_threads=event.get('threads_per_model', 1),
+            cache_dir=event.get('cache_dir', f'{output_dir}/rfe_cache'),
+            output_dir=output_dir,
+            random_state=event.get('random_state', 42),
+            model_params={key: event[key] for key in ('n_estimators', 'learning_rate', 'max_depth') if key in event},
+            save_fold_data=event.get('save_fold_data', True),
+            explain=event.get('explain', True),
+            shap_background_size=event.get('shap_background_size', 100),
+        )
+        print(f"RFE training finished in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'error': f"Error during RFE training: {e}"
+        }
+
+    return {
+        'statusCode': 200,
+        'results': summary
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Cross-validated RFE training on the CPU.')
+    parser.add_argument('data_path', help="Genus table with 'study_no' and 'group_1'")
+    parser.add_argument('--models', nargs='+', default=['xgb'], choices=MODEL_CHOICES)
+    parser.add_argument('--n-features', nargs='+', type=int, default=[20])
+    parser.add_argument('--step-schedule', default='1')
+    parser.add_argument('--n-splits', type=int, default=5)
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--learning-rate', type=float, default=0.1)
+    parser.add_argument('--max-depth', type=int, default=6)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--threads-per-model', type=int, default=1)
+    parser.add_argument('--output-dir', default='Train_Result_RFE')
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--no-fold-data', dest='save_fold_data', action='store_false')
+    parser.add_argument('--no-shap', dest='explain', action='store_false')
+    parser.add_argument('--shap-background-size', type=int, default=100)
+    parser.add_argument('--vif-threshold', type=float, default=10)
+    parser.add_argument('--drop-high-vif', action='store_true')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = vars(parse_args())
+    if args['cache_dir'] is None:
+        args['cache_dir'] = f"{args['output_dir']}/rfe_cache"
+    print(json.dumps(run_rfe_training(args), indent=2))
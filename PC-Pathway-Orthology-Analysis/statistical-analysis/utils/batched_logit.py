@@ -0,0 +1,247 @@
+import warnings
+import numpy as np
+from scipy import sparse
+from scipy.special import expit, ndtr
+
+
+def detect_separation(X, y):
+    """
+    Flag features whose single predictor completely separates the two classes.
+
+    Parameters:
+    - X (np.ndarray): (n_samples x n_features) predictor matrix without NaNs.
+    - y (np.ndarray): Binary outcome of length n_samples.
+
+    Returns:
+    - np.ndarray: Boolean mask, True where max(x | y=0) < min(x | y=1) or the reverse.
+    """
+    y = np.asarray(y).astype(bool)
+    x0, x1 = X[~y], X[y]
+    if x0.shape[0] == 0 or x1.shape[0] == 0:
+        return np.ones(X.shape[1], dtype=bool)
+    return (x1.min(axis=0) > x0.max(axis=0)) | (x0.min(axis=0) > x1.max(axis=0))
+
+
+def detect_quasi_separation(X, y):
+    """
+    Flag features whose predictor separates the classes except for ties at the boundary value.
+
+    Typical for zero-inflated abundances: a feature that is zero in every control and zero or positive
+    in the cancer samples. The MLE does not exist, but statsmodels raises no error; its Newton steps
+    drift until maxiter and it reports the Wald p-value of the last iterate (p close to 1).
+
+    Parameters:
+    - X (np.ndarray): (n_samples x n_features) predictor matrix without NaNs.
+    - y (np.ndarray): Binary outcome of length n_samples.
+
+    Returns:
+    - np.ndarray: Boolean mask, True where max(x | y=0) == min(x | y=1) or the reverse. Constant
+      predictors are also True and must be excluded by the caller.
+    """
+    y = np.asarray(y).astype(bool)
+    x0, x1 = X[~y], X[y]
+    if x0.shape[0] == 0 or x1.shape[0] == 0:
+        return np.zeros(X.shape[1], dtype=bool)
+    return (x1.min(axis=0) == x0.max(axis=0)) | (x0.min(axis=0) == x1.max(axis=0))
+
+
+def batched_univariate_logit(X, y, maxiter=100, tol=1e-8, chunk_size=4096):
+    """
+    Fit y ~ 1 + x_j for every column j of X at once with stacked 2x2 Newton steps.
+
+    Every predictor is standardized before fitting; the Wald z statistic of the slope is invariant
+    to that rescaling, so the p-values match an unscaled statsmodels Logit fit.
+
+    Parameters:
+    - X (np.ndarray or scipy.sparse matrix): (n_samples x n_features) predictor matrix; float32 and
+      sparse input are converted to dense float64 one chunk at a time.
+    - y (np.ndarray): Binary outcome of length n_samples.
+    - maxiter (int): Maximum number of Newton iterations (statsmodels default for Logit.fit).
+    - tol (float): Convergence tolerance on the change of the standardized parameters.
+    - chunk_size (int): Number of features solved together, bounds the working memory.
+
+    Returns:
+    - dict of np.ndarray: 'coef' and 'se' of the slope on the original scale, Wald 'p_value',
+      'converged', 'n_iter', and the masks 'constant', 'separation', 'quasi_separation' and 'singular'.
+      Quasi-separated features are fitted like statsmodels (see _fit_quasi_separated), so they keep
+      a p-value and are not part of the problematic masks.
+    """
+    if sparse.issparse(X):
+        X = sparse.csc_matrix(X)
+    elif np.asarray(X).dtype not in (np.float32, np.float64):
+        X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n_features = X.shape[1]
+
+    out = {
+        'coef': np.full(n_features, np.nan),
+        'se': np.full(n_features, np.nan),
+        'p_value': np.full(n_features, np.nan),
+        'converged': np.zeros(n_features, dtype=bool),
+        'n_iter': np.zeros(n_features, dtype=np.int64),
+        'constant': np.zeros(n_features, dtype=bool),
+        'separation': np.zeros(n_features, dtype=bool),
+        'quasi_separation': np.zeros(n_features, dtype=bool),
+        'singular': np.zeros(n_features, dtype=bool),
+    }
+
+    for start in range(0, n_features, chunk_size):
+        stop = min(start + chunk_size, n_features)
+        block = X[:, start:stop]
+        block = block.toarray() if sparse.issparse(block) else block
+        res = _fit_block(np.asarray(block, dtype=np.float64), y, maxiter, tol)
+        for key, values in res.items():
+            out[key][start:stop] = values
+
+    return out
+
+
+def _fit_block(X, y, maxiter, tol):
+    # Work feature-major so every per-feature sum runs over contiguous memory; the
+    # result of a column then does not depend on which other columns share its block
+    Xt = np.ascontiguousarray(X.T)
+    n_features = Xt.shape[0]
+
+    # Constant or missing predictors cannot be fitted, mirror the nunique() <= 1 check
+    has_nan = np.isnan(Xt).any(axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        x_std = np.nanstd(Xt, axis=1)
+        x_mean = np.nanmean(Xt, axis=1)
+        constant = has_nan | ~(np.nanmax(Xt, axis=1) > np.nanmin(Xt, axis=1)) | ~(x_std > 0)
+    separation = np.zeros(n_features, dtype=bool)
+    separation[~constant] = detect_separation(X[:, ~constant], y)
+    quasi_separation = np.zeros(n_features, dtype=bool)
+    quasi_separation[~constant] = detect_quasi_separation(X[:, ~constant], y)
+
+    scale = np.where(constant, 1.0, x_std)
+    Z = (Xt - np.where(constant, 0.0, x_mean)[:, None]) / scale[:, None]
+    Z[constant] = 0.0
+
+    a = np.zeros(n_features)
+    b = np.zeros(n_features)
+    converged = np.zeros(n_features, dtype=bool)
+    singular = np.zeros(n_features, dtype=bool)
+    n_iter = np.zeros(n_features, dtype=np.int64)
+    active = ~(constant | separation | quasi_separation)
+
+    for _ in range(maxiter):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        z = Z[idx]
+        mu = expit(a[idx, None] + b[idx, None] * z)
+        w = mu * (1.0 - mu)
+        resid = y[None, :] - mu
+
+        # Gradient and observed information of the 2-parameter model, per feature
+        g0 = resid.sum(axis=1)
+        g1 = (resid * z).sum(axis=1)
+        h00 = w.sum(axis=1)
+        h01 = (w * z).sum(axis=1)
+        h11 = (w * z * z).sum(axis=1)
+        det = h00 * h11 - h01 * h01
+
+        bad = ~(np.isfinite(det) & (det > 0))
+        singular[idx[bad]] = True
+        with np.errstate(divide='ignore', invalid='ignore'):
+            da = (h11 * g0 - h01 * g1) / det
+            db = (h00 * g1 - h01 * g0) / det
+        da[bad] = 0.0
+        db[bad] = 0.0
+
+        a[idx] += da
+        b[idx] += db
+        n_iter[idx] += 1
+        done = (np.maximum(np.abs(da), np.abs(db)) <= tol) & ~bad
+        converged[idx[done]] = True
+        active[idx[done | bad]] = False
+
+    # Covariance of the slope from the information matrix at the final estimate
+    fitted = ~(constant | separation | quasi_separation | singular)
+    idx = np.flatnonzero(fitted)
+    z = Z[idx]
+    mu = expit(a[idx, None] + b[idx, None] * z)
+    w = mu * (1.0 - mu)
+    h00 = w.sum(axis=1)
+    h01 = (w * z).sum(axis=1)
+    h11 = (w * z * z).sum(axis=1)
+    det = h00 * h11 - h01 * h01
+
+    coef = np.full(n_features, np.nan)
+    se = np.full(n_features, np.nan)
+    p_value = np.full(n_features, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        se_std = np.sqrt(h00 / det)
+        coef[idx] = b[idx] / scale[idx]
+        se[idx] = se_std / scale[idx]
+        p_value[idx] = 2.0 * ndtr(-np.abs(b[idx] / se_std))
+
+    # A singular information matrix at the estimate is a LinAlgError in statsmodels
+    late_singular = ~(np.isfinite(det) & (det > 0))
+    singular[idx[late_singular]] = True
+    p_value[idx[late_singular]] = np.nan
+
+    quasi = np.flatnonzero(quasi_separation)
+    if quasi.size:
+        quasi_fit = _fit_quasi_separated(Xt[quasi], y, maxiter, tol)
+        for key, values in (('coef', coef), ('se', se), ('p_value', p_value), ('converged', converged),
+                            ('n_iter', n_iter)):
+            values[quasi] = quasi_fit[key]
+
+    return {
+        'coef': coef,
+        'se': se,
+        'p_value': p_value,
+        'converged': converged,
+        'n_iter': n_iter,
+        'constant': constant,
+        'separation': separation,
+        'quasi_separation': quasi_separation,
+        'singular': singular,
+    }
+
+
+def _fit_quasi_separated(Xt, y, maxiter, tol, ridge_factor=1e-10):
+    # Same iterates as statsmodels Logit.fit(method='newton'): unscaled predictor, zero start, Hessian of the
+    # mean log-likelihood with ridge_factor on its diagonal, stop when no parameter moves more than tol.
+    # The slope diverges, so the fit ends at maxiter and the Wald p of the last iterate is reported
+    # with the unridged covariance inv(X'WX), as statsmodels does; the result is deterministic.
+    n_features, n_samples = Xt.shape
+    a = np.zeros(n_features)
+    b = np.zeros(n_features)
+    converged = np.zeros(n_features, dtype=bool)
+    n_iter = np.zeros(n_features, dtype=np.int64)
+    active = np.ones(n_features, dtype=bool)
+    for _ in range(maxiter):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        x = Xt[idx]
+        mu = expit(a[idx, None] + b[idx, None] * x)
+        w = mu * (1.0 - mu)
+        resid = y[None, :] - mu
+        g0 = resid.sum(axis=1) / n_samples
+        g1 = (resid * x).sum(axis=1) / n_samples
+        h00 = w.sum(axis=1) / n_samples + ridge_factor
+        h01 = (w * x).sum(axis=1) / n_samples
+        h11 = (w * x * x).sum(axis=1) / n_samples + ridge_factor
+        det = h00 * h11 - h01 * h01
+        da = (h11 * g0 - h01 * g1) / det
+        db = (h00 * g1 - h01 * g0) / det
+        a[idx] += da
+        b[idx] += db
+        n_iter[idx] += 1
+        done = np.maximum(np.abs(da), np.abs(db)) <= tol
+        converged[idx[done]] = True
+        active[idx[done]] = False
+
+    mu = expit(a[:, None] + b[:, None] * Xt)
+    w = mu * (1.0 - mu)
+    h00 = w.sum(axis=1)
+    h01 = (w * Xt).sum(axis=1)
+    h11 = (w * Xt * Xt).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        se = np.sqrt(h00 / (h00 * h11 - h01 * h01))
+        p_value = 2.0 * ndtr(-np.abs(b / se))
+    return {'coef': b, 'se': se, 'p_value': p_value, 'converged': converged, 'n_iter': n_iter}
@@ -1,8 +1,40 @@
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from scipy.stats import mannwhitneyu
+from scipy.special import ndtr
+from utils.parallel import resolve_n_jobs, run_column_chunks
+from utils.sparse_features import feature_csc, feature_dtype, is_sparse_frame
 
-def compute_statistics(data_control, data_cancer, pathways):
+RESULT_COLUMNS = ['Control_mean', 'Cancer_mean', 'FC_value', 'Wilcoxon_p', 'log2FC_value']
+
+
+def compute_statistics(data_control, data_cancer, pathways, method='vectorized', chunk_size=2048,
+                       n_jobs=1, executor=None):
+    """
+    Compute group means, fold change and the Mann-Whitney U (Wilcoxon rank-sum) p-value per feature.
+
+    Parameters:
+    - data_control (pd.DataFrame): Rows of the control group (group_2 == 0).
+    - data_cancer (pd.DataFrame): Rows of the cancer group (group_2 == 1).
+    - pathways (Iterable): Feature columns to analyse.
+    - method (str): 'vectorized' ranks all features at once, 'loop' runs the per-feature reference path.
+    - chunk_size (int): Number of feature columns ranked together in 'vectorized' mode.
+    - n_jobs (int): Worker processes for the rank tests in 'vectorized' mode (-1 for all cores).
+    - executor (concurrent.futures.Executor): Existing process pool to reuse when n_jobs != 1.
+
+    Returns:
+    - pd.DataFrame: One row per feature with Control_mean, Cancer_mean, FC_value, Wilcoxon_p and log2FC_value.
+    """
+    if method == 'vectorized':
+        return compute_statistics_vectorized(data_control, data_cancer, pathways, chunk_size=chunk_size,
+                                             n_jobs=n_jobs, executor=executor)
+    elif method == 'loop':
+        return compute_statistics_loop(data_control, data_cancer, pathways)
+    raise ValueError(f"Unsupported method: {method}. Please specify 'vectorized' or 'loop'.")
+
+
+def compute_statistics_loop(data_control, data_cancer, pathways):
     # Initialize the results DataFrame
     results = pd.DataFrame(index=pathways, columns=[
         'Control_mean', 'Cancer_mean', 'FC_value', 'Wilcoxon_p'
@@ -37,3 +69,250 @@ def compute_statistics(data_control, data_cancer, pathways):
         results.loc[pathway, 'Wilcoxon_p'] = p_value
 
     return results
+
+
+def to_numeric_matrix(frame, columns, dtype=np.float64):
+    # Fast path for frames that are already numeric, per-column coercion otherwise; sparse frames are densified
+    if is_sparse_frame(frame):
+        return feature_csc(frame, columns, dtype=dtype).toarray()
+    block = frame[columns]
+    try:
+        return block.to_numpy(dtype=dtype)
+    except (TypeError, ValueError):
+        return block.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=dtype)
+
+
+def rank_columns(values):
+    """
+    Average ranks (1-based) of every column together with the tie term sum(t**3 - t) used by the
+    Mann-Whitney normal approximation. Returns the column-sorting order so callers can sum ranks per group.
+    """
+    n_rows, n_cols = values.shape
+    order = np.argsort(values, axis=0, kind='mergesort')
+    sorted_values = np.take_along_axis(values, order, axis=0)
+
+    # Mark the start of every run of equal values, walking the columns one after another
+    run_start = np.ones((n_rows, n_cols), dtype=bool)
+    run_start[1:] = sorted_values[1:] != sorted_values[:-1]
+    start_idx = np.flatnonzero(run_start.T.ravel())
+    run_length = np.diff(np.append(start_idx, n_rows * n_cols))
+
+    # Average rank of each run and tie term per column
+    run_rank = start_idx % n_rows + (run_length + 1) / 2.0
+    sorted_ranks = np.repeat(run_rank, run_length).reshape(n_cols, n_rows).T
+    run_col = start_idx // n_rows
+    tie_term = np.bincount(run_col, weights=run_length.astype(np.float64) ** 3 - run_length, minlength=n_cols)
+    max_tie = np.zeros(n_cols, dtype=np.int64)
+    np.maximum.at(max_tie, run_col, run_length)
+    return order, sorted_ranks, tie_term, max_tie
+
+
+def rank_sparse_columns(matrix):
+    """
+    Average ranks of every column of a sparse matrix, computed from the nonzero entries only.
+
+    The zeros of a column form one tie block whose average rank is zero_rank = (#negative values) +
+    (#zeros + 1) / 2; every nonzero entry is ranked among the nonzeros and shifted past that block
+    when positive. Ranks are returned minus zero_rank, so the zeros keep rank 0 and the result has the
+    sparsity pattern of the input (an entry can only become an explicit 0 when it ties zero_rank).
+
+    Parameters:
+    - matrix (scipy.sparse matrix): (n_samples x n_features) values.
+
+    Returns:
+    - scipy.sparse.csc_matrix: Ranks minus zero_rank, same stored entries as matrix.
+    - np.ndarray: zero_rank per column.
+    - np.ndarray: Tie term sum(t**3 - t) per column, the zero block included.
+    - np.ndarray: Largest tie block per column.
+    """
+    matrix = sparse.csc_matrix(matrix, dtype=np.float64, copy=True)
+    matrix.eliminate_zeros()
+    n_rows, n_cols = matrix.shape
+    counts = np.diff(matrix.indptr)
+    zeros = n_rows - counts
+    column = np.repeat(np.arange(n_cols), counts)
+    values = matrix.data
+
+    # Sort by column, then value; CSC already groups the entries by column, so the column order is unchanged
+    order = np.lexsort((values, column))
+    sorted_values = values[order]
+    position = np.arange(len(values)) - matrix.indptr[column]
+
+    run_start = np.ones(len(values), dtype=bool)
+    run_start[1:] = (sorted_values[1:] != sorted_values[:-1]) | (column[1:] != column[:-1])
+    start_idx = np.flatnonzero(run_start)
+    run_length = np.diff(np.append(start_idx, len(values)))
+    run_col = column[start_idx]
+
+    negatives = np.bincount(column[values < 0], minlength=n_cols)
+    zero_rank = negatives + (zeros + 1) / 2.0
+    # 1-based average rank of each run among all rows: positives come after the zero block
+    run_rank = position[start_idx] + np.where(sorted_values[start_idx] > 0, zeros[run_col], 0) + (run_length + 1) / 2.0
+    shifted = np.empty(len(values))
+    shifted[order] = np.repeat(run_rank - zero_rank[run_col], run_length)
+
+    zeros = zeros.astype(np.float64)
+    tie_term = np.bincount(run_col, weights=run_length.astype(np.float64) ** 3 - run_length, minlength=n_cols)
+    tie_term += zeros ** 3 - zeros
+    max_tie = zeros.astype(np.int64)
+    np.maximum.at(max_tie, run_col, run_length)
+    ranks = sparse.csc_matrix((shifted, matrix.indices, matrix.indptr), shape=matrix.shape)
+    return ranks, zero_rank, tie_term, max_tie
+
+
+def mannwhitneyu_sparse_columns(values, n_cancer):
+    """
+    Two-sided Mann-Whitney U p-values of every column of a sparse (n_samples x n_features) matrix whose
+    first n_cancer rows are the cancer group. Same p-values as mannwhitneyu_columns on the dense matrix:
+    the rank sums are exact half-integers either way.
+    """
+    values = sparse.csc_matrix(values)
+    n = values.shape[0]
+    n1, n2 = n_cancer, n - n_cancer
+    p_values = np.full(values.shape[1], np.nan)
+    if n1 == 0 or n2 == 0:
+        return p_values
+
+    ranks, zero_rank, tie_term, max_tie = rank_sparse_columns(values)
+    column = np.repeat(np.arange(values.shape[1]), np.diff(ranks.indptr))
+    in_cancer = ranks.indices < n1
+    r1 = n1 * zero_rank + np.bincount(column[in_cancer], weights=ranks.data[in_cancer], minlength=values.shape[1])
+    u1 = r1 - n1 * (n1 + 1) / 2.0
+    u = np.maximum(u1, n1 * n2 - u1)
+
+    mu = n1 * n2 / 2.0
+    s = np.sqrt(n1 * n2 / 12.0 * ((n + 1) - tie_term / (n * (n - 1))))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (u - mu - 0.5) / s
+    p_values = np.clip(2.0 * ndtr(-z), 0.0, 1.0)
+
+    # scipy switches to the exact distribution for small groups without ties
+    if n1 <= 8 or n2 <= 8:
+        for j in np.flatnonzero(max_tie == 1):
+            dense = values[:, j].toarray().ravel()
+            p_values[j] = mannwhitneyu(dense[:n1], dense[n1:], alternative='two-sided').pvalue
+
+    # NaNs propagate to the p-value as in the per-feature path
+    stored_column = np.repeat(np.arange(values.shape[1]), np.diff(values.indptr))
+    p_values[np.unique(stored_column[np.isnan(values.data)])] = np.nan
+    return p_values
+
+
+def mannwhitneyu_columns(cancer_values, control_values, chunk_size=2048):
+    """
+    Two-sided Mann-Whitney U p-values for every column of two (n_samples x n_features) arrays.
+    Matches scipy.stats.mannwhitneyu(cancer, control, alternative='two-sided') column by column.
+    """
+    n1, n2 = cancer_values.shape[0], control_values.shape[0]
+    n_features = cancer_values.shape[1]
+    p_values = np.full(n_features, np.nan)
+    if n1 == 0 or n2 == 0:
+        return p_values
+
+    n = n1 + n2
+    mu = n1 * n2 / 2.0
+    for start in range(0, n_features, chunk_size):
+        stop = min(start + chunk_size, n_features)
+        block = np.vstack([cancer_values[:, start:stop], control_values[:, start:stop]])
+        order, sorted_ranks, tie_term, max_tie = rank_columns(block)
+
+        # Rank sum of the cancer group (first n1 rows of the stacked block)
+        r1 = np.sum(sorted_ranks * (order < n1), axis=0)
+        u1 = r1 - n1 * (n1 + 1) / 2.0
+        u = np.maximum(u1, n1 * n2 - u1)
+
+        s = np.sqrt(n1 * n2 / 12.0 * ((n + 1) - tie_term / (n * (n - 1))))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = (u - mu - 0.5) / s
+        p_block = np.clip(2.0 * ndtr(-z), 0.0, 1.0)
+
+        # scipy switches to the exact distribution for small groups without ties
+        if n1 <= 8 or n2 <= 8:
+            for j in np.flatnonzero(max_tie == 1):
+                p_block[j] = mannwhitneyu(block[:n1, j], block[n1:, j], alternative='two-sided').pvalue
+
+        # NaNs propagate to the p-value as in the per-feature path
+        p_block[np.isnan(block).any(axis=0)] = np.nan
+        p_values[start:stop] = p_block
+
+    return p_values
+
+
+def compute_statistics_vectorized(data_control, data_cancer, pathways, chunk_size=2048, n_jobs=1, executor=None):
+    pathways = pd.Index(pathways)
+    if is_sparse_frame(data_control) or is_sparse_frame(data_cancer):
+        return _compute_statistics_sparse(data_control, data_cancer, pathways, chunk_size, n_jobs, executor)
+
+    # float32 frames stay float32 (ranks and sums are still computed in float64)
+    dtype = feature_dtype(data_control, pathways)
+    control_values = to_numeric_matrix(data_control, pathways, dtype=dtype)
+    cancer_values = to_numeric_matrix(data_cancer, pathways, dtype=dtype)
+    control_mean = _nanmean(control_values)
+    cancer_mean = _nanmean(cancer_values)
+
+    if resolve_n_jobs(n_jobs) == 1 and executor is None:
+        wilcoxon_p = mannwhitneyu_columns(cancer_values, control_values, chunk_size=chunk_size)
+    else:
+        # Ranks are exact half-integers, so the chunked p-values equal the serial ones bit for bit
+        wilcoxon_p, _ = run_column_chunks(_mannwhitneyu_chunk, np.vstack([cancer_values, control_values]),
+                                          n_jobs=n_jobs, chunk_size=chunk_size,
+                                          worker_args=(cancer_values.shape[0], chunk_size),
+                                          executor=executor, label='compute_statistics')
+    return _results_frame(control_mean, cancer_mean, wilcoxon_p, pathways)
+
+
+def _compute_statistics_sparse(data_control, data_cancer, pathways, chunk_size, n_jobs, executor):
+    # Means and rank tests from the nonzero entries of one CSC matrix per group
+    control_values = feature_csc(data_control, pathways)
+    cancer_values = feature_csc(data_cancer, pathways)
+    control_mean = _sparse_nanmean(control_values)
+    cancer_mean = _sparse_nanmean(cancer_values)
+
+    stacked = sparse.vstack([cancer_values, control_values], format='csc')
+    if resolve_n_jobs(n_jobs) == 1 and executor is None:
+        wilcoxon_p = mannwhitneyu_sparse_columns(stacked, cancer_values.shape[0])
+    else:
+        wilcoxon_p, _ = run_column_chunks(_mannwhitneyu_chunk, stacked, n_jobs=n_jobs, chunk_size=chunk_size,
+                                          worker_args=(cancer_values.shape[0], chunk_size),
+                                          executor=executor, label='compute_statistics')
+    return _results_frame(control_mean, cancer_mean, wilcoxon_p, pathways)
+
+
+def _results_frame(control_mean, cancer_mean, wilcoxon_p, pathways):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Calculate fold change
+        fc_value = np.where(control_mean != 0, cancer_mean / control_mean, np.nan)
+        log2fc_value = np.where(fc_value > 0, np.log2(np.where(fc_value > 0, fc_value, 1.0)), np.nan)
+
+    results = pd.DataFrame({
+        'Control_mean': control_mean,
+        'Cancer_mean': cancer_mean,
+        'FC_value': fc_value,
+        'Wilcoxon_p': wilcoxon_p,
+        'log2FC_value': log2fc_value,
+    }, index=pathways, columns=RESULT_COLUMNS, dtype=np.float64)
+
+    return results
+
+
+def _mannwhitneyu_chunk(block, n_cancer, chunk_size):
+    if sparse.issparse(block):
+        return mannwhitneyu_sparse_columns(block, n_cancer)
+    return mannwhitneyu_columns(block[:n_cancer], block[n_cancer:], chunk_size=chunk_size)
+
+
+def _nanmean(values):
+    # Column means skipping NaNs (pandas semantics) without the all-NaN RuntimeWarning
+    counts = np.sum(~np.isnan(values), axis=0)
+    sums = np.nansum(values, axis=0, dtype=np.float64)
+    return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def _sparse_nanmean(values):
+    # _nanmean of a CSC matrix: stored NaNs are skipped, every other row counts (zeros included)
+    n_rows, n_cols = values.shape
+    stored_column = np.repeat(np.arange(n_cols), np.diff(values.indptr))
+    is_nan = np.isnan(values.data)
+    counts = n_rows - np.bincount(stored_column[is_nan], minlength=n_cols)
+    sums = np.bincount(stored_column[~is_nan], weights=values.data[~is_nan], minlength=n_cols)
+    return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
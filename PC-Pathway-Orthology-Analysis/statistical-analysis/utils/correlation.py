@@ -0,0 +1,410 @@
+import hashlib
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy import sparse, stats
+
+from utils.compute_statistics import rank_sparse_columns, to_numeric_matrix
+from utils.fdr import adjust_p_values
+from utils.sparse_features import feature_csc, is_sparse_frame
+
+CORRELATION_METHODS = ('spearman', 'pearson')
+
+# Shapiro-Wilk verdicts keyed on (group, column, alpha, content digest), so every column is tested
+# once per group no matter how many partners it is correlated with. Least recently used entries are
+# dropped above NORMALITY_CACHE_SIZE (a few hundred bytes each), so a warm process does not grow without bound.
+NORMALITY_CACHE_SIZE = 100000
+_normality_cache = OrderedDict()
+
+
+def standardize_block(frame, method='spearman'):
+    """
+    Rank (Spearman) and standardize every column once, so correlations reduce to a matrix product.
+
+    Each column is centred and scaled to unit norm; the correlation of two columns is then the dot
+    product of their standardized vectors. Constant columns have no defined correlation and become
+    all-NaN, like pandas' .corr.
+
+    A sparse frame gives a CSC matrix that is scaled but not centred, so zeros stay zeros (Spearman
+    ranks are shifted so the zeros have rank 0, see rank_sparse_columns). The correlation does not
+    change because correlate_standardized centres the other block, and the dot product of a centred
+    vector with a shifted one equals the dot product with the centred one. Constant columns hold a NaN entry.
+
+    Parameters:
+    - frame (pd.DataFrame): Samples x features, without missing values.
+    - method (str): 'spearman' ranks the columns first (average ranks for ties), 'pearson' does not.
+
+    Returns:
+    - np.ndarray or scipy.sparse.csc_matrix: Standardized samples x features matrix (float64).
+    """
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"Unsupported method: {method}. Please specify 'spearman' or 'pearson'.")
+    if is_sparse_frame(frame):
+        return _standardize_sparse(feature_csc(frame), method)
+    values = frame.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    if np.isnan(values).any():
+        raise ValueError("Correlation input contains missing values; drop or impute them first.")
+    if method == 'spearman':
+        values = stats.rankdata(values, axis=0)
+
+    centred = values - values.mean(axis=0)
+    norms = np.sqrt(np.einsum('ij,ij->j', centred, centred))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        standardized = centred / norms
+    standardized[:, norms <= 1e-12 * np.maximum(1.0, np.abs(values).max(axis=0))] = np.nan
+    return standardized
+
+
+def _standardize_sparse(matrix, method):
+    if np.isnan(matrix.data).any():
+        raise ValueError("Correlation input contains missing values; drop or impute them first.")
+    if method == 'spearman':
+        matrix, _, _, _ = rank_sparse_columns(matrix)
+    else:
+        matrix = sparse.csc_matrix(matrix, dtype=np.float64, copy=True)
+        matrix.eliminate_zeros()
+
+    # Norm of the centred column from its stored entries: sum((x - mean)^2) over entries plus zeros * mean^2
+    n_rows, n_cols = matrix.shape
+    counts = np.diff(matrix.indptr)
+    column = np.repeat(np.arange(n_cols), counts)
+    mean = np.bincount(column, weights=matrix.data, minlength=n_cols) / n_rows
+    centred_sq = np.bincount(column, weights=(matrix.data - mean[column]) ** 2, minlength=n_cols)
+    norms = np.sqrt(centred_sq + (n_rows - counts) * mean ** 2)
+    max_abs = np.zeros(n_cols)
+    np.maximum.at(max_abs, column, np.abs(matrix.data))
+    constant = norms <= 1e-12 * np.maximum(1.0, max_abs)
+
+    # Constant columns are replaced by a single NaN entry so their correlations come out NaN
+    keep = ~constant[column]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        data = matrix.data[keep] / norms[column[keep]]
+    constant_columns = np.flatnonzero(constant)
+    data = np.concatenate([data, np.full(len(constant_columns), np.nan)])
+    rows = np.concatenate([matrix.indices[keep], np.zeros(len(constant_columns), dtype=matrix.indices.dtype)])
+    columns = np.concatenate([column[keep], constant_columns])
+    return sparse.csc_matrix((data, (rows, columns)), shape=matrix.shape)
+
+
+def correlation_p_values(r, n_samples):
+    # Two-sided p-value of the t statistic t = r * sqrt((n - 2) / (1 - r^2)) with n - 2 degrees of freedom
+    dof = n_samples - 2
+    r = np.clip(r, -1.0, 1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = r * np.sqrt(dof / ((1.0 - r) * (1.0 + r)))
+    return 2 * stats.t.sf(np.abs(t), dof)
+
+
+def iter_correlation_blocks(left, right, block_size=2048):
+    """
+    Yield the correlations and p-values of two standardized blocks one column block of `right` at a time.
+
+    Parameters:
+    - left, right (np.ndarray or scipy.sparse matrix): Outputs of standardize_block for the same samples.
+    - block_size (int): Columns of `right` processed per matrix product.
+
+    Yields:
+    - tuple: (start, stop, r, p) with the (left features x stop - start) correlation and p-value blocks.
+    """
+    if left.shape[0] != right.shape[0]:
+        raise ValueError(f"Both blocks need the same samples, got {left.shape[0]} and {right.shape[0]} rows.")
+    n_samples = left.shape[0]
+    if sparse.issparse(left):
+        # Sparse blocks are not centred (see standardize_block); centring one side is enough
+        left = left.toarray()
+        left = left - left.mean(axis=0)
+    for start in range(0, right.shape[1], block_size):
+        stop = min(start + block_size, right.shape[1])
+        block = np.clip(np.asarray(left.T @ right[:, start:stop]), -1.0, 1.0)
+        yield start, stop, block, correlation_p_values(block, n_samples)
+
+
+def correlate_standardized(left, right, block_size=2048):
+    """
+    Correlation and p-value matrices of two standardized blocks, computed over column blocks of `right`.
+
+    Only one block of intermediates (t statistics, masks) lives at a time, so the extra memory is
+    bounded by left.shape[1] x block_size regardless of how wide `right` is. Use significant_pairs
+    when only the pairs passing a threshold are needed; it never holds the full matrices.
+
+    Parameters:
+    - left, right (np.ndarray or scipy.sparse matrix): Outputs of standardize_block for the same samples.
+    - block_size (int): Columns of `right` processed per matrix product.
+
+    Returns:
+    - np.ndarray: Correlation matrix (left features x right features).
+    - np.ndarray: Two-sided p-values, same shape.
+    """
+    r = np.empty((left.shape[1], right.shape[1]))
+    p = np.empty_like(r)
+    for start, stop, r_block, p_block in iter_correlation_blocks(left, right, block_size):
+        r[:, start:stop] = r_block
+        p[:, start:stop] = p_block
+    return r, p
+
+
+def significant_pairs(blocks, shape, max_p_adjusted=None, min_abs_correlation=None, fdr_method='fdr_bh'):
+    """
+    Pairs passing the adjusted p-value and |correlation| filters, without the full r / p / adjusted matrices.
+
+    The first pass over the blocks keeps only the p-values (as float32 logarithms) and adjusts them
+    over all pairs together. The second pass recomputes each block and keeps the pairs that pass both
+    filters, so memory is one float32 value per pair plus one block, instead of three float64 matrices.
+    The adjusted p-values carry float32 precision: relative error below 1e-6 down to p = 1e-10, and
+    growing with |log p| (about 5e-5 at 1e-300).
+
+    Parameters:
+    - blocks (callable): Returns a fresh iterator of (start, stop, r, p) column blocks, as
+      iter_correlation_blocks; it is called twice.
+    - shape (tuple): (left features, right features) of the full matrix.
+    - max_p_adjusted (float): Keep pairs with an adjusted p-value below this threshold (None: no filter).
+    - min_abs_correlation (float): Keep pairs with |correlation| above this threshold (None: no filter).
+    - fdr_method (str): Adjustment over all pairs ('fdr_bh', 'fdr_by' or 'qvalue').
+
+    Returns:
+    - dict of np.ndarray: 'row', 'column', 'correlation', 'p_value' and 'p_value_adjusted' of the kept
+      pairs, in row-major order (every left feature with its right features).
+    """
+    # Natural log in float32: 4 bytes per pair, and p-values far below float32's range do not flush to 0
+    log_p = np.empty(shape, dtype=np.float32)
+    with np.errstate(divide='ignore'):
+        for start, stop, _, p in blocks():
+            log_p[:, start:stop] = np.log(p)
+        adjusted = adjust_p_values(np.exp(log_p.ravel(), dtype=np.float64), method=fdr_method)
+        log_p_adjusted = np.log(adjusted).astype(np.float32).reshape(shape)
+        log_max_p = np.log(max_p_adjusted) if max_p_adjusted is not None else None
+    del log_p, adjusted
+
+    empty = np.empty(0, dtype=np.intp)
+    kept = [(empty, empty, np.empty(0), np.empty(0), np.empty(0))]  # Typed result when no block is kept
+    for start, stop, r, p in blocks():
+        keep = np.ones(r.shape, dtype=bool)
+        if log_max_p is not None:
+            keep &= log_p_adjusted[:, start:stop] < log_max_p
+        if min_abs_correlation is not None:
+            keep &= np.abs(r) > min_abs_correlation
+        i, j = np.nonzero(keep)
+        kept.append((i, j + start, r[i, j], p[i, j], np.exp(log_p_adjusted[i, start + j], dtype=np.float64)))
+
+    names = ('row', 'column', 'correlation', 'p_value', 'p_value_adjusted')
+    pairs = {name: np.concatenate([block[k] for block in kept]) for k, name in enumerate(names)}
+    order = np.lexsort((pairs['column'], pairs['row']))
+    return {name: values[order] for name, values in pairs.items()}
+
+
+def pairwise_correlation(df1, df2, method='spearman', block_size=2048, fdr_method='fdr_bh'):
+    """
+    All pairwise correlations between the columns of two DataFrames (e.g. genus x pathway).
+
+    Vectorized replacement of the notebooks' calculate_pairwise_spearman: each side is ranked once
+    and every coefficient comes from one blocked matrix product. P-values use the t distribution
+    (as scipy's pearsonr/spearmanr) and are BH-adjusted over all pairs together.
+
+    Parameters:
+    - df1, df2 (pd.DataFrame): Samples x features, with the same rows in the same order.
+    - method (str): 'spearman' (default) or 'pearson'.
+    - block_size (int): Columns of df2 per matrix product.
+    - fdr_method (str): Adjustment over all pairs ('fdr_bh', 'fdr_by' or 'qvalue').
+
+    Returns:
+    - dict: 'correlation', 'p_value' and 'p_value_adjusted' DataFrames (df1 columns x df2 columns).
+    """
+    left = standardize_block(df1, method)
+    right = standardize_block(df2, method)
+    return _correlation_frames(left, right, df1.columns, df2.columns, block_size, fdr_method)
+
+
+def group_correlations(left, rights, groups, method='spearman', block_size=2048, fdr_method='fdr_bh'):
+    """
+    Pairwise correlations of one block against several others, separately within each sample group.
+
+    The shared `left` block (e.g. genus abundances) is ranked and standardized once per group and
+    reused for every block in `rights` (e.g. pathways and orthologies), instead of being re-ranked for
+    every pairing as the notebooks do.
+
+    Parameters:
+    - left (pd.DataFrame): Samples x features shared by every pairing.
+    - rights (dict): Name -> samples x features DataFrame, same rows as `left`.
+    - groups (pd.Series or array-like): Group label per sample (e.g. group_2: 1 = PC, 0 = control).
+    - method, block_size, fdr_method: See pairwise_correlation.
+
+    Returns:
+    - dict: (group, name) -> dict of 'correlation', 'p_value' and 'p_value_adjusted' DataFrames.
+    """
+    groups = np.asarray(groups)
+    results = {}
+    for group in pd.unique(groups).tolist():
+        rows = groups == group
+        left_standardized = standardize_block(left.loc[rows], method)
+        for name, right in rights.items():
+            right_standardized = standardize_block(right.loc[rows], method)
+            results[(group, name)] = _correlation_frames(left_standardized, right_standardized, left.columns,
+                                                         right.columns, block_size, fdr_method)
+    return results
+
+
+def correlation_pairs(result, left_label='Taxonomy', right_label='Feature', max_p_adjusted=None):
+    """
+    Long format (one row per pair) of a pairwise_correlation result, optionally only significant pairs.
+
+    Parameters:
+    - result (dict): Output of pairwise_correlation / one entry of group_correlations.
+    - left_label, right_label (str): Names of the two feature columns.
+    - max_p_adjusted (float): Keep only pairs with an adjusted p-value below this threshold.
+
+    Returns:
+    - pd.DataFrame: left_label, right_label, 'Correlation', 'p_value', 'p_value_adjusted'.
+    """
+    r = result['correlation']
+    keep = np.ones(r.shape, dtype=bool)
+    if max_p_adjusted is not None:
+        keep = result['p_value_adjusted'].to_numpy() < max_p_adjusted
+    i, j = np.nonzero(keep)
+    return pd.DataFrame({
+        left_label: r.index[i],
+        right_label: r.columns[j],
+        'Correlation': r.to_numpy()[i, j],
+        'p_value': result['p_value'].to_numpy()[i, j],
+        'p_value_adjusted': result['p_value_adjusted'].to_numpy()[i, j],
+    })
+
+
+def pairwise_significant_pairs(df1, df2, method='spearman', block_size=2048, fdr_method='fdr_bh',
+                               max_p_adjusted=0.05, min_abs_correlation=None, left_label='Taxonomy',
+                               right_label='Feature'):
+    """
+    Significant pairs of pairwise_correlation in long format, computed block by block (see significant_pairs).
+
+    Same rows as correlation_pairs(pairwise_correlation(df1, df2, ...), max_p_adjusted=...), except that
+    the adjusted p-values are computed in float32; use it when df1 x df2 is too large for dense matrices.
+
+    Parameters:
+    - df1, df2 (pd.DataFrame): Samples x features, with the same rows in the same order.
+    - method, block_size, fdr_method: See pairwise_correlation.
+    - max_p_adjusted (float): Keep pairs with an adjusted p-value below this threshold (None: no filter).
+    - min_abs_correlation (float): Keep pairs with |correlation| above this threshold (None: no filter).
+    - left_label, right_label (str): Names of the two feature columns.
+
+    Returns:
+    - pd.DataFrame: left_label, right_label, 'Correlation', 'p_value', 'p_value_adjusted'.
+    """
+    left = standardize_block(df1, method)
+    right = standardize_block(df2, method)
+    pairs = significant_pairs(lambda: iter_correlation_blocks(left, right, block_size),
+                              (df1.shape[1], df2.shape[1]), max_p_adjusted, min_abs_correlation, fdr_method)
+    return pd.DataFrame({
+        left_label: df1.columns[pairs['row']],
+        right_label: df2.columns[pairs['column']],
+        'Correlation': pairs['correlation'],
+        'p_value': pairs['p_value'],
+        'p_value_adjusted': pairs['p_value_adjusted'],
+    })
+
+
+def normality_verdicts(frame, alpha=0.05, group=None):
+    """
+    Shapiro-Wilk normality verdict per column, cached per column and group (LRU, NORMALITY_CACHE_SIZE entries).
+
+    Parameters:
+    - frame (pd.DataFrame): Samples x features of one group.
+    - alpha (float): Columns with a Shapiro p-value above alpha count as normal.
+    - group: Label of the sample group (part of the cache key).
+
+    Returns:
+    - pd.Series: Boolean verdict indexed by column.
+    """
+    values = to_numeric_matrix(frame, frame.columns)
+    keys = []
+    for column, data in zip(frame.columns, np.ascontiguousarray(values.T)):
+        keys.append((group, column, alpha, hashlib.blake2b(data.tobytes(), digest_size=16).hexdigest()))
+
+    missing = []
+    for i, key in enumerate(keys):
+        if key in _normality_cache:
+            _normality_cache.move_to_end(key)
+        else:
+            missing.append(i)
+    if missing:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # Constant columns warn; they are handled by the correlation
+            p_values = np.atleast_1d(stats.shapiro(values[:, missing], axis=0).pvalue)
+        for i, p_value in zip(missing, p_values):
+            _normality_cache[keys[i]] = bool(p_value > alpha)
+    verdicts = pd.Series([_normality_cache[key] for key in keys], index=frame.columns, dtype=bool)
+
+    # Evict after reading, so a frame wider than the cache still gets all of its verdicts
+    while len(_normality_cache) > NORMALITY_CACHE_SIZE:
+        _normality_cache.popitem(last=False)
+    return verdicts
+
+
+def calculate_correlation(taxonomy_data, data, selected_genus, up, down, label="Pathway", alpha=0.05,
+                          min_abs_correlation=0.3, group=None, block_size=2048):
+    """
+    Normality-gated correlation of selected genera with up- and downregulated features.
+
+    Same output as the correlation notebooks' calculate_correlation: a pair is correlated with
+    Pearson when both columns pass Shapiro-Wilk and with Spearman otherwise. Normality is tested
+    once per column and group (cached), both correlations are computed block by block and the
+    method is picked per pair with a mask. P-values are BH-adjusted over all pairs (in float32, see
+    significant_pairs) and only the significant pairs are built.
+
+    Parameters:
+    - taxonomy_data (pd.DataFrame): Genus abundances of one group (samples x genera).
+    - data (pd.DataFrame): Pathway/orthology abundances of the same samples, same row order.
+    - selected_genus (list): Genus columns to correlate.
+    - up, down (list): Upregulated and downregulated feature columns.
+    - label (str): 'Pathway' or 'Orthology', prefix of the output columns.
+    - alpha (float): Shapiro-Wilk alpha and significance threshold of the adjusted p-values.
+    - min_abs_correlation (float): Minimum |correlation| of the returned pairs.
+    - group: Label of the sample group, used for the normality cache (e.g. 'PC', 'Control').
+    - block_size (int): Feature columns per matrix product.
+
+    Returns:
+    - pd.DataFrame: Significant pairs with Taxonomy, label, {label}_Correlation, {label}_p_value,
+      {label}_p_value_adjusted, {label}_Correlation_Method and {label}_Regulation_Type.
+    """
+    taxonomy_selected = taxonomy_data[selected_genus]
+    features = data[list(up) + list(down)]
+    regulation = np.array(['Upregulated'] * len(up) + ['Downregulated'] * len(down))
+
+    pearson = np.outer(normality_verdicts(taxonomy_selected, alpha, group).to_numpy(),
+                       normality_verdicts(features, alpha, group).to_numpy())
+    standardized = {method: (standardize_block(taxonomy_selected, method), standardize_block(features, method))
+                    for method in CORRELATION_METHODS}
+
+    def blocks():
+        # Both methods per block, the Pearson entries where both columns are normal
+        for (start, stop, r_pearson, p_pearson), (_, _, r_spearman, p_spearman) in zip(
+                iter_correlation_blocks(*standardized['pearson'], block_size),
+                iter_correlation_blocks(*standardized['spearman'], block_size)):
+            use_pearson = pearson[:, start:stop]
+            yield (start, stop, np.where(use_pearson, r_pearson, r_spearman),
+                   np.where(use_pearson, p_pearson, p_spearman))
+
+    # Only the significant pairs are built; p-values are BH-adjusted over all pairs
+    pairs = significant_pairs(blocks, pearson.shape, max_p_adjusted=alpha, min_abs_correlation=min_abs_correlation)
+    i, j = pairs['row'], pairs['column']
+
+    # Rows in the notebook order: every genus, its upregulated then its downregulated features
+    return pd.DataFrame({
+        "Taxonomy": np.asarray(taxonomy_selected.columns)[i],
+        label: np.asarray(features.columns)[j],
+        f"{label}_Correlation": pairs['correlation'],
+        f"{label}_p_value": pairs['p_value'],
+        f"{label}_p_value_adjusted": pairs['p_value_adjusted'],
+        f"{label}_Correlation_Method": np.where(pearson[i, j], "Pearson", "Spearman"),
+        f"{label}_Regulation_Type": regulation[j],
+    })
+
+
+def _correlation_frames(left, right, left_columns, right_columns, block_size, fdr_method):
+    r, p = correlate_standardized(left, right, block_size)
+    p_adjusted = adjust_p_values(p.ravel(), method=fdr_method).reshape(p.shape)
+    return {
+        'correlation': pd.DataFrame(r, index=left_columns, columns=right_columns),
+        'p_value': pd.DataFrame(p, index=left_columns, columns=right_columns),
+        'p_value_adjusted': pd.DataFrame(p_adjusted, index=left_columns, columns=right_columns),
+    }
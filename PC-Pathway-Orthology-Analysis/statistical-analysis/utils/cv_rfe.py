@@ -0,0 +1,522 @@
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.inspection import permutation_importance
+from sklearn.metrics import accuracy_score, auc, confusion_matrix, roc_curve
+from sklearn.model_selection import StratifiedKFold
+
+from utils.parallel import resolve_n_jobs
+from utils.shap_stage import explain_and_store, plot_shap_summary, shap_importance
+
+MODEL_CHOICES = ['xgb', 'rf', 'catboost', 'gbm', 'lgbm']
+
+
+def initialize_model(model_choice, n_estimators=100, learning_rate=0.1, max_depth=6, random_state=42, n_threads=1):
+    """
+    CPU estimator for the model choices of Genus_ML_analysis.
+
+    Boosting libraries are imported only when chosen. XGBoost uses tree_method='hist' on the CPU, and
+    every model is limited to n_threads so that several folds can train side by side without
+    oversubscribing the cores.
+    """
+    if model_choice == 'xgb':
+        import xgboost as xgb
+        return xgb.XGBClassifier(n_estimators=n_estimators, learning_rate=learning_rate, max_depth=max_depth,
+                                 random_state=random_state, tree_method='hist', device='cpu', n_jobs=n_threads)
+    elif model_choice == 'rf':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=random_state,
+                                      n_jobs=n_threads)
+    elif model_choice == 'catboost':
+        from catboost import CatBoostClassifier
+        return CatBoostClassifier(iterations=n_estimators, depth=max_depth, learning_rate=learning_rate,
+                                  random_state=random_state, verbose=0, task_type='CPU', thread_count=n_threads)
+    elif model_choice == 'gbm':
+        from sklearn.ensemble import GradientBoostingClassifier
+        return GradientBoostingClassifier(n_estimators=n_estimators, learning_rate=learning_rate,
+                                          max_depth=max_depth, random_state=random_state)
+    elif model_choice == 'lgbm':
+        import lightgbm as lgb
+        return lgb.LGBMClassifier(n_estimators=n_estimators, learning_rate=learning_rate, max_depth=max_depth,
+                                  random_state=random_state, device='cpu', n_jobs=n_threads, verbose=-1)
+    raise ValueError(f"Unsupported model type: {model_choice}")
+
+
+def parse_step_schedule(schedule):
+    """
+    Parse an elimination step schedule.
+
+    The schedule is a comma-separated list of 'above:step' entries followed by a default step, e.g.
+    '60:0.1,30:2,1' removes 10% of the initial features per round while more than 60 remain, then 2
+    per round while more than 30 remain, then 1 per round. A step below 1 is a fraction of the initial
+    feature count, as sklearn's RFE step; a single entry ('1', '5', '0.1') reproduces RFE(step=...).
+
+    Returns:
+    - list of (int, float): (threshold, step) pairs, highest threshold first, ending with threshold 0.
+    """
+    entries = []
+    for part in str(schedule).split(','):
+        part = part.strip()
+        if ':' in part:
+            threshold, step = part.split(':')
+            entries.append((int(threshold), float(step)))
+        elif part:
+            entries.append((0, float(part)))
+    if not entries or entries[-1][0] != 0:
+        entries.append((0, 1.0))
+    return sorted(entries, key=lambda entry: -entry[0])
+
+
+def elimination_step(schedule, n_remaining, n_total):
+    for threshold, step in schedule:
+        if n_remaining > threshold:
+            return max(1, int(step * n_total)) if step < 1 else int(step)
+    return 1
+
+
+def _feature_importances(estimator):
+    if hasattr(estimator, 'feature_importances_'):
+        return np.asarray(estimator.feature_importances_, dtype=np.float64)
+    return np.abs(np.ravel(estimator.coef_)).astype(np.float64)
+
+
+def rfe_cache_key(model_choice, model_params, step_schedule, X, y):
+    # Everything the elimination path depends on: model, schedule and the fold's training data
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([model_choice, model_params, step_schedule], sort_keys=True, default=str).encode('utf-8'))
+    digest.update(json.dumps(list(map(str, X.columns))).encode('utf-8'))
+    digest.update(np.ascontiguousarray(X.to_numpy(dtype=np.float64)).tobytes())
+    digest.update(np.ascontiguousarray(np.asarray(y, dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+def rfe_elimination_path(estimator, X, y, step_schedule, min_features, rounds=None):
+    """
+    Recursive feature elimination that records every round instead of only the final support.
+
+    Each round stores the remaining features (original column order) and the importances of the
+    estimator fitted on them. Only full steps of the schedule are recorded: sklearn's RFE clips its
+    last step to n_features_to_select, which select_from_path reproduces by dropping the lowest-ranked
+    features of the last round with at least n features. Given the rounds, select_from_path therefore
+    returns exactly the features sklearn's RFE(n_features_to_select=n) would keep for any
+    n >= min_features, so one path serves every n, and cached rounds are extended, not recomputed,
+    when a smaller min_features is requested.
+
+    Parameters:
+    - estimator: Unfitted sklearn-compatible classifier (cloned for every round).
+    - X (pd.DataFrame): Training features.
+    - y (array-like): Training labels.
+    - step_schedule (list): Output of parse_step_schedule.
+    - min_features (int): Eliminate until the next full step would go below this many features.
+    - rounds (list): Previously computed rounds to continue from.
+
+    Returns:
+    - list of dict: Rounds with 'features' (list of column names) and 'importances' (list of float).
+    """
+    columns = pd.Index(X.columns)
+    rounds = _full_step_rounds(list(rounds or []), step_schedule, len(columns))
+    values = X.to_numpy(dtype=np.float64)
+    if rounds:
+        remaining = columns.get_indexer(rounds[-1]['features'])
+        importances = np.asarray(rounds[-1]['importances'])
+    else:
+        remaining = np.arange(len(columns))
+        importances = None
+
+    while True:
+        if importances is None:
+            model = clone(estimator)
+            model.fit(values[:, remaining], y)
+            importances = _feature_importances(model)
+            rounds.append({'features': list(columns[remaining]), 'importances': importances.tolist()})
+        step = elimination_step(step_schedule, len(remaining), len(columns))
+        if len(remaining) - step < min_features:
+            # The remaining (clipped) step is taken by select_from_path from this round's ranking
+            return rounds
+        ranks = np.argsort(importances, kind="stable")  # Ties broken as sklearn RFE
+        keep = np.ones(len(remaining), dtype=bool)
+        keep[ranks[:step]] = False
+        remaining = remaining[keep]
+        importances = None
+
+
+def _full_step_rounds(rounds, step_schedule, n_total):
+    # Paths cached before clipped rounds were left out can end in one; extending from it would diverge
+    # from sklearn (26 -> 25 -> 22 instead of 26 -> 23 -> 20 with step 3), so it is dropped
+    for i in range(1, len(rounds)):
+        n_before, n_after = len(rounds[i - 1]['features']), len(rounds[i]['features'])
+        if n_before - n_after != elimination_step(step_schedule, n_before, n_total):
+            return rounds[:i]
+    return rounds
+
+
+def select_from_path(rounds, n_features):
+    # Last round with at least n features; drop its lowest-ranked features to reach exactly n (as RFE does)
+    candidates = [r for r in rounds if len(r['features']) >= n_features]
+    if not candidates:
+        raise ValueError(f"Elimination path does not reach {n_features} features.")
+    last = candidates[-1]
+    features = np.asarray(last['features'], dtype=object)
+    n_drop = len(features) - n_features
+    if n_drop == 0:
+        return list(features)
+    keep = np.ones(len(features), dtype=bool)
+    keep[np.argsort(np.asarray(last["importances"]), kind="stable")[:n_drop]] = False
+    return list(features[keep])
+
+
+def load_rfe_rounds(cache_dir, key):
+    path = os.path.join(cache_dir, f'{key}.json')
+    if cache_dir and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return []
+
+
+def store_rfe_rounds(cache_dir, key, rounds):
+    if not cache_dir:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f'{key}.json')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(rounds, f)
+    os.replace(tmp_path, path)
+
+
+def FNR_eval(y_pred_proba, y_true):
+    y_pred_label = (y_pred_proba >= 0.5).astype(int)
+    tn, fp, fn, tp = confusion_matrix(y_true, y_pred_label, labels=[0, 1]).ravel()
+    return fn / (fn + tp)  # FN / (FN + TP)
+
+
+def run_fold(task):
+    """
+    One (model, fold) task: cached elimination path, then refit/evaluate/artifacts for every requested n.
+
+    Runs in a worker process; returns plain data so the parent can aggregate across folds.
+    """
+    started = time.perf_counter()
+    X_train, X_val = task['X_train'], task['X_val']
+    y_train, y_val = task['y_train'], task['y_val']
+    fold, model_choice = task['fold'], task['model_choice']
+    model = initialize_model(model_choice, **task['model_params'], n_threads=task['n_threads'])
+
+    # Step 1: elimination path, reused from the cache when this fold was eliminated before
+    key = rfe_cache_key(model_choice, task['model_params'], task['step_schedule'], X_train, y_train)
+    cached = load_rfe_rounds(task['cache_dir'], key)
+    min_features = min(task['n_features'])
+    n_cached_fits = len(_full_step_rounds(cached, task['step_schedule'], X_train.shape[1]))
+    rounds = rfe_elimination_path(model, X_train, y_train, task['step_schedule'], min_features, rounds=cached)
+    if rounds != cached:
+        store_rfe_rounds(task['cache_dir'], key, rounds)
+    rfe_seconds = time.perf_counter() - started
+
+    outcomes = []
+    for n_features in task['n_features']:
+        fold_started = time.perf_counter()
+        run_output_dir = task['run_output_dirs'][n_features]
+        selected_features = select_from_path(rounds, n_features)
+        X_train_selected, X_val_selected = X_train[selected_features], X_val[selected_features]
+
+        # Step 2: refit on the selected features and evaluate on the validation fold
+        model_refit = clone(model).fit(X_train_selected, y_train)
+        val_pred = model_refit.predict(X_val_selected)
+        y_pred_proba = model_refit.predict_proba(X_val_selected)[:, 1]
+        accuracy = accuracy_score(y_val, val_pred)
+        fnr = FNR_eval(y_pred_proba, y_val)
+        fpr, tpr, _ = roc_curve(y_val, y_pred_proba)
+        plot_confusion_matrix(confusion_matrix(y_val, val_pred, labels=[0, 1]), run_output_dir, fold)
+
+        # Step 3: permutation importance on both sets and the features important in both
+        train_importances = permutation_importance(model_refit, X_train_selected, y_train, n_repeats=5,
+                                                   random_state=task['random_state']).importances_mean
+        val_importances = permutation_importance(model_refit, X_val_selected, y_val, n_repeats=5,
+                                                 random_state=task['random_state']).importances_mean
+        save_permutation_importance(train_importances, selected_features, run_output_dir, model_choice,
+                                    f"train_fold_{fold}")
+        save_permutation_importance(val_importances, selected_features, run_output_dir, model_choice,
+                                    f"val_fold_{fold}")
+        plot_feature_importance(train_importances, selected_features, 'train', fold, run_output_dir)
+        plot_feature_importance(val_importances, selected_features, 'valid', fold, run_output_dir)
+
+        train_important_features = X_train_selected.columns[train_importances > 0]
+        val_important_features = X_val_selected.columns[val_importances > 0]
+        common_features = train_important_features.intersection(val_important_features)
+        for name, feature_list in [('train_important_features', train_important_features),
+                                   ('val_important_features', val_important_features),
+                                   ('common_features', common_features)]:
+            with open(os.path.join(run_output_dir, f'{name}_fold_{fold}.txt'), 'w') as f:
+                for feature in feature_list:
+                    f.write(f"{feature}\n")
+
+        # Step 4: SHAP values of the validation fold, stored per model hash and plotted from the store
+        shap_path, shap_cached, shap_seconds = None, False, 0.0
+        if task['explain']:
+            shap_started = time.perf_counter()
+            background = X_train_selected if task['shap_background_size'] else None
+            shap_path, shap_cached = explain_and_store(
+                model_refit, X_val_selected, task['shap_dir'], background=background,
+                background_size=task['shap_background_size'], batch_size=task['shap_batch_size'],
+                seed=task['random_state'],
+                metadata={'model_choice': model_choice, 'fold': fold, 'dataset': 'validation'})
+            plot_shap_summary([shap_path], os.path.join(run_output_dir, f'shap_feature_importance_{fold}.png'))
+            shap_seconds = time.perf_counter() - shap_started
+
+        if task['save_fold_data']:
+            train_data = X_train.assign(label=y_train, set='Discovery')
+            val_data = X_val.assign(label=y_val, set='Validation')
+            pd.concat([train_data, val_data]).to_excel(
+                os.path.join(run_output_dir, f'combined_train_val_fold_{fold}.xlsx'), index=True)
+
+        outcomes.append({
+            'model_choice': model_choice,
+            'n_features': n_features,
+            'fold': fold,
+            'selected_features': selected_features,
+            'train_important_features': list(train_important_features),
+            'val_important_features': list(val_important_features),
+            'common_features': list(common_features),
+            'accuracy': accuracy,
+            'fnr': fnr,
+            'fpr': fpr,
+            'tpr': tpr,
+            'shap_path': shap_path,
+            'shap_cached': shap_cached,
+            'shap_seconds': shap_seconds,
+            'evaluation_seconds': time.perf_counter() - fold_started,
+        })
+
+    for outcome in outcomes:
+        outcome.update({
+            'rfe_seconds': rfe_seconds,
+            'rfe_fits': len(rounds) - n_cached_fits,
+            'rfe_cached_rounds': n_cached_fits,
+            'seconds': time.perf_counter() - started,
+            'pid': os.getpid(),
+        })
+    return outcomes
+
+
+def run_cv_rfe(features, label, model_choices=('xgb',), n_features=(20,), n_splits=5, step_schedule='1',
+               n_jobs=-1, n_threads=1, cache_dir=None, output_dir='Train_Result_RFE', random_state=42,
+               model_params=None, save_fold_data=True, explain=True, shap_background_size=100,
+               shap_batch_size=256):
+    """
+    Cross-validated RFE for several models, with folds and models trained concurrently on the CPU.
+
+    Every (model, fold) pair is one process-pool task. A task computes the fold's elimination path
+    once (or reads it from cache_dir) and evaluates every requested n_features from it, so reruns
+    with new n_features values reuse the earlier eliminations. Artifacts follow Genus_ML_analysis:
+    Train_Result_RFE/<model>_<timestamp>/ with CV_Results_<model>.txt, common_features_fold_<k>.txt,
+    confusion_matrix_fold_<k>.png, shap_feature_importance_<k>.png, cv_roc_curves.png and the count
+    workbooks, plus fold_timing.csv and the cross-fold SHAP summary (shap_importance_cv.xlsx,
+    shap_feature_importance_cv.png) built from the stored explanations.
+
+    Parameters:
+    - features (pd.DataFrame): Samples x features.
+    - label (pd.Series): Binary labels (group_1).
+    - model_choices (list): Any of MODEL_CHOICES.
+    - n_features (list): Values of n_features_to_select to evaluate.
+    - n_splits (int): Stratified folds.
+    - step_schedule (str): Elimination schedule, see parse_step_schedule.
+    - n_jobs (int): Worker processes (-1 for all cores).
+    - n_threads (int): Threads per model inside a worker.
+    - cache_dir (str): Folder for cached elimination paths (None disables caching).
+    - output_dir (str): Root output folder.
+    - random_state (int): Seed of the folds and models.
+    - model_params (dict): n_estimators, learning_rate, max_depth overrides.
+    - save_fold_data (bool): Write combined_train_val_fold_<k>.xlsx per fold.
+    - explain (bool): Run the SHAP stage (skipped when shap is not installed).
+    - shap_background_size (int): Training rows sampled as the interventional SHAP background
+      (0 for the notebook's tree-path-dependent explainer).
+    - shap_batch_size (int): Validation rows per SHAP call.
+
+    Returns:
+    - dict: Model -> n_features -> {'run_output_dir', 'mean_accuracy', 'mean_fnr'}.
+    """
+    params = {'n_estimators': 100, 'learning_rate': 0.1, 'max_depth': 6, 'random_state': random_state,
+              **(model_params or {})}
+    schedule = parse_step_schedule(step_schedule)
+    n_features = sorted(set(n_features), reverse=True)
+    label = label.astype(int)
+    skf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    splits = list(skf.split(features, label))
+
+    if explain:
+        try:
+            import shap  # noqa: F401
+        except ImportError:
+            print("shap is not installed; skipping the SHAP stage")
+            explain = False
+
+    timestamp = time.strftime('%Y%m%d-%H%M%S')
+    run_output_dirs = {}
+    for model_choice in model_choices:
+        for n in n_features:
+            dir_name = f"{model_choice}_{timestamp}" if len(n_features) == 1 else f"{model_choice}_n{n}_{timestamp}"
+            run_output_dirs[(model_choice, n)] = os.path.join(output_dir, dir_name)
+            os.makedirs(run_output_dirs[(model_choice, n)], exist_ok=True)
+
+    tasks = []
+    for model_choice in model_choices:
+        for fold, (train_idx, val_idx) in enumerate(splits, start=1):
+            tasks.append({
+                'model_choice': model_choice, 'fold': fold, 'model_params': params, 'n_threads': n_threads,
+                'X_train': features.iloc[train_idx], 'X_val': features.iloc[val_idx],
+                'y_train': label.iloc[train_idx], 'y_val': label.iloc[val_idx],
+                'step_schedule': schedule, 'n_features': n_features, 'cache_dir': cache_dir,
+                'random_state': random_state, 'save_fold_data': save_fold_data, 'explain': explain,
+                'shap_background_size': shap_background_size, 'shap_batch_size': shap_batch_size,
+                'shap_dir': os.path.join(cache_dir or output_dir, 'shap'),
+                'run_output_dirs': {n: run_output_dirs[(model_choice, n)] for n in n_features},
+            })
+
+    started = time.perf_counter()
+    outcomes = []
+    n_jobs = min(resolve_n_jobs(n_jobs), len(tasks))
+    if n_jobs == 1:
+        for task in tasks:
+            outcomes.extend(_log_fold(run_fold(task)))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            for future in as_completed([executor.submit(run_fold, task) for task in tasks]):
+                outcomes.extend(_log_fold(future.result()))
+    print(f"{len(tasks)} fold tasks on {n_jobs} workers finished in {time.perf_counter() - started:.2f}s")
+
+    summary = {}
+    for (model_choice, n), run_output_dir in run_output_dirs.items():
+        model_outcomes = sorted([o for o in outcomes if o['model_choice'] == model_choice and o['n_features'] == n],
+                                key=lambda o: o['fold'])
+        summary.setdefault(model_choice, {})[n] = write_cv_summary(model_outcomes, model_choice, run_output_dir)
+    return summary
+
+
+def _log_fold(outcomes):
+    for o in outcomes:
+        print(f"{o['model_choice']} fold {o['fold']} (n={o['n_features']}): accuracy {o['accuracy']:.4f}, "
+              f"FNR {o['fnr']:.4f}, RFE {o['rfe_seconds']:.2f}s ({o['rfe_fits']} fits, "
+              f"{o['rfe_cached_rounds']} cached rounds), evaluation {o['evaluation_seconds']:.2f}s (pid {o['pid']})")
+    return outcomes
+
+
+def write_cv_summary(outcomes, model_choice, run_output_dir):
+    # Aggregate artifacts of one (model, n_features) run, in the layout of the notebook
+    def save_counts(counter, file_name):
+        counts = pd.DataFrame.from_dict(counter, orient='index', columns=['count']).sort_values(by='count',
+                                                                                                 ascending=False)
+        counts.to_excel(os.path.join(run_output_dir, file_name))
+
+    save_counts(Counter(f for o in outcomes for f in o['selected_features']), 'feature_selection_counts.xlsx')
+    save_counts(Counter(f for o in outcomes for f in o['train_important_features']),
+                'train_feature_importance_counts.xlsx')
+    save_counts(Counter(f for o in outcomes for f in o['val_important_features']), 'val_feature_importance_counts.xlsx')
+    save_counts(Counter(f for o in outcomes for f in o['common_features']), 'common_feature_counts.xlsx')
+
+    mean_accuracy = np.mean([o['accuracy'] for o in outcomes])
+    mean_fnr = np.mean([o['fnr'] for o in outcomes])
+    print(f"\nCross-validation results for {model_choice}:")
+    print(f"Mean Accuracy: {mean_accuracy:.4f}")
+    print(f"Mean FNR: {mean_fnr:.4f}")
+    with open(os.path.join(run_output_dir, f'CV_Results_{model_choice}.txt'), 'w') as f:
+        f.write(f"Model: {model_choice}\n")
+        f.write(f"Mean Accuracy: {mean_accuracy:.4f}\n")
+        f.write(f"Mean FNR: {mean_fnr:.4f}\n")
+
+    pd.DataFrame([{
+        'fold': o['fold'], 'n_features': o['n_features'], 'rfe_seconds': round(o['rfe_seconds'], 3),
+        'rfe_fits': o['rfe_fits'], 'rfe_cached_rounds': o['rfe_cached_rounds'],
+        'evaluation_seconds': round(o['evaluation_seconds'], 3), 'shap_seconds': round(o['shap_seconds'], 3),
+        'shap_cached': o['shap_cached'], 'task_seconds': round(o['seconds'], 3),
+        'pid': o['pid'],
+    } for o in outcomes]).to_csv(os.path.join(run_output_dir, 'fold_timing.csv'), index=False)
+
+    plot_cv_roc_curves(outcomes, model_choice, run_output_dir)
+    shap_paths = [o['shap_path'] for o in outcomes if o['shap_path']]
+    if shap_paths:
+        shap_importance(shap_paths).to_excel(os.path.join(run_output_dir, 'shap_importance_cv.xlsx'))
+        plot_shap_summary(shap_paths, os.path.join(run_output_dir, 'shap_feature_importance_cv.png'))
+    print(f"All cross-validation results saved in {run_output_dir}")
+    return {'run_output_dir': run_output_dir, 'mean_accuracy': float(mean_accuracy), 'mean_fnr': float(mean_fnr)}
+
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg')  # Worker processes have no display
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def plot_confusion_matrix(conf_matrix, run_output_dir, fold_number):
+    import seaborn as sns
+    plt = _pyplot()
+    plt.figure(figsize=(6, 5))
+    sns.heatmap(conf_matrix, annot=True, fmt='d', cmap='Blues', xticklabels=['Control', 'Cancer'],
+                yticklabels=['Control', 'Cancer'], annot_kws={"size": 14})
+    plt.title('Confusion Matrix on Validation Set', fontsize=15)
+    plt.xlabel('Predicted Label', fontsize=13)
+    plt.ylabel('True Label', fontsize=13)
+    plt.tight_layout()
+    plt.savefig(os.path.join(run_output_dir, f'confusion_matrix_fold_{fold_number}.png'))
+    plt.close()
+
+
+def save_permutation_importance(importances, features, run_output_dir, model_choice, mode):
+    importance_df = pd.DataFrame({'Feature': features, 'Importance': importances}).sort_values(
+        by='Importance', ascending=False)
+    importance_df.to_csv(os.path.join(run_output_dir, f'permutation_importance_{mode}_{model_choice}.csv'), index=False)
+
+
+def plot_feature_importance(importances, feature_names, dataset_type, fold_number, run_output_dir):
+    import seaborn as sns
+    plt = _pyplot()
+    importance_df = pd.DataFrame({'Feature': feature_names, 'Importance': importances}).sort_values(
+        by='Importance', ascending=False)
+    plt.figure(figsize=(10, 6))
+    cmap = sns.color_palette("rainbow", as_cmap=True)
+    colors = [cmap(i) for i in np.linspace(0, 1, len(importance_df))]
+    sns.barplot(x='Importance', y='Feature', data=importance_df, palette=colors, hue='Feature', dodge=False,
+                legend=False)
+    plt.title(f'Feature Importances ({dataset_type.capitalize()} - Fold {fold_number})')
+    plt.tight_layout()
+    plt.savefig(os.path.join(run_output_dir, f'feature_importance_{dataset_type}_fold_{fold_number}.png'))
+    plt.close()
+
+
+def plot_cv_roc_curves(outcomes, model_choice, run_output_dir):
+    # ROC of every fold's refitted model on its validation fold, plus the interpolated mean
+    plt = _pyplot()
+    plt.figure(figsize=(10, 8))
+    mean_fpr = np.linspace(0, 1, 100)
+    tprs, aucs = [], []
+    for o in outcomes:
+        roc_auc = auc(o['fpr'], o['tpr'])
+        tprs.append(np.interp(mean_fpr, o['fpr'], o['tpr']))
+        tprs[-1][0] = 0.0
+        aucs.append(roc_auc)
+        plt.plot(o['fpr'], o['tpr'], lw=1, alpha=0.3, label=f"Fold {o['fold']} AUC: {roc_auc:.4f}")
+
+    mean_tpr = np.mean(tprs, axis=0)
+    mean_tpr[-1] = 1.0
+    std_tpr = np.std(tprs, axis=0)
+    plt.plot(mean_fpr, mean_tpr, color='orange', lw=2, alpha=0.8,
+             label=r'Mean ROC (AUC = %0.4f ± %0.4f)' % (auc(mean_fpr, mean_tpr), np.std(aucs)))
+    plt.fill_between(mean_fpr, np.maximum(mean_tpr - std_tpr, 0), np.minimum(mean_tpr + std_tpr, 1), color='grey',
+                     alpha=0.2, label=r'± 1 std. dev.')
+    plt.plot([0, 1], [0, 1], 'k--', lw=2)
+    plt.xlim([0.0, 1.0])
+    plt.ylim([0.0, 1.05])
+    plt.xlabel('False Positive Rate')
+    plt.ylabel('True Positive Rate')
+    plt.title(f'Cross-Validation ROC Curves - {model_choice}')
+    plt.legend(loc="lower right")
+    plt.tight_layout()
+    plt.savefig(os.path.join(run_output_dir, 'cv_roc_curves.png'))
+    plt.close()
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.spatial.distance import cdist
+
+from utils.compute_statistics import compute_statistics
+from utils.intermediate import load_preprocessed_data
+from utils.sparse_features import feature_csc, split_groups
+
+ALPHA_METRICS = ('shannon', 'simpson', 'chao1', 'observed')
+BETA_METRICS = ('braycurtis', 'jaccard')
+
+
+def _abundance_rows(counts, columns=None):
+    # Samples x taxa as CSR: zeros are never stored, so every metric only visits the observed taxa
+    if isinstance(counts, pd.DataFrame):
+        matrix = feature_csc(counts, counts.columns if columns is None else columns).tocsr()
+    else:
+        matrix = sparse.csr_matrix(counts, dtype=np.float64)
+    if matrix.nnz and (np.isnan(matrix.data).any() or (matrix.data < 0).any()):
+        raise ValueError("Diversity needs non-negative abundances without missing values.")
+    return matrix
+
+
+def alpha_diversity(counts, metrics=ALPHA_METRICS, columns=None, base=None):
+    """
+    Alpha diversity of every sample at once, equal to skbio.diversity.alpha_diversity per metric.
+
+    All metrics are computed from the nonzero entries of one CSR matrix:
+    - shannon: -sum(p log p) of the relative abundances (natural log, or log base `base`).
+    - simpson: 1 - sum(p^2).
+    - chao1: bias-corrected S_obs + F1 (F1 - 1) / (2 (F2 + 1)), F1/F2 = taxa seen once/twice. It is
+      only meaningful on integer counts; on relative abundances it equals the observed richness.
+    - observed: number of taxa with a nonzero abundance.
+
+    Parameters:
+    - counts (pd.DataFrame or array): Samples x taxa abundances (dense, float32 or sparse frame).
+    - metrics (Iterable): Any of ALPHA_METRICS.
+    - columns (Iterable): Taxa columns of a DataFrame to use (default: all columns).
+    - base (float): Logarithm base of the Shannon index (None for natural log, as skbio).
+
+    Returns:
+    - pd.DataFrame: One row per sample, one column per metric. Samples without any abundance get
+      NaN for shannon/simpson and 0 for the richness metrics.
+    """
+    unknown = [metric for metric in metrics if metric not in ALPHA_METRICS]
+    if unknown:
+        raise ValueError(f"Unsupported alpha metric(s): {unknown}. Please specify any of {ALPHA_METRICS}.")
+    matrix = _abundance_rows(counts, columns)
+    n_samples = matrix.shape[0]
+    row_of_entry = np.repeat(np.arange(n_samples), np.diff(matrix.indptr))
+
+    def row_sums(values):
+        return np.bincount(row_of_entry, weights=values, minlength=n_samples)
+
+    totals = row_sums(matrix.data)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = matrix.data / totals[row_of_entry]
+    observed = np.diff(matrix.indptr).astype(np.float64)
+
+    table = {}
+    for metric in metrics:
+        if metric == 'shannon':
+            shannon = -row_sums(p * np.log(p))
+            table[metric] = shannon / np.log(base) if base is not None else shannon
+        elif metric == 'simpson':
+            table[metric] = 1.0 - row_sums(p * p)
+        elif metric == 'chao1':
+            singles = row_sums((matrix.data == 1).astype(np.float64))
+            doubles = row_sums((matrix.data == 2).astype(np.float64))
+            table[metric] = observed + singles * (singles - 1) / (2 * (doubles + 1))
+        else:
+            table[metric] = observed
+
+    result = pd.DataFrame(table, columns=list(metrics))
+    empty = totals == 0
+    result.loc[empty, [metric for metric in metrics if metric in ('shannon', 'simpson')]] = np.nan
+    if isinstance(counts, pd.DataFrame):
+        result.index = counts.index
+    return result
+
+
+def beta_diversity(counts, metric='braycurtis', columns=None, block_size=256, output_path=None):
+    """
+    Pairwise Bray-Curtis or Jaccard distances between all samples, computed in row blocks.
+
+    At most a block_size x n_samples slice is computed at once, so the working memory of the distance
+    computation stays bounded; with output_path the full n x n matrix is written to a .npy memmap
+    instead of being held in memory. Bray-Curtis is sum|u - v| / sum(u + v) on the abundances,
+    Jaccard the share of taxa present in only one of the two samples (presence/absence), both as in
+    skbio.diversity.beta_diversity.
+
+    Parameters:
+    - counts (pd.DataFrame or array): Samples x taxa abundances.
+    - metric (str): 'braycurtis' or 'jaccard'.
+    - columns (Iterable): Taxa columns of a DataFrame to use (default: all columns).
+    - block_size (int): Rows of the distance matrix computed per block.
+    - output_path (str): Optional .npy file for the result (opened with np.load(mmap_mode='r')).
+
+    Returns:
+    - pd.DataFrame or np.memmap: Symmetric distance matrix (a DataFrame labelled by sample when no
+      output_path is given).
+    """
+    if metric not in BETA_METRICS:
+        raise ValueError(f"Unsupported beta metric: {metric}. Please specify one of {BETA_METRICS}.")
+    matrix = _abundance_rows(counts, columns)
+    n_samples = matrix.shape[0]
+    if output_path is not None:
+        distances = np.lib.format.open_memmap(output_path, mode='w+', dtype=np.float64, shape=(n_samples, n_samples))
+    else:
+        distances = np.empty((n_samples, n_samples))
+
+    # Each block is computed against itself and the rows after it only, then mirrored (half the pairs)
+    if metric == 'jaccard':
+        # Shared taxa from one sparse product per block, union = |A| + |B| - |A and B|
+        presence = matrix.copy()
+        presence.data = np.ones_like(presence.data)
+        presence_t = presence.T.tocsc()
+        richness = np.diff(presence.indptr).astype(np.float64)
+    else:
+        dense = matrix.toarray()
+    for start in range(0, n_samples, block_size):
+        stop = min(start + block_size, n_samples)
+        if metric == 'jaccard':
+            shared = (presence[start:stop] @ presence_t[:, start:]).toarray()
+            union = richness[start:stop, None] + richness[None, start:] - shared
+            with np.errstate(divide='ignore', invalid='ignore'):
+                block = np.where(union > 0, 1.0 - shared / np.where(union > 0, union, 1.0), 0.0)
+        else:
+            block = cdist(dense[start:stop], dense[start:], metric='braycurtis')
+        distances[start:stop, start:] = block
+        distances[start:, start:stop] = block.T
+    np.fill_diagonal(distances, 0.0)
+
+    if output_path is not None:
+        distances.flush()
+        return distances
+    labels = counts.index if isinstance(counts, pd.DataFrame) else pd.RangeIndex(n_samples)
+    return pd.DataFrame(distances, index=labels, columns=labels)
+
+
+def compare_alpha_diversity(data, metrics=ALPHA_METRICS, target_column='group_2', base=None, n_jobs=1):
+    """
+    Alpha diversity per sample and the cancer vs control comparison of every metric.
+
+    The metrics are tested with compute_statistics, i.e. the same group means, fold changes and
+    batched Mann-Whitney U p-values as the per-feature analysis. Samples without any abundance have no
+    Shannon/Simpson value (NaN), which would make those p-values NaN for the whole cohort; they are
+    reported and left out of the group test.
+
+    Parameters:
+    - data (pd.DataFrame): Preprocessed layout, target column followed by the taxa/feature columns.
+    - metrics, base: See alpha_diversity.
+    - n_jobs (int): Worker processes for the rank tests.
+
+    Returns:
+    - pd.DataFrame: Target column followed by the metrics, one row per sample (empty samples included).
+    - pd.DataFrame: One row per metric with Control_mean, Cancer_mean, FC_value, Wilcoxon_p and log2FC_value.
+    """
+    features = data.columns.drop(target_column)
+    metrics = list(metrics)
+    # Observed richness comes with every metric at no extra cost and identifies the empty samples
+    alpha = alpha_diversity(data, metrics=list(dict.fromkeys(metrics + ['observed'])), columns=features, base=base)
+    empty = (alpha['observed'] == 0).to_numpy()
+    alpha = alpha[metrics]
+    alpha.insert(0, target_column, data[target_column].to_numpy())
+    if empty.any():
+        print(f"{int(empty.sum())} samples without any abundance left out of the alpha diversity comparison.")
+    data_control, data_cancer = split_groups(alpha[~empty], target_column)
+    results = compute_statistics(data_control, data_cancer, metrics, n_jobs=n_jobs)
+    return alpha, results
+
+
+def diversity_from_intermediate(path, metrics=ALPHA_METRICS, features=None, backend='dense', base=None,
+                                n_jobs=1):
+    """
+    compare_alpha_diversity on the intermediate written by the data-preprocessing stage.
+
+    Parameters:
+    - path (str): .parquet, .feather or .pkl intermediate (see load_preprocessed_data).
+    - features (Iterable): Subset of feature columns to read (default: all of them).
+    - backend (str): 'dense', 'float32' or 'sparse'; the sparse backend is read without densifying.
+
+    Returns:
+    - See compare_alpha_diversity.
+    """
+    data, metadata = load_preprocessed_data(path, features=features, backend=backend)
+    target_column = metadata.get('target_column', data.columns[0])
+    return compare_alpha_diversity(data, metrics=metrics, target_column=target_column, base=base, n_jobs=n_jobs)
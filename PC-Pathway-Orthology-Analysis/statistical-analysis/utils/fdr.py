@@ -0,0 +1,53 @@
+import numpy as np
+
+FDR_METHODS = ('fdr_bh', 'fdr_by', 'qvalue')
+
+
+def adjust_p_values(p_values, method='fdr_bh', valid=None, storey_lambda=0.5):
+    """
+    Multiple-testing adjustment of a whole p-value vector in one call.
+
+    Entries that are NaN/inf or masked out by `valid` are excluded from the family and come back as
+    NaN, so the output stays aligned position by position with the input.
+
+    Parameters:
+    - p_values (array-like): Raw p-values, one per feature.
+    - method (str): 'fdr_bh' (Benjamini-Hochberg), 'fdr_by' (Benjamini-Yekutieli) or
+      'qvalue' (Storey q-values with a fixed lambda).
+    - valid (array-like of bool): Optional mask of entries that take part in the correction.
+    - storey_lambda (float): Tuning parameter for the Storey pi0 estimate (bounded to [1/m, 1]).
+
+    Returns:
+    - np.ndarray: Adjusted p-values, NaN where the input was excluded.
+    """
+    p_values = np.asarray(p_values, dtype=np.float64)
+    mask = np.isfinite(p_values)
+    if valid is not None:
+        mask &= np.asarray(valid, dtype=bool)
+
+    adjusted = np.full(p_values.shape, np.nan)
+    p = p_values[mask]
+    m = p.size
+    if m == 0:
+        return adjusted
+
+    # Step-up adjustment on the sorted p-values (same arithmetic as statsmodels.multipletests)
+    order = np.argsort(p, kind='mergesort')
+    ecdffactor = np.arange(1, m + 1) / float(m)
+    if method == 'fdr_by':
+        ecdffactor = ecdffactor / np.sum(1.0 / np.arange(1, m + 1))
+    elif method not in ('fdr_bh', 'qvalue'):
+        raise ValueError(f"Unsupported FDR method: {method}. Please specify one of {FDR_METHODS}.")
+    corrected = np.minimum.accumulate((p[order] / ecdffactor)[::-1])[::-1]
+
+    if method == 'qvalue':
+        # Storey (2002): scale BH by the estimated proportion of true null hypotheses
+        # Bounded below by 1/m: with no p-value above lambda the estimate is 0 and every q-value would be 0
+        pi0 = min(1.0, max(np.mean(p > storey_lambda) / (1.0 - storey_lambda), 1.0 / m))
+        corrected = corrected * pi0
+
+    corrected[corrected > 1] = 1
+    out = np.empty(m)
+    out[order] = corrected
+    adjusted[mask] = out
+    return adjusted
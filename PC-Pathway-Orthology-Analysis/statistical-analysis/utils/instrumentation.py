@@ -0,0 +1,119 @@
+import contextlib
+import json
+import os
+import resource
+import time
+
+# Standard library only: the Lambda handler imports this module before pandas/scipy are loaded
+
+# 'event' field of the JSON log line, to filter the metrics out of the CloudWatch logs
+METRICS_EVENT = 'pc_analysis_metrics'
+PROFILERS = ('cprofile', 'pyinstrument')
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Instrumentation:
+    """
+    Per-stage wall time, peak memory and counters of one invocation, emitted as one JSON log line.
+
+    Stages are timed with `with instrumentation.stage('load'):`; counters such as the number of
+    features are attached with record(). Peak memory is the process peak RSS at the end of each
+    stage, so the stage whose peak exceeds the previous one is the one that grew the process.
+    """
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.origin = time.perf_counter()
+        self.stages = []
+        self.fields = dict(fields)
+
+    @contextlib.contextmanager
+    def stage(self, stage, **fields):
+        start = time.perf_counter()
+        peak_before = peak_rss_mb()
+        try:
+            yield self
+        finally:
+            peak = peak_rss_mb()
+            self.stages.append({
+                'stage': stage,
+                'seconds': round(time.perf_counter() - start, 4),
+                'peak_rss_mb': round(peak, 1),
+                'peak_rss_growth_mb': round(peak - peak_before, 1),
+                **fields,
+            })
+
+    def record(self, **fields):
+        self.fields.update(fields)
+
+    def report(self):
+        return {
+            'event': METRICS_EVENT,
+            'name': self.name,
+            'total_seconds': round(time.perf_counter() - self.origin, 4),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'stages': self.stages,
+            **self.fields,
+        }
+
+    def emit(self):
+        # One line of JSON per invocation instead of free-form prints
+        report = self.report()
+        print(json.dumps(report, default=str))
+        return report
+
+
+@contextlib.contextmanager
+def profiled(profiler=None, output_dir='/tmp', name='invocation', top=20):
+    """
+    Profile the enclosed block with cProfile or pyinstrument; a no-op when profiler is None.
+
+    cProfile writes <name>.prof (open with pstats or snakeviz) and logs the top functions by
+    cumulative time; pyinstrument, when installed, writes <name>.html. The yielded dict receives
+    the 'profile_path' when the block ends.
+    """
+    output = {'profile_path': None}
+    if profiler is None:
+        yield output
+        return
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unsupported profiler: {profiler}. Please specify one of {PROFILERS}.")
+    os.makedirs(output_dir, exist_ok=True)
+
+    if profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument is not installed; running without profiling.")
+            yield output
+            return
+        session = Profiler()
+        session.start()
+        try:
+            yield output
+        finally:
+            session.stop()
+            output['profile_path'] = os.path.join(output_dir, f'{name}.html')
+            with open(output['profile_path'], 'w') as f:
+                f.write(session.output_html())
+            print(f"Profile written to {output['profile_path']}")
+        return
+
+    import cProfile
+    import io
+    import pstats
+    session = cProfile.Profile()
+    session.enable()
+    try:
+        yield output
+    finally:
+        session.disable()
+        output['profile_path'] = os.path.join(output_dir, f'{name}.prof')
+        session.dump_stats(output['profile_path'])
+        summary = io.StringIO()
+        pstats.Stats(session, stream=summary).sort_stats('cumulative').print_stats(top)
+        print(f"Profile written to {output['profile_path']}\n{summary.getvalue()}")
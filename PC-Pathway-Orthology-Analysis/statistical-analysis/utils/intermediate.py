@@ -0,0 +1,106 @@
+import json
+import os
+import pickle
+
+import numpy as np
+
+from utils.sparse_features import FEATURE_BACKENDS, csc_from_columns, sparse_frame, to_sparse_frame
+
+# Must match data-preprocessing/data_preprocessing.INTERMEDIATE_METADATA_KEY
+INTERMEDIATE_METADATA_KEY = b'pc_analysis'
+
+
+def load_preprocessed_data(path, target_column='group_2', features=None, memory_map=True, backend='dense'):
+    """
+    Load the preprocessed intermediate written by the data-preprocessing stage.
+
+    Parquet and Feather files are read column-wise: only the target column and the requested
+    feature columns are decoded. Legacy pickle files are still supported and are de-duplicated
+    the same way main.py always did.
+
+    Parameters:
+    - path (str): Local path of the .parquet, .feather/.arrow or .pkl intermediate.
+    - target_column (str): Name of the target column, returned as the first column.
+    - features (Iterable): Subset of feature columns to load (default: all of them).
+    - memory_map (bool): Memory-map the file instead of reading it into a buffer first.
+    - backend (str): Representation of the feature columns: 'dense' (float64 as stored), 'float32'
+      (cast in Arrow before conversion, no float64 frame is built) or 'sparse' (SparseDtype columns
+      built one column at a time, so memory follows the number of nonzero values).
+
+    Returns:
+    - pd.DataFrame: Target column followed by the feature columns.
+    - dict: Metadata stored by the preprocessing stage (target_column, missing_columns,
+      duplicate_columns, n_samples, n_features); empty for pickle files.
+    """
+    if backend not in FEATURE_BACKENDS:
+        raise ValueError(f"Unsupported backend: {backend}. Please specify one of {FEATURE_BACKENDS}.")
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.pkl', '.pickle'):
+        data, metadata = _load_pickle(path, target_column, features)
+        if backend == 'sparse':
+            data = to_sparse_frame(data, target_column)
+        elif backend == 'float32':
+            data = data.astype({column: np.float32 for column in data.columns if column != target_column})
+        return data, metadata
+
+    if extension == '.parquet':
+        import pyarrow.parquet as pq
+        schema = pq.read_schema(path, memory_map=memory_map)
+        columns = _select_columns(schema.names, target_column, features)
+        table = pq.read_table(path, columns=columns, memory_map=memory_map)
+    elif extension in ('.feather', '.arrow'):
+        import pyarrow.feather as feather
+        table = feather.read_table(path, memory_map=memory_map)
+        table = table.select(_select_columns(table.schema.names, target_column, features))
+        schema = table.schema
+    else:
+        raise ValueError(f"Unsupported intermediate format: {extension}. Expected .parquet, .feather or .pkl.")
+
+    metadata = {}
+    if schema.metadata and INTERMEDIATE_METADATA_KEY in schema.metadata:
+        metadata = json.loads(schema.metadata[INTERMEDIATE_METADATA_KEY].decode('utf-8'))
+    if metadata.get('density') is not None:
+        print(f"Intermediate density: {metadata['density']:.3f} nonzero ({backend} backend)")
+    return _table_to_frame(table, target_column, backend), metadata
+
+
+def _table_to_frame(table, target_column, backend):
+    if backend == 'dense':
+        return table.to_pandas()
+
+    import pyarrow as pa
+    feature_names = [name for name in table.schema.names if name != target_column]
+    if backend == 'float32':
+        schema = pa.schema([field if field.name == target_column else field.with_type(pa.float32())
+                            for field in table.schema])
+        return table.cast(schema).to_pandas()
+
+    # Sparse: one dense column at a time into the CSC entries, then SparseDtype columns over them
+    matrix = csc_from_columns((table.column(name).to_numpy() for name in feature_names), table.num_rows)
+    data = sparse_frame(matrix, None, feature_names)
+    data.insert(0, target_column, table.column(target_column).to_numpy())
+    return data
+
+
+def _select_columns(names, target_column, features):
+    available = set(names)
+    if target_column not in available:
+        raise KeyError(f"Target column '{target_column}' not found in the intermediate file.")
+    if features is None:
+        return [target_column] + [name for name in names if name != target_column]
+    # Requested order, each feature once
+    features = [feature for feature in dict.fromkeys(features) if feature != target_column]
+    missing = [feature for feature in features if feature not in available]
+    if missing:
+        raise KeyError(f"{len(missing)} requested features not found in the intermediate file, e.g. {missing[:5]}")
+    return [target_column] + features
+
+
+def _load_pickle(path, target_column, features):
+    with open(path, 'rb') as f:
+        data = pickle.load(f)  # Load the preprocessed data (pandas DataFrame)
+    duplicate_columns = data.columns[data.columns.duplicated()].tolist()
+    data = data.loc[:, ~data.columns.duplicated()]
+    if features is not None:
+        data = data[_select_columns(list(data.columns), target_column, features)]
+    return data.copy(), {'duplicate_columns': duplicate_columns}
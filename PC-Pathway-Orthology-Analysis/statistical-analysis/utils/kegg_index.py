@@ -0,0 +1,292 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Bump when the stored layout changes so indexes written by older code are rebuilt
+INDEX_VERSION = 1
+ROLLUPS = ('sum', 'mean', 'count', 'min', 'max')
+
+
+def source_fingerprint(paths, **options):
+    # Path, size and modification time of every source plus the read options: any edit invalidates the index
+    entries = []
+    for path in paths:
+        stat = os.stat(path)
+        entries.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    payload = json.dumps([INDEX_VERSION, entries, options], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _clean_ids(values):
+    # Remove all kinds of whitespace like the notebooks do for 'Orthology_kegg_no'; \xa0 is listed explicitly
+    # because Arrow-backed strings use RE2, whose \s only matches ASCII whitespace
+    return values.astype(str).str.replace(r'[\s\xa0]+', '', regex=True)
+
+
+def read_mapping(mapping_file, sheet_name=0):
+    """
+    Pathway -> orthology edges of pathway_Orthology_map.xlsx (or a CSV with the same columns).
+
+    Returns:
+    - pd.DataFrame: Unique 'Pathway_ID', 'Orthology_kegg_no' pairs with whitespace removed.
+    """
+    if mapping_file.endswith(('.xlsx', '.xls')):
+        mapping_df = pd.read_excel(mapping_file, sheet_name=sheet_name)
+    else:
+        mapping_df = pd.read_csv(mapping_file)
+    mapping_df = mapping_df[['Pathway_ID', 'Orthology_kegg_no']].dropna()
+    mapping_df = mapping_df.assign(Pathway_ID=_clean_ids(mapping_df['Pathway_ID']),
+                                   Orthology_kegg_no=_clean_ids(mapping_df['Orthology_kegg_no']))
+    mapping_df = mapping_df[(mapping_df['Pathway_ID'] != '') & (mapping_df['Orthology_kegg_no'] != '')]
+    return mapping_df.drop_duplicates().reset_index(drop=True)
+
+
+def read_labels(label_files):
+    """
+    KEGG_no -> name from one or more label lists, the first file taking precedence.
+
+    Accepts the CSV exports (KEGG_no with pathway_kegg_no / orthology_names) and the Excel list of
+    the orthology notebook (Ortholog, Definition); later files only fill the IDs the earlier ones lack,
+    like the outer merge of orthology_merge.ipynb.
+
+    Returns:
+    - pd.Series: Names indexed by unique KEGG_no.
+    """
+    renames = {'Ortholog': 'KEGG_no', 'Definition': 'name', 'pathway_kegg_no': 'name', 'orthology_names': 'name',
+               'Pathway_Name': 'name', 'Orthology_Name': 'name'}
+    labels = pd.Series(dtype=object)
+    for label_file in label_files:
+        label_data = pd.read_excel(label_file) if label_file.endswith(('.xlsx', '.xls')) else pd.read_csv(label_file)
+        label_data = label_data.rename(columns=renames)[['KEGG_no', 'name']].dropna(subset=['KEGG_no'])
+        label_data = label_data.assign(KEGG_no=_clean_ids(label_data['KEGG_no']))
+        label_data = label_data.drop_duplicates(subset='KEGG_no').set_index('KEGG_no')['name']
+        labels = label_data if labels.empty else labels.combine_first(label_data)
+    return labels
+
+
+class KeggIndex:
+    """
+    Integer-coded KEGG pathway <-> orthology mapping with CSR adjacency in both directions.
+
+    Pathways and orthologies are coded 0..n-1 in sorted ID order. Row p of `orthologs_by_pathway`
+    holds the codes of the orthologies of pathway p, row o of `pathways_by_orthology` the pathways
+    of orthology o. Labels are arrays aligned with the codes ('' where the label lists have none),
+    so a label lookup is one dict access plus one array access.
+    """
+
+    def __init__(self, pathway_ids, orthology_ids, indptr, indices, pathway_labels=None, orthology_labels=None,
+                 fingerprint=None):
+        self.pathway_ids = np.asarray(pathway_ids, dtype=str)
+        self.orthology_ids = np.asarray(orthology_ids, dtype=str)
+        n_pathways, n_orthologies = len(self.pathway_ids), len(self.orthology_ids)
+        self.orthologs_by_pathway = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.int8), np.asarray(indices, dtype=np.int32),
+             np.asarray(indptr, dtype=np.int64)), shape=(n_pathways, n_orthologies))
+        self.pathways_by_orthology = self.orthologs_by_pathway.T.tocsr()
+        self.pathway_labels = np.asarray(pathway_labels if pathway_labels is not None else [''] * n_pathways,
+                                         dtype=str)
+        self.orthology_labels = np.asarray(orthology_labels if orthology_labels is not None else [''] * n_orthologies,
+                                           dtype=str)
+        self.fingerprint = fingerprint
+        self._pathway_codes = pd.Index(self.pathway_ids)
+        self._orthology_codes = pd.Index(self.orthology_ids)
+        self._pathway_lookup = dict(zip(self.pathway_ids.tolist(), range(n_pathways)))
+        self._orthology_lookup = dict(zip(self.orthology_ids.tolist(), range(n_orthologies)))
+
+    @classmethod
+    def from_mapping(cls, mapping_df, pathway_labels=None, orthology_labels=None, fingerprint=None):
+        """
+        Build the index from the edges of read_mapping and optional label Series (KEGG_no -> name).
+
+        Orthologies that only appear in the label list are coded too (without pathways), so every
+        labelled ID can be looked up.
+        """
+        pathway_labels = pd.Series(dtype=object) if pathway_labels is None else pathway_labels
+        orthology_labels = pd.Series(dtype=object) if orthology_labels is None else orthology_labels
+        pathway_ids = np.union1d(mapping_df['Pathway_ID'].unique().astype(str), pathway_labels.index.astype(str))
+        orthology_ids = np.union1d(mapping_df['Orthology_kegg_no'].unique().astype(str),
+                                   orthology_labels.index.astype(str))
+
+        rows = np.searchsorted(pathway_ids, mapping_df['Pathway_ID'].to_numpy(dtype=str))
+        columns = np.searchsorted(orthology_ids, mapping_df['Orthology_kegg_no'].to_numpy(dtype=str))
+        adjacency = sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, columns)),
+                                      shape=(len(pathway_ids), len(orthology_ids)))
+        adjacency.sum_duplicates()
+        adjacency.sort_indices()
+
+        def aligned(labels, ids):
+            return labels.reindex(ids).fillna('').astype(str).to_numpy()
+        return cls(pathway_ids, orthology_ids, adjacency.indptr, adjacency.indices,
+                   aligned(pathway_labels, pathway_ids), aligned(orthology_labels, orthology_ids), fingerprint)
+
+    def save(self, path):
+        # Plain arrays in one uncompressed .npz; written to a temporary file first so readers never see half of it
+        tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path, pathway_ids=self.pathway_ids, orthology_ids=self.orthology_ids,
+                 indptr=self.orthologs_by_pathway.indptr, indices=self.orthologs_by_pathway.indices,
+                 pathway_labels=self.pathway_labels, orthology_labels=self.orthology_labels,
+                 fingerprint=np.asarray(self.fingerprint or ''))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as stored:
+            return cls(stored['pathway_ids'], stored['orthology_ids'], stored['indptr'], stored['indices'],
+                       stored['pathway_labels'], stored['orthology_labels'], str(stored['fingerprint']) or None)
+
+    @property
+    def n_edges(self):
+        return int(self.orthologs_by_pathway.nnz)
+
+    def pathway_label(self, pathway_id):
+        code = self._pathway_lookup.get(pathway_id)
+        return None if code is None else self.pathway_labels[code]
+
+    def orthology_label(self, orthology_id):
+        code = self._orthology_lookup.get(orthology_id)
+        return None if code is None else self.orthology_labels[code]
+
+    def pathway_codes(self, pathway_ids):
+        # Vectorized ID -> code, -1 for unknown IDs
+        return self._pathway_codes.get_indexer(pd.Index(pathway_ids).astype(str))
+
+    def orthology_codes(self, orthology_ids):
+        return self._orthology_codes.get_indexer(pd.Index(orthology_ids).astype(str))
+
+    def orthologs(self, pathway_id):
+        code = self._pathway_lookup.get(pathway_id)
+        if code is None:
+            return np.empty(0, dtype=self.orthology_ids.dtype)
+        adjacency = self.orthologs_by_pathway
+        return self.orthology_ids[adjacency.indices[adjacency.indptr[code]:adjacency.indptr[code + 1]]]
+
+    def pathways(self, orthology_id):
+        code = self._orthology_lookup.get(orthology_id)
+        if code is None:
+            return np.empty(0, dtype=self.pathway_ids.dtype)
+        adjacency = self.pathways_by_orthology
+        return self.pathway_ids[adjacency.indices[adjacency.indptr[code]:adjacency.indptr[code + 1]]]
+
+    def rollup(self, values, how='sum'):
+        """
+        Aggregate orthology values per pathway over the CSR adjacency.
+
+        Parameters:
+        - values (pd.Series or pd.DataFrame): A Series indexed by orthology KEGG_no (e.g. p-values or
+          fold changes), or a samples x orthologies DataFrame (e.g. abundances).
+        - how (str): One of ROLLUPS. Orthologies absent from `values` or NaN are skipped; pathways
+          without any value get NaN (0 for 'count').
+
+        Returns:
+        - pd.Series or pd.DataFrame: Indexed (Series) or with columns (DataFrame) by Pathway_ID.
+        """
+        if how not in ROLLUPS:
+            raise ValueError(f"Unsupported rollup: {how}. Please specify one of {ROLLUPS}.")
+        is_series = isinstance(values, pd.Series)
+        frame = values.to_frame().T if is_series else values
+        matrix = frame.to_numpy(dtype=np.float64)
+
+        # Only the orthologies of the index take part, in code order
+        codes = self.orthology_codes(frame.columns)
+        known = codes >= 0
+        adjacency = self.orthologs_by_pathway[:, codes[known]].tocsr()
+        matrix = matrix[:, known]
+        valid = ~np.isnan(matrix)
+
+        if how in ('sum', 'mean', 'count'):
+            # Sums over the edges are one sparse product: values (samples x orthologies) @ adjacency.T
+            edges = adjacency.astype(np.float64)
+            if valid.all():
+                count = np.tile(np.diff(adjacency.indptr).astype(np.float64), (matrix.shape[0], 1))
+            else:
+                count = np.asarray(edges @ valid.T.astype(np.float64)).T
+            if how == 'count':
+                result = count
+            else:
+                result = np.asarray(edges @ np.where(valid, matrix, 0.0).T).T
+                if how == 'mean':
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        result = result / count
+                result[count == 0] = np.nan
+        else:
+            # Values gathered along the CSR edges and reduced per pathway segment; fmin/fmax skip NaN
+            gathered = matrix[:, adjacency.indices]
+            empty = np.diff(adjacency.indptr) == 0
+            result = np.full((matrix.shape[0], adjacency.shape[0]), np.nan)
+            if gathered.shape[1]:
+                # Only non-empty segments are reduced: their starts are strictly increasing and in range, so
+                # each reduceat segment ends where the next non-empty pathway starts; empty ones stay NaN
+                starts = adjacency.indptr[:-1][~empty]
+                result[:, ~empty] = (np.fmin if how == 'min' else np.fmax).reduceat(gathered, starts, axis=1)
+
+        result = pd.DataFrame(result, index=frame.index, columns=pd.Index(self.pathway_ids, name='Pathway_ID'))
+        return result.iloc[0].rename(values.name) if is_series else result
+
+    def expand(self, results):
+        """
+        One row per (pathway, orthology) edge for orthology results indexed by KEGG_no.
+
+        Same rows as the merge of orthology_merge.ipynb (left merge on the mapping, rows without a
+        Pathway_ID dropped), built from the CSR adjacency instead of a string join.
+
+        Returns:
+        - pd.DataFrame: 'Pathway_ID', 'Orthology_kegg_no' and the result columns.
+        """
+        codes = self.orthology_codes(results.index)
+        positions = np.flatnonzero(codes >= 0)
+        adjacency = self.pathways_by_orthology
+        counts = np.diff(adjacency.indptr)[codes[positions]]
+        rows = np.repeat(positions, counts)
+        starts = np.repeat(adjacency.indptr[codes[positions]], counts)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        pathway_codes = adjacency.indices[starts + offsets]
+
+        expanded = results.iloc[rows].reset_index(drop=True)
+        expanded.insert(0, 'Orthology_kegg_no', self.orthology_ids[codes[rows]])
+        expanded.insert(0, 'Pathway_ID', self.pathway_ids[pathway_codes])
+        return expanded
+
+
+def load_kegg_index(mapping_file, pathway_label_files=(), orthology_label_files=(), index_path=None, sheet_name=0):
+    """
+    Open the prebuilt mapping index, rebuilding it when any source file changed.
+
+    The index is stored next to the mapping file (<mapping>_index.npz by default) together with a
+    fingerprint of the mapping and label files; a mismatch, a missing file or an older layout
+    triggers a rebuild from the Excel/CSV sources.
+
+    Parameters:
+    - mapping_file (str): pathway_Orthology_map.xlsx (or a CSV with 'Pathway_ID', 'Orthology_kegg_no').
+    - pathway_label_files (Iterable): e.g. ['pathway_label_list.csv'].
+    - orthology_label_files (Iterable): e.g. ['orthology_label_list.csv', 'orthology_label_list.xlsx'].
+    - index_path (str): Where to store the index.
+    - sheet_name (str or int): Sheet of the mapping workbook ('Sheet2' in the correlation notebooks).
+
+    Returns:
+    - KeggIndex: The loaded or rebuilt index.
+    """
+    pathway_label_files, orthology_label_files = list(pathway_label_files), list(orthology_label_files)
+    index_path = index_path or f"{os.path.splitext(mapping_file)[0]}_index.npz"
+    fingerprint = source_fingerprint([mapping_file] + pathway_label_files + orthology_label_files,
+                                     sheet_name=sheet_name, pathway_labels=len(pathway_label_files))
+    if os.path.exists(index_path):
+        try:
+            index = KeggIndex.load(index_path)
+            if index.fingerprint == fingerprint:
+                return index
+            print(f"KEGG index: sources changed, rebuilding {index_path}")
+        except (OSError, KeyError, ValueError) as e:
+            print(f"KEGG index: could not read {index_path} ({e}), rebuilding")
+
+    index = KeggIndex.from_mapping(read_mapping(mapping_file, sheet_name=sheet_name),
+                                   pathway_labels=read_labels(pathway_label_files),
+                                   orthology_labels=read_labels(orthology_label_files), fingerprint=fingerprint)
+    index.save(index_path)
+    print(f"KEGG index: {len(index.pathway_ids)} pathways, {len(index.orthology_ids)} orthologies, "
+          f"{index.n_edges} edges written to {index_path}")
+    return index
@@ -1,31 +1,163 @@
 import pandas as pd
-import statsmodels.api as sm
 import warnings
 import numpy as np
-from statsmodels.tools.sm_exceptions import PerfectSeparationError
-from statsmodels.stats.multitest import multipletests  # For FDR correction
-def clean_p_values(p_values):
-    # Convert the list to a NumPy array for easier manipulation
-    p_values = np.array(p_values)
-    
-    # Remove NaN values
-    valid_p_values = p_values[~np.isnan(p_values)]
-    
-    # Remove infinite values or extremely small p-values
-    valid_p_values = valid_p_values[np.isfinite(valid_p_values)]
-    
-    # If the valid p-values list is empty, return early to avoid errors
-    if len(valid_p_values) == 0:
-        print("No valid p-values to apply FDR correction.")
-        return None
-    
-    return valid_p_values
+from utils.batched_logit import batched_univariate_logit, detect_quasi_separation
+from utils.compute_statistics import to_numeric_matrix
+from utils.fdr import adjust_p_values
+from utils.parallel import resolve_n_jobs, run_column_chunks
+from utils.sparse_features import feature_csc, feature_dtype, is_sparse_frame
+
+
+def logistic_regression_univariate_w_BH(data, pathways, results, alpha=0.05, method='batched',
+                                        n_jobs=1, chunk_size=None, executor=None, fdr_method='fdr_bh',
+                                        exclude_quasi_separation=False):
+    """
+    Univariate logistic regression of 'group_2' on every feature followed by Benjamini-Hochberg correction.
+
+    Parameters:
+    - data (pd.DataFrame): Preprocessed data with 'group_2' as the first column.
+    - pathways (Iterable): Feature columns to fit one model each.
+    - results (pd.DataFrame): Results frame from compute_statistics, extended in place.
+    - alpha (float): Family-wise alpha of the FDR correction.
+    - method (str): 'batched' fits all features with stacked Newton steps, 'statsmodels' fits one Logit per feature.
+    - n_jobs (int): Worker processes for the 'batched' fits (-1 for all cores).
+    - chunk_size (int): Features per worker task; None splits the features evenly.
+    - executor (concurrent.futures.Executor): Existing process pool to reuse when n_jobs != 1.
+    - fdr_method (str): 'fdr_bh' (default), 'fdr_by' or 'qvalue' (Storey).
+    - exclude_quasi_separation (bool): Treat quasi-separated features (groups overlapping only at the
+      boundary value, e.g. nonzero in cancer samples only) as problematic, i.e. NaN and out of the FDR
+      family. By default they keep the p-value statsmodels reports for them (close to 1).
+
+    Returns:
+    - pd.DataFrame: results with 'LogReg_p_univ', 'LogReg_p_fdr' and 'Wilcoxon_p_fdr'.
+    - list: Features that were constant, separated or could not be fitted.
+    """
+    problematic_pathways, _, _ = fit_logistic_regression_univariate(
+        data, pathways, results, method=method, n_jobs=n_jobs, chunk_size=chunk_size, executor=executor,
+        exclude_quasi_separation=exclude_quasi_separation)
+    results = apply_fdr_correction(results, problematic_pathways, alpha=alpha, fdr_method=fdr_method)
+    return results, problematic_pathways
+
+
+def fit_logistic_regression_univariate(data, pathways, results, method='batched', n_jobs=1, chunk_size=None,
+                                       executor=None, exclude_quasi_separation=False):
+    # Fit stage only: fills results['LogReg_p_univ'] and returns (problematic, p_values, pathways_valid)
+    if method == 'batched':
+        fitted = _fit_batched(data, pathways, results, n_jobs, chunk_size, executor)
+    elif method == 'statsmodels':
+        fitted = _fit_statsmodels(data, pathways, results)
+    else:
+        raise ValueError(f"Unsupported method: {method}. Please specify 'batched' or 'statsmodels'.")
+    if exclude_quasi_separation:
+        fitted = _exclude_quasi_separated(data, pathways, results, *fitted)
+    return fitted
+
+
+def _exclude_quasi_separated(data, pathways, results, problematic, p_values, pathways_valid):
+    # Applied after either fit, so the statsmodels reference itself stays a plain Logit fit
+    pathways = pd.Index(pathways)
+    X = feature_csc(data, pathways).toarray() if is_sparse_frame(data) else to_numeric_matrix(data, pathways)
+    with np.errstate(invalid='ignore'):
+        constant = ~(np.nanmax(X, axis=0) > np.nanmin(X, axis=0)) if len(X) else np.ones(len(pathways), dtype=bool)
+    quasi = pathways[detect_quasi_separation(X, data.iloc[:, 0].to_numpy()) & ~constant]
+    if not len(quasi):
+        return problematic, p_values, pathways_valid
+    print(f"{len(quasi)} quasi-separated pathways excluded from the logistic regression.")
+    results.loc[quasi, 'LogReg_p_univ'] = np.nan
+    excluded, already = set(quasi), set(problematic)
+    kept = [(pathway, p) for pathway, p in zip(pathways_valid, p_values) if pathway not in excluded]
+    return (list(problematic) + [pathway for pathway in quasi if pathway not in already],
+            [p for _, p in kept], [pathway for pathway, _ in kept])
+
+
+def apply_fdr_correction(results, problematic_pathways=(), alpha=0.05, fdr_method='fdr_bh'):
+    """
+    FDR-correct the logistic regression and Wilcoxon p-values of the whole results frame.
+
+    Validity is a boolean mask aligned to results.index (finite p-value, and for the logistic
+    regression not a problematic feature), so adjusted values are written back by position in one
+    assignment and can never shift onto another feature. Excluded features get NaN.
+
+    Parameters:
+    - results (pd.DataFrame): Results indexed by feature, with 'LogReg_p_univ' and 'Wilcoxon_p'.
+    - problematic_pathways (Iterable): Features whose logistic regression could not be fitted.
+    - alpha (float): Family-wise alpha, reported with the number of significant features.
+    - fdr_method (str): 'fdr_bh' (default), 'fdr_by' or 'qvalue' (Storey).
+
+    Returns:
+    - pd.DataFrame: results with 'LogReg_p_fdr' and 'Wilcoxon_p_fdr'.
+    """
+    fit_ok = ~results.index.isin(pd.Index(problematic_pathways))
+    for column, adjusted_column, valid in [('LogReg_p_univ', 'LogReg_p_fdr', fit_ok),
+                                           ('Wilcoxon_p', 'Wilcoxon_p_fdr', None)]:
+        if column not in results.columns:
+            continue
+        raw = pd.to_numeric(results[column], errors='coerce').to_numpy(dtype=np.float64)
+        adjusted = adjust_p_values(raw, method=fdr_method, valid=valid)
+        results[adjusted_column] = adjusted
+
+        n_tested = int(np.isfinite(adjusted).sum())
+        if n_tested:
+            print(f"{fdr_method} correction of {column}: {n_tested} of {len(raw)} features tested, "
+                  f"{int(np.sum(adjusted < alpha))} below alpha={alpha}")
+        else:
+            print(f"No valid {column} values collected; {adjusted_column} left empty.")
+
+    return results
+
+
+def _fit_batched(data, pathways, results, n_jobs=1, chunk_size=None, executor=None):
+    pathways = pd.Index(pathways)
+    y = data.iloc[:, 0].to_numpy(dtype=np.float64)  # Assuming first column is 'group_2'
+    if is_sparse_frame(data):
+        X = feature_csc(data, pathways)  # Densified one chunk at a time by the batched fit
+    else:
+        X = to_numeric_matrix(data, pathways, dtype=feature_dtype(data, pathways))
+
+    if resolve_n_jobs(n_jobs) == 1 and executor is None:
+        fit = batched_univariate_logit(X, y)
+    else:
+        fit, _ = run_column_chunks(batched_univariate_logit, X, n_jobs=n_jobs, chunk_size=chunk_size,
+                                   worker_args=(y,), executor=executor, label='logistic_regression')
+    problematic = fit['constant'] | fit['separation'] | fit['singular']
+    p_univ = np.where(problematic, np.nan, fit['p_value'])
+
+    # One summary line per failure kind; a per-feature line floods the logs of zero-inflated data
+    n_separated, n_singular = int(fit['separation'].sum()), int(fit['singular'].sum())
+    if n_separated or n_singular:
+        print(f"Logistic regression not available for {n_separated} separated and {n_singular} singular pathways.")
+    n_quasi = int(fit['quasi_separation'].sum())
+    if n_quasi:
+        print(f"{n_quasi} quasi-separated pathways fitted to the iteration limit (Wald p of the last "
+              f"iterate, as statsmodels).")
+    n_not_converged = int(np.sum(~fit['converged'] & ~problematic & ~fit['quasi_separation']))
+    if n_not_converged:
+        print(f"{n_not_converged} pathways did not converge within the iteration limit.")
+
+    results['LogReg_p_univ'] = pd.Series(p_univ, index=pathways)
+
+    valid = ~problematic
+    return list(pathways[problematic]), list(p_univ[valid]), list(pathways[valid])
+
+
+def _fit_statsmodels(data, pathways, results):
+    # Reference path: one statsmodels Logit fit per feature; statsmodels is only imported here (~2s at cold start)
+    import statsmodels.api as sm
+    from statsmodels.tools.sm_exceptions import PerfectSeparationError
+    try:
+        # statsmodels >= 0.14 only warns on perfect separation; raise it like the pinned 0.13 does
+        from statsmodels.tools.sm_exceptions import PerfectSeparationWarning
+        separation_errors = (PerfectSeparationError, PerfectSeparationWarning)
+    except ImportError:
+        PerfectSeparationWarning = None
+        separation_errors = (PerfectSeparationError,)
 
-def logistic_regression_univariate_w_BH(data, pathways, results,alpha = 0.05):
     problematic_pathways = []
     p_values = [] # List to store all p-values
     pathways_valid = []  # List to store pathways with valid p-values
     
+    n_failed = 0  # Fits raising LinAlgError/ValueError/PerfectSeparationError, logged once at the end
+
     # Logistic regression univariate
     y = data.iloc[:, 0]  # Assuming first column is 'group_2'
     
@@ -46,39 +178,23 @@ def logistic_regression_univariate_w_BH(data, pathways, results,alpha = 0.05):
                 warnings.simplefilter('ignore', PerfectSeparationError)
                 warnings.simplefilter('ignore', np.linalg.LinAlgError)
                 warnings.simplefilter('ignore', ValueError)
+                if PerfectSeparationWarning is not None:
+                    warnings.simplefilter('error', PerfectSeparationWarning)
                 
                 # Fit the logistic regression model
                 model_univ = sm.Logit(y, X_univ)
                 result_univ = model_univ.fit(disp=0, maxiter=100)
-                p_univ = result_univ.pvalues[1]  # p-value for the pathway predictor (index 1)
+                p_univ = result_univ.pvalues.iloc[1]  # p-value for the pathway predictor (index 1)
                 p_values.append(p_univ) # collect p-value
                 pathways_valid.append(pathway) # Keep track of valid pathways
-        except (np.linalg.LinAlgError, ValueError, PerfectSeparationError) as e:
+        except (np.linalg.LinAlgError, ValueError, *separation_errors):
             p_univ = np.nan  # Indicate invalid result
             problematic_pathways.append(pathway)
-            print(f"Pathway '{pathway}' encountered an error: {e}")
+            n_failed += 1
 
         # Store the result
         results.loc[pathway, 'LogReg_p_univ'] = p_univ
 
-
-
-    # Clean the p-values before applying FDR correction
-    p_values_cleaned = clean_p_values(p_values)
-
-# Apply FDR correction (Benjamini-Hochberg method)
-    if p_values:
-        print(f"Applying FDR correction to p-values: {p_values}")
-        _, p_values_fdr, _, _ = multipletests(p_values_cleaned, alpha=alpha, method='fdr_bh')  # FDR correction
-        print(f"FDR-adjusted p-values: {p_values_fdr}")
-        
-        # Store FDR-adjusted p-values back in the results DataFrame
-        for pathway, p_fdr in zip(pathways_valid, p_values_fdr):
-            results.loc[pathway, 'LogReg_p_fdr'] = p_fdr  # FDR-corrected p-values
-    else:
-        print("No valid p-values collected; skipping FDR correction.")
-    
-    # Debugging: Check the final results DataFrame
-    print(f"Final results with p-values and FDR corrections:\n{results}")
-    
-    return results, problematic_pathways
\ No newline at end of file
+    if n_failed:
+        print(f"Logistic regression not available for {n_failed} pathways (separation or singular matrix).")
+    return problematic_pathways, p_values, pathways_valid
@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import numpy as np
+from scipy import sparse
+
+
+def resolve_n_jobs(n_jobs):
+    # n_jobs follows the joblib convention: -1 means all cores, None or 0 means serial
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return n_jobs
+
+
+@contextmanager
+def shared_array(array, prefix='pc_stats_'):
+    """
+    Write `array` once to a memory-mapped .npy file and yield its path; the file is removed on exit.
+
+    Workers open the path with np.load(..., mmap_mode='r'), so the data is shared through the page
+    cache instead of being pickled per task. RAM-backed /dev/shm is used when available.
+    float32 arrays stay float32; everything else is written as float64.
+    """
+    tmp_root = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+    tmp_dir = tempfile.mkdtemp(prefix=prefix, dir=tmp_root)
+    try:
+        shared_path = os.path.join(tmp_dir, 'matrix.npy')
+        dtype = np.float32 if array.dtype == np.float32 else np.float64
+        shared = np.lib.format.open_memmap(shared_path, mode='w+', dtype=dtype, shape=array.shape)
+        shared[:] = array
+        shared.flush()
+        del shared
+        yield shared_path
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def run_column_chunks(worker, matrix, n_jobs=-1, chunk_size=None, worker_args=(), executor=None, label='chunk'):
+    """
+    Apply `worker` to column chunks of `matrix` in a process pool and merge the results in feature order.
+
+    The matrix is written once, feature-major, to a memory-mapped .npy file that every worker opens
+    read-only, so the data is shared through the page cache instead of being pickled per task.
+    A sparse matrix is sent as CSC column slices instead (only the nonzero entries are pickled) and
+    the worker receives a sparse block.
+
+    Parameters:
+    - worker (callable): Top-level function called as worker(block, *worker_args) with an
+      (n_samples x chunk) block; returns an array or a dict of arrays with one entry per column.
+    - matrix (np.ndarray or scipy.sparse matrix): (n_samples x n_features) numeric matrix.
+    - n_jobs (int): Number of worker processes (-1 for all cores).
+    - chunk_size (int): Columns per task; defaults to splitting the features evenly, four tasks per worker.
+    - worker_args (tuple): Extra picklable arguments passed to every worker call.
+    - executor (concurrent.futures.Executor): Existing pool to reuse instead of starting a new one.
+    - label (str): Name used in the timing log.
+
+    Returns:
+    - np.ndarray or dict of np.ndarray: Concatenated worker results in column order.
+    - list of dict: Per-chunk timing with 'start', 'stop', 'seconds' and 'pid'.
+    """
+    n_jobs = resolve_n_jobs(n_jobs)
+    n_features = matrix.shape[1]
+    if n_features == 0:
+        # No chunks to submit: the worker still defines the (empty) result layout
+        return worker(np.empty((matrix.shape[0], 0)), *worker_args), []
+    if chunk_size is None:
+        chunk_size = max(1, -(-n_features // (n_jobs * 4)))
+    bounds = [(start, min(start + chunk_size, n_features)) for start in range(0, n_features, chunk_size)]
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=n_jobs)
+    try:
+        if sparse.issparse(matrix):
+            matrix = sparse.csc_matrix(matrix)
+            futures = [executor.submit(_run_sparse_chunk, worker, matrix[:, start:stop], start, stop, worker_args)
+                       for start, stop in bounds]
+            chunks, timings = _collect_chunks(futures, label)
+        else:
+            # Feature-major copy shared with every worker
+            values = np.asarray(matrix)
+            values = values if values.dtype == np.float32 else values.astype(np.float64, copy=False)
+            with shared_array(values.T) as shared_path:
+                futures = [executor.submit(_run_chunk, worker, shared_path, start, stop, worker_args)
+                           for start, stop in bounds]
+                chunks, timings = _collect_chunks(futures, label)
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    ordered = [chunks[start] for start, _ in bounds]
+    timings.sort(key=lambda t: t['start'])
+    if isinstance(ordered[0], dict):
+        merged = {key: np.concatenate([chunk[key] for chunk in ordered]) for key in ordered[0]}
+    else:
+        merged = np.concatenate(ordered)
+
+    total = sum(t['seconds'] for t in timings)
+    print(f"{label}: {len(timings)} chunks on {n_jobs} workers, {total:.3f}s of worker time")
+    return merged, timings
+
+
+def _collect_chunks(futures, label):
+    chunks = {}
+    timings = []
+    for future in as_completed(futures):
+        start, stop, result, seconds, pid = future.result()
+        chunks[start] = result
+        timings.append({'start': start, 'stop': stop, 'seconds': seconds, 'pid': pid})
+        print(f"{label} [{start}:{stop}] finished in {seconds:.3f}s (pid {pid})")
+    return chunks, timings
+
+
+def _run_sparse_chunk(worker, block, start, stop, worker_args):
+    started = time.perf_counter()
+    result = worker(block, *worker_args)
+    return start, stop, result, time.perf_counter() - started, os.getpid()
+
+
+def _run_chunk(worker, shared_path, start, stop, worker_args):
+    started = time.perf_counter()
+    matrix = np.load(shared_path, mmap_mode='r')
+    block = np.array(matrix[start:stop]).T  # (n_samples x chunk) view of a private copy
+    result = worker(block, *worker_args)
+    return start, stop, result, time.perf_counter() - started, os.getpid()
@@ -0,0 +1,206 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from utils.compute_statistics import to_numeric_matrix
+from utils.parallel import resolve_n_jobs, shared_array
+
+# Statistic -> output column of the permutation p-value
+PERMUTATION_COLUMNS = {'wilcoxon': 'Wilcoxon_p_perm', 'logistic': 'LogReg_p_perm'}
+
+
+def statistic_rows(values, y, statistics=('wilcoxon', 'logistic')):
+    """
+    Linear statistics of every feature, so one label permutation scores all features with a matrix product.
+
+    Both tests reduce to a sum over the samples labelled 1 of a per-sample score that does not
+    depend on the labels, which is what makes a batch of permutations one product:
+    - 'wilcoxon': average ranks per feature; the rank sum of group 1 is the Mann-Whitney statistic,
+      centred at n1 * (n + 1) / 2.
+    - 'logistic': centred feature values; their sum over group 1 is the score statistic of the
+      univariate logistic regression at beta = 0, centred at 0.
+
+    Parameters:
+    - values (np.ndarray): (n_samples x n_features) numeric matrix without missing values.
+    - y (np.ndarray): 0/1 labels (group_2).
+    - statistics (tuple): Statistics to score, in output order.
+
+    Returns:
+    - np.ndarray: (len(statistics) * n_features x n_samples) score rows, statistic-major.
+    - np.ndarray: Centre of each row's statistic under the null.
+    - np.ndarray: Observed |statistic - centre| of each row.
+    """
+    n_samples, n_features = values.shape
+    n_group = float(np.sum(y))
+    rows, centres = [], []
+    for statistic in statistics:
+        if statistic == 'wilcoxon':
+            rows.append(stats.rankdata(values, axis=0).T)
+            centres.append(np.full(n_features, n_group * (n_samples + 1) / 2.0))
+        elif statistic == 'logistic':
+            rows.append((values - values.mean(axis=0)).T)
+            centres.append(np.zeros(n_features))
+        else:
+            raise ValueError(f"Unsupported statistic: {statistic}. Please specify 'wilcoxon' or 'logistic'.")
+    rows = np.ascontiguousarray(np.vstack(rows))
+    centres = np.concatenate(centres)
+    observed = np.abs(rows @ np.asarray(y, dtype=np.float64) - centres)
+    return rows, centres, observed
+
+
+def permutation_batch(source, active, y, centres, observed, n_permutations, seed, batch_index,
+                      feature_chunk=4096):
+    """
+    Count, for every active row, the permutations whose statistic is at least as extreme as observed.
+
+    The labels of one batch are permuted as a (n_permutations x n_samples) matrix drawn from a
+    generator seeded by (seed, batch_index), so a batch gives the same permutations in any worker.
+
+    Parameters:
+    - source (str or np.ndarray): Path of the shared score rows (see statistic_rows) or the rows themselves.
+    - active (np.ndarray): Indices of the rows still being permuted.
+    - y (np.ndarray): 0/1 labels.
+    - centres, observed (np.ndarray): Centre and observed deviation of the active rows.
+    - n_permutations (int): Permutations in this batch.
+    - seed (int): Base seed of the run.
+    - batch_index (int): Global index of the batch.
+    - feature_chunk (int): Rows scored per matrix product, bounding the (chunk x batch) buffer.
+
+    Returns:
+    - np.ndarray: Exceedance count per active row.
+    - float: Seconds spent in the batch.
+    - int: Worker pid.
+    """
+    started = time.perf_counter()
+    rows = np.load(source, mmap_mode='r') if isinstance(source, str) else source
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(batch_index,)))
+    labels = rng.permuted(np.tile(np.asarray(y, dtype=np.float64), (n_permutations, 1)), axis=1)
+
+    # Ties in the exact (rank) sums must count as exceedances despite rounding in the product
+    threshold = observed - 1e-9 * (1.0 + observed)
+    counts = np.zeros(len(active), dtype=np.int64)
+    for start in range(0, len(active), feature_chunk):
+        stop = min(start + feature_chunk, len(active))
+        block = np.asarray(rows[active[start:stop]])
+        permuted = np.abs(block @ labels.T - centres[start:stop, None])
+        counts[start:stop] = np.sum(permuted >= threshold[start:stop, None], axis=1)
+    return counts, time.perf_counter() - started, os.getpid()
+
+
+def permutation_p_values(data, features, statistics=('wilcoxon', 'logistic'), n_permutations=10000,
+                         batch_size=500, seed=0, n_jobs=1, executor=None, early_stop_hits=None,
+                         round_batches=8):
+    """
+    Empirical two-sided p-values of the Wilcoxon and logistic regression tests by permuting 'group_2'.
+
+    Permutations run in batches; each batch scores every still-active feature at once. Batches of a
+    round are spread over a process pool with the score rows shared through a memory-mapped file.
+    With early_stop_hits set, a feature stops being permuted once that many permutations were at
+    least as extreme as observed (Besag-Clifford sequential stopping): its p-value is already
+    clearly large, and the remaining permutations go to the features that may be significant.
+    Results depend only on the seed, never on n_jobs.
+
+    Parameters:
+    - data (pd.DataFrame): Preprocessed data with 'group_2' as the first column.
+    - features (Iterable): Feature columns to test.
+    - statistics (tuple): 'wilcoxon' and/or 'logistic' (the score statistic of the univariate model).
+    - n_permutations (int): Maximum permutations per feature.
+    - batch_size (int): Permutations per batch.
+    - seed (int): Base seed; batch i uses SeedSequence(seed, spawn_key=(i,)).
+    - n_jobs (int): Worker processes (-1 for all cores).
+    - executor (concurrent.futures.Executor): Existing process pool to reuse when n_jobs != 1.
+    - early_stop_hits (int): Stop permuting a feature after this many exceedances (None: never).
+    - round_batches (int): Maximum batches per round; early stopping is checked between rounds. With
+      early_stop_hits set it is reduced so a run has about 8 rounds (every batch at 4000 permutations).
+
+    Returns:
+    - pd.DataFrame: Per feature, the permutation p-value ((count + 1) / (permutations + 1)) and the
+      number of permutations of every statistic ('Wilcoxon_p_perm', 'Wilcoxon_n_perm', ...).
+    - dict: 'seconds', 'permutations' (label permutations drawn), 'permutations_per_second' and
+      'feature_permutations_per_second'.
+    """
+    features = pd.Index(features)
+    y = data.iloc[:, 0].to_numpy(dtype=np.float64)  # Assuming first column is 'group_2'
+    values = to_numeric_matrix(data, features)
+    if np.isnan(values).any():
+        raise ValueError("Permutation p-values need complete data; the preprocessed features contain NaN.")
+
+    rows, centres, observed = statistic_rows(values, y, statistics)
+    n_rows = rows.shape[0]
+    counts = np.zeros(n_rows, dtype=np.int64)
+    done = np.zeros(n_rows, dtype=np.int64)
+    active = np.arange(n_rows)
+
+    n_batches = -(-n_permutations // batch_size)
+    batch_sizes = [min(batch_size, n_permutations - i * batch_size) for i in range(n_batches)]
+    if early_stop_hits is not None:
+        # At least ~8 stopping checks per run, so a run of only a few rounds can still stop early; the round
+        # size depends on n_permutations and batch_size only, never on n_jobs, to keep results seed-only
+        round_batches = max(1, min(round_batches, n_batches // 8))
+    n_jobs = resolve_n_jobs(n_jobs)
+    parallel = n_jobs != 1 or executor is not None
+
+    started = time.perf_counter()
+    drawn = 0
+    feature_permutations = 0
+    with shared_array(rows, prefix='pc_perm_') as shared_path:
+        own_executor = parallel and executor is None
+        if own_executor:
+            executor = ProcessPoolExecutor(max_workers=n_jobs)
+        try:
+            for round_start in range(0, n_batches, round_batches):
+                if len(active) == 0:
+                    break
+                batch_ids = range(round_start, min(round_start + round_batches, n_batches))
+                args = [(active, y, centres[active], observed[active], batch_sizes[i], seed, i) for i in batch_ids]
+                if parallel:
+                    futures = [executor.submit(permutation_batch, shared_path, *arg) for arg in args]
+                    outcomes = [future.result() for future in futures]
+                else:
+                    outcomes = [permutation_batch(rows, *arg) for arg in args]
+
+                round_permutations = sum(batch_sizes[i] for i in batch_ids)
+                for batch_counts, _, _ in outcomes:
+                    counts[active] += batch_counts
+                done[active] += round_permutations
+                drawn += round_permutations
+                feature_permutations += round_permutations * len(active)
+
+                if early_stop_hits is not None:
+                    active = active[counts[active] < early_stop_hits]
+                elapsed = time.perf_counter() - started
+                print(f"Permutations {drawn}/{n_permutations}: {len(active)} of {n_rows} tests active, "
+                      f"{drawn / elapsed:.0f} permutations/s")
+        finally:
+            if own_executor:
+                executor.shutdown()
+
+    seconds = time.perf_counter() - started
+    p_values = (counts + 1) / (done + 1)
+    # Constant features have no defined logistic regression; keep them out like the asymptotic path
+    constant = np.ptp(values, axis=0) == 0
+
+    results = pd.DataFrame(index=features)
+    n_features = len(features)
+    for i, statistic in enumerate(statistics):
+        column = PERMUTATION_COLUMNS[statistic]
+        p_statistic = p_values[i * n_features:(i + 1) * n_features].copy()
+        if statistic == 'logistic':
+            p_statistic[constant] = np.nan
+        results[column] = p_statistic
+        results[column.replace('_p_perm', '_n_perm')] = done[i * n_features:(i + 1) * n_features]
+
+    report = {
+        'seconds': round(seconds, 3),
+        'permutations': int(drawn),
+        'permutations_per_second': round(drawn / seconds, 1) if seconds else float('inf'),
+        'feature_permutations_per_second': round(feature_permutations / seconds, 1) if seconds else float('inf'),
+    }
+    print(f"Permutation test: {drawn} permutations of {n_features} features in {seconds:.2f}s "
+          f"({report['permutations_per_second']:.0f} permutations/s, "
+          f"{report['feature_permutations_per_second']:.3g} feature-permutations/s)")
+    return results, report
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from utils.compute_statistics import compute_statistics, to_numeric_matrix
+from utils.logistic_regression_univariate_w_BH import apply_fdr_correction, fit_logistic_regression_univariate
+from utils.sparse_features import feature_csc, is_sparse_frame, split_groups
+
+# Modules whose source is part of the cache key: editing any of them invalidates cached rows
+CODE_VERSION_MODULES = ['compute_statistics.py', 'batched_logit.py', 'logistic_regression_univariate_w_BH.py',
+                        'sparse_features.py']
+PROBLEMATIC_COLUMN = 'LogReg_problematic'
+
+
+def code_version():
+    # Hash of the statistics source files, so a code change never serves stale rows
+    digest = hashlib.blake2b(digest_size=16)
+    utils_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in CODE_VERSION_MODULES:
+        with open(os.path.join(utils_dir, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def feature_cache_keys(data, features, params):
+    """
+    Content-addressed key per feature column.
+
+    Each key hashes the code version, the analysis parameters, the target vector and the bytes of the
+    feature column itself, so a rerun with added or removed columns reuses the rows of every column
+    whose values did not change. Sparse-backend columns are hashed from their stored entries (values
+    and row indices of the CSC column), so the matrix is never densified.
+
+    Parameters:
+    - data (pd.DataFrame): Preprocessed data with the target as the first column.
+    - features (Iterable): Feature columns to key.
+    - params (dict): JSON-serializable parameters that change the per-feature results (test choice, ...).
+
+    Returns:
+    - list of str: One hex key per feature, in feature order.
+    """
+    prefix = hashlib.blake2b(digest_size=16)
+    prefix.update(code_version().encode('utf-8'))
+    prefix.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    prefix.update(np.ascontiguousarray(data.iloc[:, 0].to_numpy(dtype=np.float64)).tobytes())
+
+    keys = []
+    if is_sparse_frame(data):
+        # Zeros are not stored (feature_csc drops them), so equal columns always give equal entries
+        matrix = feature_csc(data, pd.Index(features))
+        for start, stop in zip(matrix.indptr[:-1], matrix.indptr[1:]):
+            digest = prefix.copy()
+            digest.update(b'sparse')
+            digest.update(matrix.data[start:stop].tobytes())
+            digest.update(matrix.indices[start:stop].tobytes())
+            keys.append(digest.hexdigest())
+        return keys
+
+    # Feature-major copy so every column hashes from one contiguous buffer
+    values = np.ascontiguousarray(to_numeric_matrix(data, pd.Index(features)).T)
+    for column in values:
+        digest = prefix.copy()
+        digest.update(column.tobytes())
+        keys.append(digest.hexdigest())
+    return keys
+
+
+class ResultCache:
+    """
+    Size-bounded LRU store of per-feature result rows.
+
+    Rows are written as Parquet shards (one per run that computed new features) under `cache_dir`,
+    and `manifest.json` records each shard's size and last access time for eviction. When an S3
+    client is given, the shards and manifest are mirrored to s3://<s3_bucket>/<output_folder>/cache/,
+    the same layout save_and_upload_results uses for the Excel report.
+    """
+
+    def __init__(self, cache_dir, max_bytes=1024 ** 3, s3=None, s3_bucket=None, output_folder=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.s3 = s3
+        self.s3_bucket = s3_bucket
+        self.s3_prefix = f'{output_folder}/cache' if output_folder else 'cache'
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        if self._s3_enabled():
+            self._download_manifest()
+        self.manifest = self._load_manifest()
+
+    def lookup(self, keys):
+        # Return the cached rows for `keys` (indexed by key) and mark the shards that served them as used
+        wanted = set(keys)
+        found = []
+        now = time.time()
+        for shard, entry in list(self.manifest['shards'].items()):
+            path = self._shard_path(shard)
+            if not os.path.exists(path) and not self._download_shard(shard):
+                del self.manifest['shards'][shard]
+                continue
+            shard_keys = pd.read_parquet(path, columns=['cache_key'])['cache_key']
+            hit = shard_keys.isin(wanted).to_numpy()
+            if hit.any():
+                rows = pd.read_parquet(path).loc[hit].set_index('cache_key')
+                found.append(rows)
+                wanted.difference_update(rows.index)
+                entry['last_access'] = now
+        self._save_manifest()
+        if not found:
+            return pd.DataFrame()
+        rows = pd.concat(found)
+        return rows[~rows.index.duplicated()]
+
+    def store(self, rows):
+        # Persist new rows (indexed by cache key) as one shard, then evict down to max_bytes
+        if rows.empty:
+            return None
+        shard = f'{uuid.uuid4().hex}.parquet'
+        path = self._shard_path(shard)
+        rows.rename_axis('cache_key').reset_index().to_parquet(path, index=False)
+        self.manifest['shards'][shard] = {
+            'size': os.path.getsize(path),
+            'rows': int(len(rows)),
+            'last_access': time.time(),
+        }
+        if self._s3_enabled():
+            self.s3.upload_file(path, self.s3_bucket, f'{self.s3_prefix}/{shard}')
+        self.evict()
+        return shard
+
+    def evict(self):
+        # Drop least recently used shards until the cache fits in max_bytes
+        shards = self.manifest['shards']
+        total = sum(entry['size'] for entry in shards.values())
+        for shard in sorted(shards, key=lambda name: shards[name]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= shards.pop(shard)['size']
+            if os.path.exists(self._shard_path(shard)):
+                os.remove(self._shard_path(shard))
+            if self._s3_enabled():
+                self.s3.delete_object(Bucket=self.s3_bucket, Key=f'{self.s3_prefix}/{shard}')
+            print(f"Evicted cache shard {shard}")
+        self._save_manifest()
+
+    def _shard_path(self, shard):
+        return os.path.join(self.cache_dir, shard)
+
+    def _s3_enabled(self):
+        return self.s3 is not None and self.s3_bucket is not None
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        return {'shards': {}}
+
+    def _save_manifest(self):
+        tmp_path = f'{self.manifest_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+        if self._s3_enabled():
+            self.s3.upload_file(self.manifest_path, self.s3_bucket, f'{self.s3_prefix}/manifest.json')
+
+    def _download_manifest(self):
+        try:
+            self.s3.download_file(self.s3_bucket, f'{self.s3_prefix}/manifest.json', self.manifest_path)
+        except Exception as e:
+            print(f"No cache manifest on S3 ({e}); starting from the local cache.")
+
+    def _download_shard(self, shard):
+        if not self._s3_enabled():
+            return False
+        try:
+            self.s3.download_file(self.s3_bucket, f'{self.s3_prefix}/{shard}', self._shard_path(shard))
+            return True
+        except Exception as e:
+            print(f"Cache shard {shard} missing on S3: {e}")
+            return False
+
+
+def cached_statistics(data, features, cache, alpha=0.05, method='batched', params=None, fdr_method='fdr_bh',
+                      exclude_quasi_separation=False, **compute_kwargs):
+    """
+    compute_statistics + logistic_regression_univariate_w_BH with per-feature result caching.
+
+    Only features without a cached row are computed. FDR correction always runs over the full
+    feature set afterwards, because it depends on every p-value together.
+
+    Parameters:
+    - data (pd.DataFrame): Preprocessed data with 'group_2' as the first column.
+    - features (Iterable): Feature columns to analyse.
+    - cache (ResultCache): Cache to read from and write new rows to.
+    - alpha (float): Family-wise alpha for the FDR correction; applied after the cache, so not part of the key.
+    - method (str): Logistic regression engine, 'batched' or 'statsmodels'.
+    - params (dict): Extra parameters that change the per-feature results (test choice, ...).
+    - fdr_method (str): 'fdr_bh' (default), 'fdr_by' or 'qvalue'; applied after the cache, so not part of the key.
+    - exclude_quasi_separation (bool): See logistic_regression_univariate_w_BH; part of the key.
+    - compute_kwargs: n_jobs / chunk_size / executor passed to the compute functions.
+
+    Returns:
+    - pd.DataFrame: Same results frame as the uncached pipeline.
+    - list: Problematic features, as returned by logistic_regression_univariate_w_BH.
+    """
+    features = pd.Index(features)
+    key_params = {'logistic_method': method, 'exclude_quasi_separation': bool(exclude_quasi_separation),
+                  **(params or {})}
+    keys = pd.Index(feature_cache_keys(data, features, key_params))
+
+    cached = cache.lookup(keys)
+    hit = keys.isin(cached.index) if not cached.empty else np.zeros(len(keys), dtype=bool)
+    missing = features[~hit]
+    print(f"Result cache: {int(hit.sum())} of {len(features)} features cached, computing {len(missing)}")
+
+    if len(missing):
+        data_missing = data[[data.columns[0]] + list(missing)]
+        data_control, data_cancer = split_groups(data_missing)
+        new_rows = compute_statistics(data_control, data_cancer, missing,
+                                      chunk_size=compute_kwargs.get('chunk_size') or 2048,
+                                      n_jobs=compute_kwargs.get('n_jobs', 1),
+                                      executor=compute_kwargs.get('executor'))
+        problematic, _, _ = fit_logistic_regression_univariate(data_missing, missing, new_rows, method=method,
+                                                                 exclude_quasi_separation=exclude_quasi_separation,
+                                                                 **compute_kwargs)
+        new_rows[PROBLEMATIC_COLUMN] = new_rows.index.isin(problematic)
+        new_rows = new_rows.astype({column: np.float64 for column in new_rows.columns if column != PROBLEMATIC_COLUMN})
+        new_rows.index = keys[~hit]
+        new_rows = new_rows[~new_rows.index.duplicated()]
+        cache.store(new_rows)
+        cached = pd.concat([cached, new_rows]) if not cached.empty else new_rows
+
+    results = cached.loc[keys].set_axis(features)
+    problematic_mask = results.pop(PROBLEMATIC_COLUMN).astype(bool).to_numpy()
+    problematic_features = list(features[problematic_mask])
+
+    results = apply_fdr_correction(results, problematic_features, alpha=alpha, fdr_method=fdr_method)
+    return results, problematic_features
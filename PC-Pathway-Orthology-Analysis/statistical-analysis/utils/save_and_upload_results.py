@@ -1,45 +1,148 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
-import boto3
+
+NUMERIC_COLS = ['Control_mean', 'Cancer_mean', 'FC_value', "log2FC_value", 'Wilcoxon_p', 'LogReg_p_univ', "LogReg_p_fdr", 'Wilcoxon_p_fdr',
+                'Wilcoxon_p_perm', 'LogReg_p_perm']
+OUTPUT_EXTENSIONS = {'xlsx': 'xlsx', 'excel': 'xlsx', 'parquet': 'parquet', 'csv.gz': 'csv.gz', 'arrow': 'arrow'}
+STREAM_ROWS = 50000  # Rows per chunk / row group when writing CSV and Parquet
+
+# Label tables indexed by KEGG_no, keyed on (path, mtime, dataset_type) so repeated calls skip the CSV parse
+_label_index_cache = {}
+
+
+def load_label_index(label_file, dataset_type):
+    """
+    Read the label CSV once and return it indexed by KEGG_no, ready for an index join.
+
+    Parameters:
+    - label_file (str): Path of pathway_label_list.csv / orthology_label_list.csv.
+    - dataset_type (str): 'Pathway' or 'Orthology', selects the label column rename.
+
+    Returns:
+    - pd.DataFrame: Label columns indexed by unique KEGG_no.
+    """
+    key = (os.path.abspath(label_file), os.path.getmtime(label_file), dataset_type)
+    if key not in _label_index_cache:
+        # Read the label data
+        label_data = pd.read_csv(label_file)
+        if dataset_type == "Pathway":
+            label_data = label_data.rename(columns={"pathway_kegg_no": "Pathway_Name"})
+        elif dataset_type == "Orthology":
+            label_data = label_data.rename(columns={"orthology_names": "Orthology_Name"})
+        duplicated = label_data['KEGG_no'].duplicated()
+        if duplicated.any():
+            print(f"Label file has {int(duplicated.sum())} duplicate KEGG_no entries; keeping the first of each.")
+        _label_index_cache[key] = label_data.loc[~duplicated].set_index('KEGG_no')
+    return _label_index_cache[key]
+
+
+def _parquet_schema(combined_results):
+    # Inferred from the first chunk, not the empty frame: before pandas 3 an empty object column (labels,
+    # names) infers as Arrow null and the real rows then fail with "Invalid null value". A column that is
+    # still null in the first chunk (e.g. no label matched yet) is typed from its first non-null values.
+    import pyarrow as pa
+    schema = pa.Schema.from_pandas(combined_results.iloc[:STREAM_ROWS], preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            values = combined_results[field.name].dropna()
+            if len(values):
+                schema = schema.set(i, field.with_type(pa.Array.from_pandas(values.iloc[:STREAM_ROWS]).type))
+    return schema
+
+
+def write_results(combined_results, local_file_path, output_format):
+    # Write one output file; CSV and Parquet are streamed in chunks so large tables never build one big buffer
+    started = time.perf_counter()
+    if output_format in ('xlsx', 'excel'):
+        combined_results.to_excel(local_file_path, index=True)
+    elif output_format == 'csv.gz':
+        combined_results.to_csv(local_file_path, index=True, chunksize=STREAM_ROWS, compression='gzip')
+    elif output_format == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = _parquet_schema(combined_results)
+        with pq.ParquetWriter(local_file_path, schema, compression='zstd') as writer:
+            for start in range(0, len(combined_results), STREAM_ROWS):
+                chunk = combined_results.iloc[start:start + STREAM_ROWS]
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    elif output_format == 'arrow':
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        feather.write_feather(pa.Table.from_pandas(combined_results, preserve_index=False), local_file_path)
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}. "
+                         f"Please specify one of {sorted(OUTPUT_EXTENSIONS)}.")
+    print(f"Wrote {output_format} ({len(combined_results)} rows) in {time.perf_counter() - started:.3f}s: {local_file_path}")
+    return local_file_path
+
+
+def upload_files(s3, local_file_paths, s3_bucket, output_folder, max_concurrency=8):
+    # Multipart, multi-threaded transfers per file, and the files themselves uploaded concurrently
+    from boto3.s3.transfer import TransferConfig
+    config = TransferConfig(multipart_threshold=8 * 1024 ** 2, multipart_chunksize=8 * 1024 ** 2,
+                            max_concurrency=max_concurrency, use_threads=True)
+
+    def upload(local_file_path):
+        key = f'{output_folder}/{os.path.basename(local_file_path)}'
+        started = time.perf_counter()
+        s3.upload_file(local_file_path, s3_bucket, key, Config=config)
+        print(f"File uploaded to s3://{s3_bucket}/{key} in {time.perf_counter() - started:.3f}s")
+        return key
+
+    with ThreadPoolExecutor(max_workers=max(1, len(local_file_paths))) as pool:
+        return list(pool.map(upload, local_file_paths))
+
 
 # def save_and_upload_results(dataset_type, results, label_file, s3_bucket, output_folder, s3):
-def save_and_upload_results(dataset_type, results, label_file, s3_bucket=None, output_folder=None, s3=None):
-    # Convert columns to numeric types
-    numeric_cols = ['Control_mean', 'Cancer_mean', 'FC_value', "log2FC_value", 'Wilcoxon_p', 'LogReg_p_univ', "LogReg_p_fdr"]
-    results[numeric_cols] = results[numeric_cols].apply(pd.to_numeric, errors='coerce')
-    
-    # Read the label data
-    label_data = pd.read_csv(label_file)
-    if dataset_type == "Pathway":
-        label_data = label_data.rename(columns={"pathway_kegg_no": "Pathway_Name"})
-    elif dataset_type == "Orthology":
-        label_data = label_data.rename(columns={"orthology_names": "Orthology_Name"})
-    
-    # To merge the pathway together, reset the index of results to combine "KEGG_no" column
-    results.reset_index(inplace=True)
-    results.rename(columns={'index': 'KEGG_no'}, inplace=True)
-    
-    # Merge results with label_data on 'KEGG_no'
-    combined_results = pd.merge(results, label_data, on='KEGG_no', how='left')
-    
-    # Reorder columns if needed 
+def save_and_upload_results(dataset_type, results, label_file, s3_bucket=None, output_folder=None, s3=None,
+                            output_format='xlsx', output_dir='.'):
+    """
+    Join the results with their labels, write them in one or more formats and upload them to S3.
+
+    Parameters:
+    - dataset_type (str): 'Pathway' or 'Orthology'.
+    - results (pd.DataFrame): Statistics indexed by KEGG_no.
+    - label_file (str): Path of the label CSV.
+    - s3_bucket, output_folder, s3: Upload target; the upload is skipped when any of them is missing.
+    - output_format (str or list): 'xlsx' (default), 'parquet', 'csv.gz' or 'arrow', or a list of them.
+    - output_dir (str): Directory of the local files (default: the working directory; /tmp on Lambda).
+
+    Returns:
+    - str or list: Local path of the written file (a list when several formats were requested).
+    """
+    # Convert columns to numeric types (the vectorized statistics are already float64)
+    object_cols = [col for col in NUMERIC_COLS if col in results.columns and results[col].dtype == object]
+    if object_cols:
+        results = results.copy()
+        results[object_cols] = results[object_cols].apply(pd.to_numeric, errors='coerce')
+
+    # Join the labels through the prebuilt KEGG_no index instead of a fresh merge
+    label_index = load_label_index(label_file, dataset_type)
+    combined_results = results.join(label_index, how='left').rename_axis('KEGG_no').reset_index()
+
+    # Reorder columns if needed
     label_column = "Pathway_Name" if dataset_type == "Pathway" else "Orthology_Name"
     if label_column in combined_results.columns:
         cols = combined_results.columns.tolist()
         cols.insert(1, cols.pop(cols.index(label_column)))
         combined_results = combined_results[cols]
-        
-    # Save the combined results to an Excel file
-    local_file_path = f'./statistical_analysis_results_with_labels_{dataset_type}.xlsx'
-    combined_results.to_excel(local_file_path, index=True)
-    
-    # Upload the local file to the S3 bucket
-    # s3.upload_file(local_file_path, s3_bucket, f'{output_folder}/statistical_analysis_results_with_labels_{dataset_type}.xlsx')
-
-        # Upload the local file to the S3 bucket if S3 parameters are provided
+
+    # Save the combined results in every requested format
+    formats = [output_format] if isinstance(output_format, str) else list(output_format)
+    local_file_paths = []
+    for fmt in formats:
+        extension = OUTPUT_EXTENSIONS.get(fmt, fmt)
+        file_name = f'statistical_analysis_results_with_labels_{dataset_type}.{extension}'
+        local_file_path = os.path.join(output_dir, file_name)
+        local_file_paths.append(write_results(combined_results, local_file_path, fmt))
+
+    # Upload the local files to the S3 bucket if S3 parameters are provided
     if s3 and s3_bucket and output_folder:
-        s3.upload_file(local_file_path, s3_bucket, f'{output_folder}/statistical_analysis_results_with_labels_{dataset_type}.xlsx')
-        print(f"File uploaded to s3://{s3_bucket}/{output_folder}/statistical_analysis_results_with_labels_{dataset_type}.xlsx")
+        upload_files(s3, local_file_paths, s3_bucket, output_folder)
     else:
-        print("S3 upload skipped. File saved locally as:", local_file_path)
+        print("S3 upload skipped. File saved locally as:", ", ".join(local_file_paths))
 
-    return local_file_path
+    return local_file_paths[0] if isinstance(output_format, str) else local_file_paths
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Prefix of the stored feature-value columns; SHAP value columns keep the feature name
+VALUE_PREFIX = 'value:'
+
+
+def model_hash(model):
+    # Fitted trees identify the model; pickling covers every estimator of initialize_model
+    return hashlib.blake2b(pickle.dumps(model), digest_size=16).hexdigest()
+
+
+def explanation_key(model, X, background, background_size, seed):
+    # Model hash plus everything else the values depend on: explained rows and background sample
+    digest = hashlib.blake2b(digest_size=8)
+    for frame in (X, background):
+        if frame is None:
+            continue
+        digest.update(json.dumps([list(map(str, frame.columns)), list(map(str, frame.index))]).encode('utf-8'))
+        digest.update(np.ascontiguousarray(frame.to_numpy(dtype=np.float64)).tobytes())
+    digest.update(json.dumps([background is not None, background_size, seed]).encode('utf-8'))
+    return f"{model_hash(model)}_{digest.hexdigest()}"
+
+
+def positive_class(shap_values, expected_value):
+    # Classifiers with one output per class (RandomForest) -> contributions to class 1
+    if isinstance(shap_values, list):
+        shap_values = np.stack(shap_values, axis=-1)
+    shap_values = np.asarray(shap_values)
+    expected_value = np.ravel(np.asarray(expected_value, dtype=np.float64))
+    if shap_values.ndim == 3:
+        return shap_values[:, :, 1], float(expected_value[1])
+    return shap_values, float(expected_value[0])
+
+
+def explain_in_batches(model, X, background=None, background_size=100, batch_size=256, seed=0):
+    """
+    TreeSHAP values of the positive class for the rows of X, explained batch by batch.
+
+    With a background frame, a sample of background_size rows is drawn once and the explainer uses
+    interventional feature perturbation against it; its cost grows with that sample, which is what
+    the subsampling bounds. Without a background the tree-path-dependent algorithm of the notebook
+    (shap.TreeExplainer(model)) is used. Batching bounds the memory of a single shap_values call.
+
+    Parameters:
+    - model: Fitted tree model.
+    - X (pd.DataFrame): Rows to explain (validation fold, selected features).
+    - background (pd.DataFrame): Reference rows (e.g. training fold), or None.
+    - background_size (int): Background rows to sample.
+    - batch_size (int): Rows per shap_values call.
+    - seed (int): Seed of the background sample.
+
+    Returns:
+    - np.ndarray: (n_rows x n_features) float32 SHAP values.
+    - float: Expected value (base value) of the explainer.
+    """
+    import shap
+
+    if background is not None:
+        if len(background) > background_size:
+            background = background.sample(n=background_size, random_state=seed)
+        explainer = shap.TreeExplainer(model, data=background, feature_perturbation='interventional')
+    else:
+        explainer = shap.TreeExplainer(model)
+
+    batches = []
+    for start in range(0, len(X), batch_size):
+        values, expected_value = positive_class(explainer.shap_values(X.iloc[start:start + batch_size]),
+                                                explainer.expected_value)
+        batches.append(values.astype(np.float32))
+    if not batches:
+        return np.empty((0, X.shape[1]), dtype=np.float32), 0.0
+    return np.vstack(batches), expected_value
+
+
+def store_explanation(path, shap_values, X, metadata):
+    # SHAP values and feature values as float32 columns of one Parquet file, details in the schema metadata
+    columns = {'row': pa.array(list(map(str, X.index)))}
+    for i, feature in enumerate(X.columns):
+        columns[str(feature)] = pa.array(shap_values[:, i], type=pa.float32())
+    for feature in X.columns:
+        columns[f"{VALUE_PREFIX}{feature}"] = pa.array(X[feature].to_numpy(dtype=np.float32), type=pa.float32())
+    table = pa.table(columns).replace_schema_metadata({'shap': json.dumps(metadata)})
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+def load_explanation(path):
+    """
+    Stored explanation as (shap_values, feature_values, metadata).
+
+    shap_values and feature_values are DataFrames indexed by the row id with one column per feature.
+    """
+    table = pq.read_table(path)
+    metadata = json.loads(table.schema.metadata[b'shap'])
+    frame = table.to_pandas().set_index('row')
+    value_columns = [c for c in frame.columns if c.startswith(VALUE_PREFIX)]
+    feature_values = frame[value_columns].rename(columns=lambda c: c[len(VALUE_PREFIX):])
+    shap_values = frame.drop(columns=value_columns)
+    return shap_values, feature_values, metadata
+
+
+def explain_and_store(model, X, store_dir, background=None, background_size=100, batch_size=256, seed=0,
+                      metadata=None):
+    """
+    Explain X with explain_in_batches unless an explanation of the same model and rows is stored.
+
+    Explanations live in store_dir as <model hash>_<rows hash>.parquet, so reruns with an unchanged
+    model (same data, seed and parameters) read the stored arrays instead of re-explaining.
+
+    Returns:
+    - str: Path of the stored explanation.
+    - bool: Whether it was read from the store.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    path = os.path.join(store_dir, f"{explanation_key(model, X, background, background_size, seed)}.parquet")
+    if os.path.exists(path):
+        return path, True
+
+    started = time.perf_counter()
+    shap_values, expected_value = explain_in_batches(model, X, background=background,
+                                                     background_size=background_size,
+                                                     batch_size=batch_size, seed=seed)
+    store_explanation(path, shap_values, X, {
+        **(metadata or {}),
+        'expected_value': expected_value,
+        'background_size': background_size if background is not None else None,
+        'seconds': round(time.perf_counter() - started, 3),
+    })
+    return path, False
+
+
+def plot_shap_summary(paths, output_file, max_display=20):
+    """
+    SHAP summary (dot) plot from stored explanations only.
+
+    Several paths (e.g. the validation folds of a cross-validation) are stacked row-wise; a feature
+    not selected in a fold contributes 0 to that fold's rows.
+    """
+    import shap
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    loaded = [load_explanation(path) for path in paths]
+    shap_values = pd.concat([values for values, _, _ in loaded]).fillna(0.0)
+    feature_values = pd.concat([values for _, values, _ in loaded])[shap_values.columns]
+
+    plt.figure(figsize=(10, 8))
+    shap.summary_plot(shap_values.to_numpy(), feature_values, plot_type='dot', max_display=max_display, show=False)
+    plt.tight_layout()
+    plt.savefig(output_file)
+    plt.close()
+
+
+def shap_importance(paths):
+    """
+    Mean |SHAP| per feature across stored explanations.
+
+    Returns:
+    - pd.DataFrame: 'mean_abs_shap' over all explained rows (0 where a feature was not selected),
+      'mean_abs_shap_selected' over the explanations that include the feature, and 'n_explanations'.
+    """
+    per_explanation = [load_explanation(path)[0].abs().mean() for path in paths]
+    n_rows = [pq.read_metadata(path).num_rows for path in paths]
+    table = pd.concat(per_explanation, axis=1)
+    weights = np.asarray(n_rows, dtype=np.float64)
+    importance = pd.DataFrame({
+        'mean_abs_shap': (table.fillna(0.0) * weights).sum(axis=1) / weights.sum(),
+        'mean_abs_shap_selected': table.mean(axis=1),
+        'n_explanations': table.notna().sum(axis=1),
+    })
+    return importance.sort_values(by='mean_abs_shap', ascending=False)
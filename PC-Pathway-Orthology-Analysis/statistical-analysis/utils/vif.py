@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+from scipy import linalg
+
+from utils.compute_statistics import to_numeric_matrix
+
+
+def normalized_gram(values, center=False):
+    """
+    Gram matrix of the unit-norm columns of `values`.
+
+    statsmodels' variance_inflation_factor (0.13, as pinned in requirements.txt) regresses a column
+    on the others without an intercept, so its VIF is 1 / (1 - uncentered R^2), which equals
+    diag((X'X)^-1) * diag(X'X). With unit-norm columns this is the diagonal of the inverse Gram
+    matrix. With center=True the columns are centred first, the Gram matrix becomes the correlation
+    matrix and the VIF is the usual one of a model with intercept (statsmodels >= 0.14 standardizes
+    by default, which gives the same values).
+
+    Returns:
+    - np.ndarray: (k x k) normalized Gram matrix of the columns with non-zero norm.
+    - np.ndarray: Boolean mask of those columns (zero columns have no defined VIF).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if center:
+        values = values - values.mean(axis=0)
+    norms = np.sqrt(np.einsum('ij,ij->j', values, values))
+    valid = norms > 0
+    scaled = values[:, valid] / norms[valid]
+    return scaled.T @ scaled, valid
+
+
+def inverse_gram(gram, rcond=1e-10, ridge=None):
+    """
+    Inverse of a normalized Gram matrix through its Cholesky factor.
+
+    A singular or near-singular matrix (p > n, exactly collinear columns) makes the factorization fail
+    or gives pivots below rcond. It is then regularized as gram + ridge * I (ridge defaults to rcond),
+    which bounds the VIF of collinear columns at a large finite value instead of inf/NaN.
+
+    Returns:
+    - np.ndarray: Inverse of gram (+ ridge * I).
+    - float: Ridge that was added (0.0 for an exact inverse).
+    """
+    identity = np.eye(gram.shape[0])
+    try:
+        factor = linalg.cho_factor(gram, lower=True, check_finite=False)
+        pivots = np.diag(factor[0]) ** 2
+        if pivots.size and pivots.min() > rcond * pivots.max():
+            return linalg.cho_solve(factor, identity, check_finite=False), 0.0
+    except linalg.LinAlgError:
+        pass
+    ridge = rcond if ridge is None else ridge
+    factor = linalg.cho_factor(gram + ridge * identity, lower=True, check_finite=False)
+    return linalg.cho_solve(factor, identity, check_finite=False), ridge
+
+
+def vif_table(features, center=False, rcond=1e-10):
+    """
+    Variance inflation factor of every feature, from one matrix inverse.
+
+    Equivalent to [variance_inflation_factor(features.values, i) for i in range(p)] of the ML notebook,
+    which fits one OLS regression per column; here all VIFs are the diagonal of a single inverse.
+
+    Parameters:
+    - features (pd.DataFrame): Samples x features.
+    - center (bool): VIF of a model with intercept instead of statsmodels' uncentered one.
+    - rcond (float): Relative pivot below which the matrix is treated as singular and regularized.
+
+    Returns:
+    - pd.DataFrame: 'feature' and 'VIF', in column order (NaN for all-zero columns).
+    """
+    gram, valid = normalized_gram(to_numeric_matrix(features, features.columns), center=center)
+    inverse, ridge = inverse_gram(gram, rcond=rcond)
+    if ridge:
+        print(f"VIF: Gram matrix of {gram.shape[0]} features is singular, regularized with ridge {ridge:g}")
+
+    vif = np.full(len(features.columns), np.nan)
+    vif[valid] = np.diag(inverse)
+    return pd.DataFrame({'feature': features.columns, 'VIF': vif})
+
+
+def drop_high_vif(features, threshold=10.0, center=False, rcond=1e-10, refresh_every=100):
+    """
+    Drop the feature with the highest VIF until every remaining VIF is below the threshold.
+
+    The inverse Gram matrix is downdated in place after each drop instead of recomputed: removing
+    feature k from P = G^-1 gives P[-k, -k] - P[-k, k] P[k, -k] / P[k, k], an O(p^2) update instead
+    of an O(p^3) inverse. It is refactorized every refresh_every drops to bound rounding drift (and to
+    lose the ridge once the remaining features are no longer collinear).
+
+    Parameters:
+    - features (pd.DataFrame): Samples x features.
+    - threshold (float): VIF every kept feature must stay below (10 in the notebook).
+    - center (bool): See vif_table.
+    - rcond (float): See inverse_gram.
+    - refresh_every (int): Drops between full refactorizations.
+
+    Returns:
+    - pd.DataFrame: 'feature' and 'VIF' of the kept features (all-zero columns are kept with NaN).
+    - pd.DataFrame: 'feature' and 'VIF' of the dropped features, in drop order, with the VIF at the time of the drop.
+    """
+    gram, valid = normalized_gram(to_numeric_matrix(features, features.columns), center=center)
+    names = features.columns[valid]
+    active = np.arange(len(names))  # Feature of every row/column of the inverse
+    inverse, ridge = inverse_gram(gram, rcond=rcond)
+
+    dropped, dropped_vif = [], []
+    m = len(active)
+    while m > 0:
+        vif = np.diag(inverse)[:m]
+        k = int(np.argmax(vif))
+        if vif[k] < threshold:
+            break
+        dropped.append(names[active[k]])
+        dropped_vif.append(vif[k])
+
+        # Swap the dropped feature to the last position and downdate the leading block in place
+        last = m - 1
+        inverse[[k, last], :m] = inverse[[last, k], :m]
+        inverse[:m, [k, last]] = inverse[:m, [last, k]]
+        active[[k, last]] = active[[last, k]]
+        column = inverse[:last, last].copy()
+        inverse[:last, :last] -= np.outer(column, column / inverse[last, last])
+        m = last
+        if len(dropped) % refresh_every == 0 and m > 0:
+            inverse, ridge = inverse_gram(gram[np.ix_(active[:m], active[:m])], rcond=rcond)
+    active = active[:m]
+    inverse = inverse[:m, :m]
+
+    print(f"VIF: dropped {len(dropped)} of {len(names)} features to bring every VIF below {threshold}")
+    kept = pd.DataFrame({'feature': names[active], 'VIF': np.diag(inverse) if len(active) else []})
+    zero_columns = pd.DataFrame({'feature': features.columns[~valid], 'VIF': np.nan})
+    kept = pd.concat([kept, zero_columns]) if len(zero_columns) else kept
+    order = features.columns.get_indexer(kept['feature'])
+    kept = kept.iloc[np.argsort(order)].reset_index(drop=True)
+    return kept, pd.DataFrame({'feature': dropped, 'VIF': dropped_vif})